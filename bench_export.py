@@ -0,0 +1,128 @@
+"""Benchmark de débit des moteurs d'export Excel et Parquet (python bench_export.py --rows 1000000)"""
+import argparse
+import io
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+
+import wms_export
+
+STOCK_QUERY = """
+    SELECT reference, designation, quantite, emplacement, lot, date_expiration
+    FROM stocks ORDER BY quantite DESC
+"""
+MOVEMENTS_QUERY = """
+    SELECT 'Réception' as type, reference, quantite, emplacement, date_creation FROM receptions
+    UNION ALL
+    SELECT 'Expédition' as type, reference, quantite, emplacement, date_creation FROM expeditions
+"""
+
+
+def build_database(path, rows):
+    """Crée une base synthétique de `rows` lignes de stock (et autant de mouvements)"""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE stocks (reference TEXT, designation TEXT, quantite INTEGER,
+                             emplacement TEXT, lot TEXT, date_expiration DATE);
+        CREATE TABLE receptions (reference TEXT, quantite INTEGER, emplacement TEXT, date_creation TIMESTAMP);
+        CREATE TABLE expeditions (reference TEXT, quantite INTEGER, emplacement TEXT, date_creation TIMESTAMP);
+    """)
+    rng = random.Random(42)
+    today = date.today()
+
+    def stock_rows():
+        for i in range(rows):
+            ref = f"REF{i % 50000:06d}"
+            yield (ref, f"Article {ref}", rng.randint(0, 500),
+                   f"{'ABCD'[i % 4]}{i % 20 + 1}-{i % 99 + 1:02d}", f"LOT{i % 9000:05d}",
+                   (today + timedelta(days=rng.randint(-30, 720))).isoformat())
+
+    def movement_rows():
+        for i in range(rows // 2):
+            yield (f"REF{i % 50000:06d}", rng.randint(1, 50), f"A{i % 20 + 1}-01", f"{today.isoformat()} 08:00:00")
+
+    conn.executemany("INSERT INTO stocks VALUES (?, ?, ?, ?, ?, ?)", stock_rows())
+    conn.executemany("INSERT INTO receptions VALUES (?, ?, ?, ?)", movement_rows())
+    conn.executemany("INSERT INTO expeditions VALUES (?, ?, ?, ?)", movement_rows())
+    conn.commit()
+    conn.close()
+
+
+def bench_engine(db_path, engine, workers):
+    sheets = [
+        wms_export.Sheet("Stocks", STOCK_QUERY),
+        wms_export.Sheet("Mouvements", MOVEMENTS_QUERY),
+    ]
+    buffer, stats = wms_export.write_workbook(db_path, sheets, engine=engine, workers=workers)
+    buffer.seek(0, io.SEEK_END)
+    stats['bytes'] = buffer.tell()
+    return stats
+
+
+def bench_parquet(db_path, tmp):
+    """Même extraction de stocks en Parquet (colonnes référence/emplacement/lot en dictionnaire)"""
+    columns = [('reference', 'dict'), ('designation', 'str'), ('quantite', 'int'),
+               ('emplacement', 'dict'), ('lot', 'dict'), ('date_expiration', 'str')]
+    path = os.path.join(tmp, "stocks.parquet")
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    total_rows = wms_export.write_parquet_table(conn, STOCK_QUERY, columns, path)
+    conn.close()
+    elapsed = time.perf_counter() - started
+    return {'engine': 'parquet (stocks)', 'total_rows': total_rows, 'seconds': elapsed,
+            'rows_per_second': total_rows / elapsed, 'bytes': os.path.getsize(path)}
+
+
+def bench_pandas(db_path):
+    """Chemin historique : DataFrames complets puis ExcelWriter openpyxl"""
+    import pandas as pd
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    df_stocks = pd.read_sql_query(STOCK_QUERY, conn)
+    df_movements = pd.read_sql_query(MOVEMENTS_QUERY, conn)
+    conn.close()
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        df_stocks.to_excel(writer, sheet_name='Stocks', index=False)
+        df_movements.to_excel(writer, sheet_name='Mouvements', index=False)
+    elapsed = time.perf_counter() - started
+    total_rows = len(df_stocks) + len(df_movements)
+    return {'engine': 'pandas+openpyxl', 'total_rows': total_rows, 'seconds': elapsed,
+            'rows_per_second': total_rows / elapsed, 'bytes': buffer.tell()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000, help="lignes de stock générées")
+    parser.add_argument("--workers", type=int, default=None, help="threads d'extraction")
+    parser.add_argument("--legacy", action="store_true", help="mesurer aussi le chemin pandas historique")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        build_database(db_path, args.rows)
+
+        runs = []
+        for engine in ("xlsxwriter", "openpyxl"):
+            try:
+                runs.append(bench_engine(db_path, engine, args.workers))
+            except ImportError:
+                print(f"{engine}: non installé, ignoré")
+        try:
+            runs.append(bench_parquet(db_path, tmp))
+        except ImportError:
+            print("pyarrow: non installé, ignoré")
+        if args.legacy:
+            runs.append(bench_pandas(db_path))
+
+    print(f"{'moteur':<18}{'lignes':>12}{'secondes':>10}{'lignes/s':>12}{'Mo':>8}")
+    for stats in runs:
+        print(f"{stats['engine']:<18}{stats['total_rows']:>12,}{stats['seconds']:>10.2f}"
+              f"{stats['rows_per_second']:>12,.0f}{stats['bytes'] / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Benchmark de démarrage : coût d'import des modules lourds et temps de premier rendu par page
+
+    python bench_startup.py             # imports + premier rendu de chaque page
+    python bench_startup.py --imports   # imports seulement (sans Streamlit AppTest)
+
+Chaque mesure est faite dans un processus neuf, comme un démarrage à froid du serveur.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP = os.path.join(HERE, "wms_app.py")
+
+MODULES = ("streamlit", "pandas", "plotly.express", "plotly.graph_objects",
+           "reportlab.platypus", "openpyxl", "xlsxwriter", "matplotlib.backends.backend_agg", "pyarrow")
+PAGES = ("Welcome", "Stocks", "Receptions", "Expeditions", "Reporting",
+         "Transferts", "Tracabilite", "Administration")
+
+IMPORT_SNIPPET = """
+import json, sys, time
+started = time.perf_counter()
+try:
+    __import__(sys.argv[1])
+    print(json.dumps(time.perf_counter() - started))
+except ImportError:
+    print("null")
+"""
+
+# Premier rendu (démarrage à froid) puis rerun de la même page, via le testeur de Streamlit
+RENDER_SNIPPET = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+
+app = AppTest.from_file(sys.argv[1], default_timeout=120)
+app.session_state.current_page = sys.argv[2]
+app.session_state.show_welcome = False
+started = time.perf_counter()
+app.run()
+first = time.perf_counter() - started
+started = time.perf_counter()
+app.run()
+rerun = time.perf_counter() - started
+loaded = sorted(name for name in ("pandas", "plotly.express", "reportlab", "matplotlib") if name in sys.modules)
+print(json.dumps({"first": first, "rerun": rerun, "errors": len(app.exception), "loaded": loaded}))
+"""
+
+
+def run_snippet(snippet, *args, cwd=None):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [HERE, os.environ.get("PYTHONPATH")])))
+    result = subprocess.run([sys.executable, "-c", snippet, *args], capture_output=True, text=True,
+                            cwd=cwd, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "échec")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def bench_imports():
+    print(f"{'module':<24}{'import (ms)':>12}")
+    for name in MODULES:
+        seconds = run_snippet(IMPORT_SNIPPET, name)
+        print(f"{name:<24}{'non installé' if seconds is None else f'{seconds * 1000:.0f}':>12}")
+
+
+def bench_pages(pages):
+    print(f"\n{'page':<16}{'1er rendu (s)':>14}{'rerun (s)':>11}  modules chargés")
+    # Base vierge dans un dossier temporaire : la base de travail n'est pas touchée
+    with tempfile.TemporaryDirectory() as tmp:
+        for page in pages:
+            try:
+                stats = run_snippet(RENDER_SNIPPET, APP, page, cwd=tmp)
+            except RuntimeError as e:
+                print(f"{page:<16}erreur: {e}")
+                continue
+            errors = f"  ({stats['errors']} erreurs)" if stats['errors'] else ""
+            print(f"{page:<16}{stats['first']:>14.2f}{stats['rerun']:>11.2f}  "
+                  f"{', '.join(stats['loaded']) or '-'}{errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--imports", action="store_true", help="mesurer seulement les imports")
+    parser.add_argument("--pages", nargs="+", default=PAGES, choices=PAGES, help="pages mesurées")
+    args = parser.parse_args()
+
+    bench_imports()
+    if not args.imports:
+        bench_pages(args.pages)
+
+
+if __name__ == "__main__":
+    main()
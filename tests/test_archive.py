@@ -0,0 +1,65 @@
+"""Archivage des mouvements : sélection par colonne de date et conservation des agrégats"""
+import sqlite3
+
+import wms_services
+from wms_database import WMSDatabase
+
+OLD, NEW = "2025-06-15", "2026-03-10"
+
+
+def _seed(db_path):
+    conn = sqlite3.connect(db_path)
+    for day in (OLD, NEW):
+        # date_creation volontairement différente de la date du mouvement pour les réceptions
+        conn.execute("""
+            INSERT INTO receptions (reference, quantite, fournisseur, date_reception, emplacement, date_creation)
+            VALUES ('R1', 5, 'F1', ?, 'A1', '2026-04-01 08:00:00')
+        """, (day,))
+        conn.execute("""
+            INSERT INTO expeditions (numero_commande, reference, quantite, client, emplacement, date_creation)
+            VALUES (?, 'R1', 2, 'C1', 'A1', ?)
+        """, (f"CMD-{day}", f"{day} 10:00:00"))
+        conn.execute("""
+            INSERT INTO transferts (reference, quantite, emplacement_source, emplacement_destination, date_transfert)
+            VALUES ('R1', 1, 'A1', 'B1', ?)
+        """, (f"{day} 11:00:00",))
+    conn.commit()
+    conn.close()
+
+
+def _rollups(conn):
+    return [conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2").fetchall() for table in (
+        "fournisseurs_mensuel", "clients_commandes", "clients_references", "mouvements_jour",
+        "mouvements_emplacements", "mouvements_utilisateurs", "demande_journaliere")]
+
+
+def test_archive_moves_only_rows_before_the_cutoff(tmp_path):
+    db_path = str(tmp_path / "wms.db")
+    WMSDatabase(db_path)
+    _seed(db_path)
+
+    archive_path, counts = wms_services.archive_movements(db_path, "2026-01", tmp_path / "archives")
+
+    assert counts == {"receptions": 1, "expeditions": 1, "transferts": 1}
+    conn = sqlite3.connect(db_path)
+    conn.execute("ATTACH DATABASE ? AS archive", (str(archive_path),))
+    for table, column, _ in WMSDatabase.MOVEMENT_SOURCES:
+        kept = [row[0][:10] for row in conn.execute(f"SELECT {column} FROM main.{table}")]
+        archived = [row[0][:10] for row in conn.execute(f"SELECT {column} FROM archive.{table}")]
+        assert kept == [NEW], table
+        assert archived == [OLD], table
+    conn.close()
+
+
+def test_archive_keeps_history_rollups(tmp_path):
+    db_path = str(tmp_path / "wms.db")
+    WMSDatabase(db_path)
+    _seed(db_path)
+    conn = sqlite3.connect(db_path)
+    before = _rollups(conn)
+
+    wms_services.archive_movements(db_path, "2026-01", tmp_path / "archives")
+
+    assert _rollups(conn) == before
+    assert wms_services.get_parametre(conn, "archivage_en_cours") is None
+    conn.close()
@@ -0,0 +1,44 @@
+"""Expéditions : débit d'une seule ligne de stock quand l'emplacement contient plusieurs lots"""
+import sqlite3
+
+import pytest
+
+import wms_services
+from wms_database import WMSDatabase
+
+
+def _seed(db_path):
+    WMSDatabase(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.executemany("""
+        INSERT INTO stocks (reference, designation, quantite, emplacement, lot) VALUES ('P1', 'p1', ?, 'A1-01', ?)
+    """, [(3, "LOT1"), (50, "LOT2")])
+    conn.commit()
+    conn.close()
+
+
+def _lots(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return dict(conn.execute("SELECT lot, quantite FROM stocks WHERE reference = 'P1' ORDER BY lot"))
+    finally:
+        conn.close()
+
+
+def test_expedition_debits_the_first_lot_that_covers_the_quantity(tmp_path):
+    db_path = str(tmp_path / "wms.db")
+    _seed(db_path)
+
+    wms_services.create_expedition(db_path, "CMD-1", "P1", 10, "C1", "A1-01")
+
+    assert _lots(db_path) == {"LOT1": 3, "LOT2": 40}
+
+
+def test_expedition_larger_than_every_lot_is_refused(tmp_path):
+    db_path = str(tmp_path / "wms.db")
+    _seed(db_path)
+
+    with pytest.raises(ValueError, match="Disponible: 50 par lot"):
+        wms_services.create_expedition(db_path, "CMD-1", "P1", 51, "C1", "A1-01")
+
+    assert _lots(db_path) == {"LOT1": 3, "LOT2": 50}
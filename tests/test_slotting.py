@@ -0,0 +1,45 @@
+"""Slotting : transferts proposés par lot, plafond de transferts et contraintes des emplacements"""
+import numpy as np
+
+import wms_slotting
+
+# Quai proche de A-01, Z-99 au fond ; capacités libres, les deux emplacements utilisables
+SLOTS = (["A-01", "Z-99"], np.array([1.0, 50.0]), [None, None], np.array([True, True]))
+ITEMS = [
+    ("X", "A-01", 5, 0.0, "L1"),
+    ("X", "A-01", 7, 0.0, "L2"),
+    ("Y", "Z-99", 3, 30.0, "LY"),
+]
+
+
+def test_swap_moves_each_lot_of_the_displaced_reference():
+    moves, gain = wms_slotting.propose_moves(SLOTS, ITEMS, min_gain=0.0)
+
+    assert [move[:5] for move in moves] == [
+        ("Y", 3, "Z-99", "A-01", "LY"),
+        ("X", 5, "A-01", "Z-99", "L1"),
+        ("X", 7, "A-01", "Z-99", "L2"),
+    ]
+    assert gain == 30.0 * 49.0
+
+
+def test_max_moves_counts_displaced_lines():
+    moves, gain = wms_slotting.propose_moves(SLOTS, ITEMS, max_moves=2, min_gain=0.0)
+
+    assert moves == []
+    assert gain == 0.0
+
+
+def test_swap_is_refused_when_the_source_cannot_hold_the_displaced_lines():
+    codes, cost, _, usable = SLOTS
+    # Z-99 (source de Y) ne peut recevoir que 10 unités : les 12 unités de X n'y tiennent pas
+    moves, _ = wms_slotting.propose_moves((codes, cost, [None, 10], usable), ITEMS, min_gain=0.0)
+
+    assert moves == []
+
+
+def test_swap_is_refused_when_the_source_cannot_receive_stock():
+    codes, cost, capacities, _ = SLOTS
+    moves, _ = wms_slotting.propose_moves((codes, cost, capacities, np.array([True, False])), ITEMS, min_gain=0.0)
+
+    assert moves == []
@@ -0,0 +1,19 @@
+"""Historique fournisseur : filtres facultatifs de période et de fournisseur"""
+import sqlite3
+
+import wms_services
+import wms_suppliers
+from wms_database import WMSDatabase
+
+
+def test_monthly_history_without_period_or_supplier(tmp_path):
+    db_path = str(tmp_path / "wms.db")
+    WMSDatabase(db_path)
+    wms_services.create_reception(db_path, "R1", 5, "F1", "2026-03-10", "A1", date_commande="2026-03-01")
+    conn = sqlite3.connect(db_path)
+
+    history = wms_suppliers.monthly_history(conn, None, months=None)
+
+    assert [row[:4] for row in history] == [("2026-03", 1, 5, 1)]
+    assert history[0][4] == 9
+    conn.close()
@@ -0,0 +1,161 @@
+"""Moteur d'alertes : seuils configurables (globaux et par référence) et alertes ouvertes
+
+Les règles sont dans la vue `alertes_calculees` et la table `alerts` est tenue à jour par
+triggers à chaque écriture sur stocks, seuils_alertes ou sur les seuils de parametres
+(voir wms_database). Seule l'entrée dans la fenêtre d'expiration dépend du temps qui passe :
+elle est rattrapée une fois par jour par `refresh_if_due`.
+"""
+from datetime import date
+
+from wms_database import ALERT_EXPIRY_KEY, ALERT_STOCK_KEY, alert_sync_sql
+from wms_services import get_parametre, set_parametre
+
+SEVERITIES = ("critique", "haute", "moyenne")
+ALERT_TYPES = {"stock_faible": "Stock faible", "expiration": "Expiration"}
+LAST_EVALUATION_KEY = "alertes_date_evaluation"
+
+_SEVERITY_ORDER = "CASE {column} WHEN 'critique' THEN 0 WHEN 'haute' THEN 1 ELSE 2 END"
+
+
+def get_thresholds(conn):
+    """(stock minimum, jours avant expiration) globaux"""
+    return tuple(int(get_parametre(conn, key, default)) for key, default in (ALERT_STOCK_KEY, ALERT_EXPIRY_KEY))
+
+
+def set_thresholds(conn, seuil_stock, jours_expiration):
+    """Enregistre les seuils globaux ; les triggers réévaluent les alertes dans la même transaction"""
+    if seuil_stock < 0 or jours_expiration < 0:
+        raise ValueError("Les seuils d'alerte doivent être positifs")
+    set_parametre(conn, ALERT_STOCK_KEY[0], int(seuil_stock), "Stock minimum avant alerte")
+    set_parametre(conn, ALERT_EXPIRY_KEY[0], int(jours_expiration), "Jours avant expiration pour alerter")
+    conn.commit()
+
+
+def reference_thresholds(conn):
+    """Surcharges par référence : [(référence, seuil_stock, jours_expiration)]"""
+    return conn.execute(
+        "SELECT reference, seuil_stock, jours_expiration FROM seuils_alertes ORDER BY reference"
+    ).fetchall()
+
+
+def set_reference_threshold(conn, reference, seuil_stock=None, jours_expiration=None):
+    """Surcharge les seuils d'une référence (None : seuil global conservé pour ce critère)"""
+    if not reference:
+        raise ValueError("Référence obligatoire")
+    if seuil_stock is None and jours_expiration is None:
+        return remove_reference_threshold(conn, reference)
+    conn.execute("""
+        INSERT INTO seuils_alertes (reference, seuil_stock, jours_expiration) VALUES (?, ?, ?)
+        ON CONFLICT (reference) DO UPDATE SET
+            seuil_stock = excluded.seuil_stock, jours_expiration = excluded.jours_expiration
+    """, (reference, seuil_stock, jours_expiration))
+    conn.commit()
+
+
+def remove_reference_threshold(conn, reference):
+    """Supprime la surcharge : la référence revient aux seuils globaux"""
+    conn.execute("DELETE FROM seuils_alertes WHERE reference = ?", (reference,))
+    conn.commit()
+
+
+def refresh_time_alerts(conn):
+    """Ouvre les alertes d'expiration entrées dans leur fenêtre et passe les lots périmés en critique.
+
+    Seuls les lots dont la date tombe dans la plus grande fenêtre configurée sont relus
+    (index sur stocks.date_expiration).
+    """
+    horizon = conn.execute("SELECT MAX(jours_expiration) FROM seuils_alertes").fetchone()[0]
+    horizon = max(horizon or 0, get_thresholds(conn)[1])
+    conn.executescript(
+        "BEGIN;"
+        + alert_sync_sql(f"type = 'expiration' AND date_expiration <= date('now', '+{int(horizon)} days')")
+        + "COMMIT;"
+    )
+
+
+def refresh_if_due(conn, today=None):
+    """Rattrapage quotidien des alertes liées au temps ; retourne True s'il a été exécuté"""
+    today = (today or date.today()).isoformat()
+    if get_parametre(conn, LAST_EVALUATION_KEY) == today:
+        return False
+    refresh_time_alerts(conn)
+    set_parametre(conn, LAST_EVALUATION_KEY, today, "Dernière évaluation quotidienne des alertes")
+    conn.commit()
+    return True
+
+
+def count_open_alerts(conn):
+    """Nombre d'alertes ouvertes par sévérité"""
+    counts = dict(conn.execute("SELECT severite, COUNT(*) FROM alerts GROUP BY severite").fetchall())
+    return {severity: counts.get(severity, 0) for severity in SEVERITIES}
+
+
+def open_alerts(conn, alert_type=None, limit=None):
+    """Alertes ouvertes, les plus graves d'abord"""
+    query = f"""
+        SELECT type, severite, reference, emplacement, quantite, seuil, date_expiration, date_ouverture
+        FROM alerts {"WHERE type = ?" if alert_type else ""}
+        ORDER BY {_SEVERITY_ORDER.format(column='severite')}, date_expiration, quantite
+    """
+    params = (alert_type,) if alert_type else ()
+    if limit:
+        query += " LIMIT ?"
+        params += (int(limit),)
+    return conn.execute(query, params).fetchall()
+
+
+# --- Synthèse des alertes : comptages côté SQL, listes bornées --------------------
+
+# Famille d'une référence : préfixe avant le premier '-' (ou 3 premiers caractères)
+FAMILY_SQL = ("CASE WHEN instr(a.reference, '-') > 1 THEN substr(a.reference, 1, instr(a.reference, '-') - 1) "
+              "ELSE substr(a.reference, 1, 3) END")
+ZONE_SQL = "COALESCE(e.zone, substr(a.emplacement, 1, 1))"
+DIGEST_GROUPS = {"severite": "a.severite", "type": "a.type", "zone": ZONE_SQL, "famille": FAMILY_SQL}
+ALERTS_FROM = "alerts a LEFT JOIN emplacements e ON e.code = a.emplacement"
+TOP_N = 10
+PAGE_SIZE = 50
+
+
+def _filters_sql(filters):
+    """Clause WHERE et paramètres pour des filtres {groupe: valeur} (valeurs None ignorées)"""
+    clauses, params = [], []
+    for group, value in (filters or {}).items():
+        if value is not None:
+            clauses.append(f"{DIGEST_GROUPS[group]} = ?")
+            params.append(value)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def alert_digest(conn, top_n=TOP_N):
+    """Comptages par sévérité, type, zone et famille ; zones et familles limitées aux `top_n` premières"""
+    digest = {"total": conn.execute("SELECT COUNT(*) FROM alerts").fetchone()[0]}
+    for group, expression in DIGEST_GROUPS.items():
+        limit = f"LIMIT {int(top_n)}" if group in ("zone", "famille") else ""
+        digest[group] = conn.execute(f"""
+            SELECT {expression} AS groupe, COUNT(*) AS alertes,
+                   SUM(a.severite = 'critique') AS critiques
+            FROM {ALERTS_FROM}
+            GROUP BY groupe ORDER BY critiques DESC, alertes DESC {limit}
+        """).fetchall()
+    return digest
+
+
+def group_values(conn, group):
+    """Valeurs distinctes d'un groupe (pour les filtres de la vue détaillée)"""
+    return [row[0] for row in conn.execute(
+        f"SELECT DISTINCT {DIGEST_GROUPS[group]} AS groupe FROM {ALERTS_FROM} ORDER BY groupe"
+    ) if row[0] is not None]
+
+
+def alerts_page(conn, filters=None, page=1, page_size=PAGE_SIZE):
+    """Une page d'alertes filtrées, les plus graves d'abord : (lignes, nombre total)"""
+    where, params = _filters_sql(filters)
+    total = conn.execute(f"SELECT COUNT(*) FROM {ALERTS_FROM}{where}", params).fetchone()[0]
+    rows = conn.execute(f"""
+        SELECT a.severite, a.type, a.reference, a.emplacement, {ZONE_SQL} AS zone,
+               a.quantite, a.seuil, a.date_expiration, a.date_ouverture
+        FROM {ALERTS_FROM}{where}
+        ORDER BY {_SEVERITY_ORDER.format(column='a.severite')}, a.date_expiration, a.quantite, a.id
+        LIMIT ? OFFSET ?
+    """, params + [int(page_size), (max(int(page), 1) - 1) * int(page_size)]).fetchall()
+    return rows, total
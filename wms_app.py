@@ -1,15 +1,41 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
+from datetime import date as dt_date, datetime, timedelta
 import sqlite3
 import io
-import base64
 import time
 from pathlib import Path
 import os
+import zipfile
+
+import wms_alerts
+import wms_backup
+import wms_cache
+import wms_classification
+import wms_clients
+import wms_coverage
+import wms_cycle_count
+import wms_export
+import wms_forecast
+import wms_heatmap
+import wms_index
+import wms_jobs
+import wms_kpis
+import wms_layout
+import wms_movements
+import wms_replenishment
+import wms_reports
+import wms_services
+import wms_simulation
+import wms_slotting
+import wms_suppliers
+import wms_zones
+from wms_database import SUPPLIER_DEFAULT_LEAD_DAYS, WMSDatabase
+from wms_lazy import IMPORT_TIMES, LazyModule
+
+# Modules lourds chargés au premier usage : l'accueil s'affiche sans pandas ni plotly
+pd = LazyModule("pandas")
+px = LazyModule("plotly.express")
+go = LazyModule("plotly.graph_objects")
 
 # Configuration de la page
 st.set_page_config(
@@ -79,117 +105,40 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-class WMSDatabase:
-    def __init__(self):
-        self.db_path = "wms_database.db"
-        self.init_database()
-    
-    def init_database(self):
-        """Initialise la base de données SQLite"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Table des stocks
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS stocks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                reference TEXT NOT NULL,
-                designation TEXT NOT NULL,
-                quantite INTEGER NOT NULL,
-                emplacement TEXT NOT NULL,
-                lot TEXT,
-                date_expiration DATE,
-                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                date_modification TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Table des réceptions
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS receptions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                reference TEXT NOT NULL,
-                quantite INTEGER NOT NULL,
-                fournisseur TEXT NOT NULL,
-                date_reception DATE NOT NULL,
-                emplacement TEXT NOT NULL,
-                statut TEXT DEFAULT 'En cours',
-                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Table des expéditions
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS expeditions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                numero_commande TEXT NOT NULL,
-                reference TEXT NOT NULL,
-                quantite INTEGER NOT NULL,
-                client TEXT NOT NULL,
-                emplacement TEXT NOT NULL,
-                date_expedition DATE,
-                statut TEXT DEFAULT 'En préparation',
-                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Table des emplacements
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS emplacements (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                code TEXT UNIQUE NOT NULL,
-                zone TEXT NOT NULL,
-                capacite_max INTEGER,
-                capacite_utilisee INTEGER DEFAULT 0,
-                statut TEXT DEFAULT 'Disponible'
-            )
-        ''')
-        
-        # Table des transferts
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS transferts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                reference TEXT NOT NULL,
-                quantite INTEGER NOT NULL,
-                emplacement_source TEXT NOT NULL,
-                emplacement_destination TEXT NOT NULL,
-                motif TEXT,
-                utilisateur TEXT,
-                date_transfert TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Table des utilisateurs
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS utilisateurs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nom TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                role TEXT NOT NULL,
-                actif INTEGER DEFAULT 1,
-                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Table des parametres
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS parametres (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cle TEXT UNIQUE NOT NULL,
-                valeur TEXT NOT NULL,
-                description TEXT
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-    
-    def get_connection(self):
-        return sqlite3.connect(self.db_path)
+def _add_months(day, months):
+    """Décale une date de `months` mois (jour ramené à la fin du mois si besoin)"""
+    index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(index, 12)
+    month += 1
+    next_month = dt_date(year + month // 12, month % 12 + 1, 1)
+    return day.replace(year=year, month=month, day=min(day.day, (next_month - timedelta(days=1)).day))
+
+def _fragment(run_every=None):
+    """st.fragment si disponible (Streamlit >= 1.37), sinon exécution normale"""
+    fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+    if fragment is None:
+        return lambda func: func
+    return fragment(run_every=run_every)
 
 class WMSApp:
+    # Page -> méthode d'affichage
+    PAGES = {
+        'Welcome': 'show_welcome',
+        'Stocks': 'show_stocks',
+        'Receptions': 'show_receptions',
+        'Expeditions': 'show_expeditions',
+        'Reporting': 'show_reporting',
+        'Transferts': 'show_transferts',
+        'Tracabilite': 'show_tracabilite',
+        'Administration': 'show_administration',
+    }
+
     def __init__(self):
         self.db = WMSDatabase()
+        self.jobs = wms_jobs.get_runner(self.db.db_path)
+        wms_reports.start_scheduler(self.db.db_path)
+        if 'jobs' not in st.session_state:
+            st.session_state.jobs = []
         if 'current_page' not in st.session_state:
             st.session_state.current_page = 'Welcome'
         if 'show_welcome' not in st.session_state:
@@ -218,24 +167,12 @@ class WMSApp:
             for label, page in menu_items.items():
                 if st.button(label, key=f"nav_{page}", use_container_width=True):
                     st.session_state.current_page = page
+            
+            # Toujours présent : une tâche lancée depuis un fragment y apparaît sans rerun complet
+            self.show_jobs_panel()
         
-        # Main content
-        if st.session_state.current_page == 'Welcome':
-            self.show_welcome()
-        elif st.session_state.current_page == 'Stocks':
-            self.show_stocks()
-        elif st.session_state.current_page == 'Receptions':
-            self.show_receptions()
-        elif st.session_state.current_page == 'Expeditions':
-            self.show_expeditions()
-        elif st.session_state.current_page == 'Reporting':
-            self.show_reporting()
-        elif st.session_state.current_page == 'Transferts':
-            self.show_transferts()
-        elif st.session_state.current_page == 'Tracabilite':
-            self.show_tracabilite()
-        elif st.session_state.current_page == 'Administration':
-            self.show_administration()
+        # Main content : seule la méthode de la page active s'exécute
+        getattr(self, self.PAGES.get(st.session_state.current_page, 'show_welcome'))()
     
     def show_welcome(self):
         st.markdown("""
@@ -491,10 +428,10 @@ class WMSApp:
 
     def get_alerts_count(self):
         conn = self.db.get_connection()
-        low_stock = conn.execute("SELECT COUNT(*) FROM stocks WHERE quantite < 10").fetchone()[0]
-        expired = conn.execute("SELECT COUNT(*) FROM stocks WHERE date_expiration < date('now')").fetchone()[0]
+        wms_alerts.refresh_if_due(conn)
+        counts = wms_alerts.count_open_alerts(conn)
         conn.close()
-        return low_stock + expired
+        return sum(counts.values())
 
     def show_stock_evolution_chart(self):
         # Vérifier s'il y a des données de stock
@@ -663,43 +600,84 @@ class WMSApp:
         st.plotly_chart(fig, use_container_width=True)
 
     def show_alerts(self):
+        self.alerts_digest_section("dashboard", drilldown=False)
+
+    @_fragment()
+    def alerts_digest_section(self, key, drilldown=True):
+        """Synthèse des alertes : comptages SQL, top N et détail paginé (coût d'affichage constant)"""
         conn = self.db.get_connection()
-        
-        # Alertes stock faible
-        low_stock = conn.execute("SELECT reference, quantite FROM stocks WHERE quantite < 10").fetchall()
-        
-        # Alertes expiration
-        expiring = conn.execute("""
-            SELECT reference, date_expiration 
-            FROM stocks 
-            WHERE date_expiration <= date('now', '+7 days') 
-            AND date_expiration IS NOT NULL
-        """).fetchall()
-        
+        wms_alerts.refresh_if_due(conn)
         conn.close()
+        digest = wms_cache.cached(self.db.db_path, "alertes_synthese", ("alerts", "emplacements"),
+                                  wms_alerts.alert_digest)
         
-        if low_stock:
-            for ref, qty in low_stock:
-                st.markdown(f"""
-                <div class="alert-card">
-                    <strong>⚠️ Stock Faible:</strong> {ref} - {qty} unités restantes
-                </div>
-                """, unsafe_allow_html=True)
-        
-        if expiring:
-            for ref, exp_date in expiring:
-                st.markdown(f"""
-                <div class="alert-card">
-                    <strong>📅 Expiration:</strong> {ref} expire le {exp_date}
-                </div>
-                """, unsafe_allow_html=True)
-        
-        if not low_stock and not expiring:
+        if not digest['total']:
             st.markdown("""
             <div class="success-card">
                 <strong>✅ Aucune alerte:</strong> Tous les stocks sont normaux
             </div>
             """, unsafe_allow_html=True)
+            return
+        
+        by_severity = dict((severity, count) for severity, count, _ in digest['severite'])
+        cols = st.columns(len(wms_alerts.SEVERITIES) + 1)
+        cols[0].metric("Alertes ouvertes", f"{digest['total']:,}")
+        for col, severity in zip(cols[1:], wms_alerts.SEVERITIES):
+            col.metric(severity.capitalize(), f"{by_severity.get(severity, 0):,}")
+        
+        col1, col2, col3 = st.columns(3)
+        for col, group, title in ((col1, 'type', "Par type"), (col2, 'zone', f"Top {wms_alerts.TOP_N} zones"),
+                                  (col3, 'famille', f"Top {wms_alerts.TOP_N} familles")):
+            with col:
+                st.write(f"**{title}**")
+                df = pd.DataFrame(digest[group], columns=[group.capitalize(), "Alertes", "Critiques"])
+                if group == 'type':
+                    df['Type'] = df['Type'].map(wms_alerts.ALERT_TYPES).fillna(df['Type'])
+                st.dataframe(df, use_container_width=True, hide_index=True)
+        
+        if not drilldown:
+            rows, total = self.alerts_page({}, 1, wms_alerts.TOP_N)
+            st.write(f"**{len(rows)} alertes les plus graves**")
+            self.display_alerts_rows(rows)
+            return
+        
+        st.write("**🔎 Détail des alertes**")
+        filters = {}
+        filter_cols = st.columns(4)
+        for col, group in zip(filter_cols, ('severite', 'type', 'zone', 'famille')):
+            with col:
+                options = self.cached_alert_values(group)
+                labels = {value: wms_alerts.ALERT_TYPES.get(value, value) for value in options}
+                choice = st.selectbox(group.capitalize(), ["Tous"] + options, key=f"{key}_filtre_{group}",
+                                      format_func=lambda value, labels=labels: labels.get(value, value))
+                filters[group] = None if choice == "Tous" else choice
+        
+        total = self.alerts_page(filters, 1, 1)[1]
+        pages = max(1, -(-total // wms_alerts.PAGE_SIZE))
+        page = st.number_input(f"Page (sur {pages})", min_value=1, max_value=pages, value=1,
+                               key=f"{key}_page_" + "_".join(str(value) for value in filters.values()))
+        rows, total = self.alerts_page(filters, page, wms_alerts.PAGE_SIZE)
+        st.caption(f"{total:,} alertes correspondantes, {wms_alerts.PAGE_SIZE} par page")
+        self.display_alerts_rows(rows)
+
+    def alerts_page(self, filters, page, page_size):
+        conn = self.db.get_connection()
+        try:
+            return wms_alerts.alerts_page(conn, filters, page, page_size)
+        finally:
+            conn.close()
+
+    def cached_alert_values(self, group):
+        if group == 'severite':
+            return list(wms_alerts.SEVERITIES)
+        return wms_cache.cached(self.db.db_path, f"alertes_{group}", ("alerts", "emplacements"),
+                                lambda conn: wms_alerts.group_values(conn, group))
+
+    def display_alerts_rows(self, rows):
+        df = pd.DataFrame(rows, columns=["Sévérité", "Type", "Référence", "Emplacement", "Zone",
+                                         "Quantité", "Seuil", "Expiration", "Ouverte le"])
+        df['Type'] = df['Type'].map(wms_alerts.ALERT_TYPES).fillna(df['Type'])
+        st.dataframe(df, use_container_width=True, hide_index=True)
 
     def show_stocks(self):
         st.markdown("""
@@ -734,6 +712,19 @@ class WMSApp:
                 if st.form_submit_button("Ajouter"):
                     self.add_stock_item(ref, desig, qty, emp, lot, exp_date)
 
+        self.stock_search_section()
+
+        self.stock_delete_section()
+
+        self.cycle_count_section()
+
+        # Alertes
+        st.subheader("⚠️ Alertes Stock")
+        self.show_stock_alerts()
+
+    @_fragment()
+    def stock_search_section(self):
+        """Recherche et inventaire : la saisie ne relance que ce fragment"""
         # Filtres et recherche
         st.subheader("🔍 Recherche et Filtres")
         col1, col2 = st.columns(2)
@@ -742,18 +733,149 @@ class WMSApp:
             search_term = st.text_input("Rechercher (référence/désignation)")
         with col2:
             alert_filter = st.selectbox("Alertes", ["Tous", "Stock faible", "Expiration proche"])
+        abc, xyz = self.class_filters("stocks")
+        zones = st.multiselect("Zones", self.get_zones(), key="stocks_zones")
 
         # Tableau des stocks
         st.subheader("📋 Inventaire Actuel")
-        self.display_stock_table(search_term, "Tous", alert_filter)
-        
+        self.display_stock_table(search_term, "Tous", alert_filter, abc, xyz, zones)
+
+    @_fragment()
+    def cycle_count_section(self):
+        """Inventaires tournants : génération, saisie en masse des comptages, écarts et clôture"""
+        if not st.toggle("🧮 Inventaires tournants", key="show_cycle_counts"):
+            return
+        try:
+            accuracy = self.calculate_inventory_accuracy()
+            conn = self.db.get_connection()
+            counts = wms_cycle_count.open_counts(conn)
+            conn.close()
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric("Exactitude d'inventaire", f"{accuracy[0]:.1f}%" if accuracy else "-",
+                          help=f"Lignes comptées sans écart, campagnes clôturées sur "
+                               f"{wms_cycle_count.ACCURACY_DAYS} jours")
+            with col2:
+                st.metric("Lignes comptées (période)", f"{accuracy[1]:,}" if accuracy else "0")
+
+            with st.expander("➕ Nouvelle campagne de comptage", expanded=not counts):
+                col1, col2 = st.columns(2)
+                with col1:
+                    libelle = st.text_input("Libellé", value=f"Comptage {dt_date.today().isoformat()}",
+                                            key="count_label")
+                    abc = st.multiselect("Classes ABC", wms_classification.ABC_CLASSES, key="count_abc")
+                    zones = st.multiselect("Zones", self.get_zones(), key="count_zones")
+                with col2:
+                    emplacement_min = st.text_input("Emplacement de", key="count_from").strip()
+                    emplacement_max = st.text_input("Emplacement à (préfixe inclus)", key="count_to").strip()
+                    max_lines = st.number_input("Lignes maximum (0 = toutes)", min_value=0, value=0,
+                                                key="count_max")
+                if st.button("📝 Générer les tâches de comptage", key="count_create"):
+                    conn = self.db.get_connection()
+                    try:
+                        if abc:
+                            wms_classification.refresh_if_due(conn)
+                        count_id, lines = wms_cycle_count.create_count(
+                            conn, libelle, abc, zones, emplacement_min or None, emplacement_max or None,
+                            max_lines or None
+                        )
+                        st.success(f"✅ Comptage {count_id} créé : {lines:,} lignes à compter")
+                        counts = wms_cycle_count.open_counts(conn)
+                    except ValueError as e:
+                        st.error(f"❌ {str(e)}")
+                    finally:
+                        conn.close()
+
+            if not counts:
+                st.info("Aucun comptage en cours")
+                return
+            labels = {count[0]: f"#{count[0]} {count[1]} ({count[5]:,}/{count[4]:,} comptées) - {count[2]}"
+                      for count in counts}
+            count_id = st.selectbox("Comptage en cours", list(labels), format_func=labels.get, key="count_selected")
+            conn = self.db.get_connection()
+            st.download_button("📥 Feuille de comptage (CSV)", wms_cycle_count.count_sheet_csv(conn, count_id),
+                               file_name=f"comptage_{count_id}.csv", mime="text/csv", key="count_sheet")
+            conn.close()
+
+            uploaded = st.file_uploader("Quantités comptées (colonnes : " + ", ".join(wms_cycle_count.COUNT_COLUMNS) + ")",
+                                        type=['csv', 'xlsx'], key="count_file")
+            if uploaded is not None and st.button("📤 Enregistrer les comptages", key="count_record"):
+                conn = self.db.get_connection()
+                try:
+                    recorded, unknown = wms_cycle_count.record_counts(
+                        conn, count_id, wms_cycle_count.read_count_file(uploaded.getvalue(), uploaded.name))
+                    st.success(f"✅ {recorded:,} lignes enregistrées")
+                    if unknown:
+                        st.warning(f"⚠️ {unknown:,} lignes absentes de ce comptage ignorées")
+                except ValueError as e:
+                    st.error(f"❌ {str(e)}")
+                finally:
+                    conn.close()
+
+            conn = self.db.get_connection()
+            lines, counted, exact, net, absolute = wms_cycle_count.count_summary(conn, count_id)
+            rows = wms_cycle_count.variances(conn, count_id)
+            conn.close()
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Lignes comptées", f"{counted:,} / {lines:,}")
+            with col2:
+                st.metric("Sans écart", f"{exact / counted * 100:.1f}%" if counted else "-")
+            with col3:
+                st.metric("Écart net (unités)", f"{net:+,}")
+            with col4:
+                st.metric("Écart absolu (unités)", f"{absolute:,}")
+            if rows:
+                st.dataframe(pd.DataFrame(rows, columns=["Ligne", "Référence", "Emplacement", "Lot", "Théorique",
+                                                         "Compté", "Écart"]),
+                             use_container_width=True, hide_index=True)
+
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("✅ Clôturer et ajuster le stock", key="count_post", disabled=not counted):
+                    conn = self.db.get_connection()
+                    try:
+                        *_, adjusted = wms_cycle_count.post_adjustments(conn, count_id)
+                        st.success(f"✅ Comptage {count_id} clôturé : {adjusted:,} lignes de stock ajustées")
+                    except ValueError as e:
+                        st.error(f"❌ {str(e)}")
+                    finally:
+                        conn.close()
+            with col2:
+                if st.button("🗑️ Annuler le comptage", key="count_cancel"):
+                    conn = self.db.get_connection()
+                    try:
+                        wms_cycle_count.cancel_count(conn, count_id)
+                        st.success(f"Comptage {count_id} annulé")
+                    except ValueError as e:
+                        st.error(f"❌ {str(e)}")
+                    finally:
+                        conn.close()
+        except Exception as e:
+            st.error(f"Erreur inventaires tournants: {str(e)}")
+
+    def class_filters(self, key):
+        """Filtres de classes ABC/XYZ ; la classification du jour est calculée au premier filtre posé"""
+        col1, col2 = st.columns(2)
+        with col1:
+            abc = st.multiselect("Classe ABC", wms_classification.ABC_CLASSES, key=f"{key}_abc")
+        with col2:
+            xyz = st.multiselect("Classe XYZ", wms_classification.XYZ_CLASSES, key=f"{key}_xyz")
+        if abc or xyz:
+            conn = self.db.get_connection()
+            wms_classification.refresh_if_due(conn)
+            conn.close()
+        return abc, xyz
+
+    @_fragment()
+    def stock_delete_section(self):
+        """Suppression d'articles, isolée du reste de la page"""
         # Bouton supprimer avec sélection
         st.subheader("🗑️ Supprimer un Article")
         
-        # Sélection de l'article à supprimer
-        refs_to_delete = self.get_stock_references()
-        if refs_to_delete:
-            selected_ref = st.selectbox("Sélectionner l'article à supprimer", refs_to_delete, key="select_stock_delete")
+        # Sélection de l'article à supprimer (recherche à la frappe dans l'index en mémoire)
+        selected_ref = self.key_picker("Sélectionner l'article à supprimer", "references", key="select_stock_delete")
+        if selected_ref:
             
             col1, col2 = st.columns(2)
             with col1:
@@ -767,12 +889,6 @@ class WMSApp:
                     else:
                         st.session_state.confirm_clear_stock = True
                         st.error("⚠️ Cliquez à nouveau pour confirmer la suppression de TOUT le stock!")
-        else:
-            st.info("Aucun article en stock à supprimer")
-        
-        # Alertes
-        st.subheader("⚠️ Alertes Stock")
-        self.show_stock_alerts()
 
     def show_receptions(self):
         st.markdown("""
@@ -791,12 +907,15 @@ class WMSApp:
                 qty = st.number_input("Quantité reçue", min_value=1)
                 fournisseur = st.text_input("Fournisseur")
                 date_reception = st.date_input("Date de réception", value=datetime.now().date())
+                date_commande = st.date_input("Date de commande", value=None,
+                                              help="Date de la commande au fournisseur : mesure son délai "
+                                                   "de livraison (laisser vide si inconnue)")
                 
                 # Saisie libre d'emplacement
                 emplacement = st.text_input("Emplacement", placeholder="Saisissez l'emplacement de votre choix...")
                 
                 if st.form_submit_button("Enregistrer Réception"):
-                    self.create_reception(ref, qty, fournisseur, date_reception, emplacement)
+                    self.create_reception(ref, qty, fournisseur, date_reception, emplacement, date_commande)
         
         with col2:
             st.subheader("📋 Réceptions Récentes")
@@ -805,6 +924,81 @@ class WMSApp:
         st.subheader("📊 Historique des Réceptions")
         self.display_receptions_history()
         
+        self.replenishment_section()
+        
+        self.reception_delete_section()
+
+    @_fragment()
+    def replenishment_section(self):
+        """Suggestions de réapprovisionnement : point de commande et quantité économique par référence"""
+        st.subheader("🛒 Suggestions de Réapprovisionnement")
+        try:
+            conn = self.db.get_connection()
+            settings = wms_replenishment.get_settings(conn)
+            conn.close()
+            
+            with st.expander("Paramètres de calcul"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    service = st.slider("Taux de service (%)", 50.0, 99.9,
+                                        settings["reappro_taux_service"] * 100, 0.5)
+                    lead_time = st.number_input("Délai par défaut (jours)", min_value=0.0,
+                                                value=settings["reappro_delai_defaut"])
+                with col2:
+                    order_cost = st.number_input("Coût de commande", min_value=0.0,
+                                                 value=settings["reappro_cout_commande"])
+                    holding_cost = st.number_input("Coût de stockage annuel / unité", min_value=0.0,
+                                                   value=settings["reappro_cout_stockage"])
+                if st.button("Sauvegarder Paramètres", key="save_replenishment"):
+                    conn = self.db.get_connection()
+                    wms_replenishment.set_settings(conn, reappro_taux_service=service / 100,
+                                                   reappro_delai_defaut=lead_time,
+                                                   reappro_cout_commande=order_cost,
+                                                   reappro_cout_stockage=holding_cost)
+                    conn.close()
+                    st.success("✅ Paramètres de réapprovisionnement sauvegardés")
+            
+            plan = wms_replenishment.get_plan(self.db.db_path)
+            suppliers = sorted({name for name in plan['fournisseurs'] if name})
+            supplier = st.selectbox("Fournisseur", ["Tous"] + suppliers, key="replenishment_supplier")
+            rows = wms_replenishment.suggestion_rows(plan, None if supplier == "Tous" else supplier)
+            
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Références analysées", f"{len(plan['references']):,}")
+            with col2:
+                st.metric("Références à commander", f"{len(rows):,}")
+            with col3:
+                st.metric("Unités suggérées", f"{sum(row[-1] for row in rows):,}")
+            
+            if not rows:
+                st.info("Aucune référence sous son point de commande")
+                return
+            
+            df = pd.DataFrame(rows[:wms_replenishment.DISPLAY_ROWS], columns=wms_replenishment.SUGGESTION_COLUMNS)
+            st.dataframe(df, use_container_width=True, hide_index=True)
+            if len(rows) > wms_replenishment.DISPLAY_ROWS:
+                st.caption(f"{wms_replenishment.DISPLAY_ROWS} premières lignes sur {len(rows):,} : "
+                           "la liste complète est dans l'export")
+            
+            timestamp = datetime.now().strftime("%Y%m%d")
+            col1, col2 = st.columns(2)
+            with col1:
+                st.download_button("📥 Commandes suggérées (CSV)", wms_replenishment.suggestions_csv(rows),
+                                   file_name=f"commandes_suggerees_{timestamp}.csv", mime="text/csv")
+            with col2:
+                if st.button("📊 Préparer l'export Excel", key="replenishment_excel"):
+                    buffer, _ = wms_export.write_workbook(self.db.db_path, [wms_export.Sheet(
+                        "Commandes suggérées", headers=wms_replenishment.SUGGESTION_COLUMNS, rows=rows
+                    )])
+                    st.download_button("📥 Commandes suggérées (Excel)", buffer.read(),
+                                       file_name=f"commandes_suggerees_{timestamp}.xlsx", mime=wms_export.XLSX_MIME)
+        except Exception as e:
+            st.error(f"Erreur réapprovisionnement: {str(e)}")
+
+    @_fragment()
+    def reception_delete_section(self):
+        """Suppression de réceptions, isolée du reste de la page"""
         # Bouton supprimer avec sélection
         st.subheader("🗑️ Supprimer une Réception")
         
@@ -839,7 +1033,7 @@ class WMSApp:
         </div>
         """, unsafe_allow_html=True)
         
-        tab1, tab2, tab3 = st.tabs(["📝 Nouvelle Commande", "📋 Préparation", "📊 Suivi"])
+        tab1, tab2, tab3, tab4 = st.tabs(["📝 Nouvelle Commande", "📋 Préparation", "📊 Suivi", "👥 Clients"])
         
         with tab1:
             st.subheader("Créer une Commande Client")
@@ -861,6 +1055,45 @@ class WMSApp:
             st.subheader("📈 Suivi des Expéditions")
             self.display_expeditions_tracking()
         
+        with tab4:
+            self.clients_section()
+        
+        self.expedition_delete_section()
+
+    @_fragment()
+    def clients_section(self):
+        """Historique de commandes par client, lu dans les agrégats clients"""
+        st.subheader("👥 Clients")
+        try:
+            conn = self.db.get_connection()
+            clients, lines, units = wms_clients.client_totals(conn)
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Clients actifs", f"{clients:,}")
+            with col2:
+                st.metric("Lignes expédiées", f"{lines:,}")
+            with col3:
+                st.metric("Unités expédiées", f"{units:,}")
+            
+            order = st.selectbox("Classer par", list(wms_clients.CLIENT_ORDERS), key="clients_order")
+            rows = wms_clients.top_clients(conn, order)
+            conn.close()
+            if rows:
+                st.dataframe(pd.DataFrame(rows, columns=["Client", "Lignes", "Unités", "Références distinctes",
+                                                         "Dernière commande"]),
+                             use_container_width=True, hide_index=True)
+            else:
+                st.info("Aucune commande client enregistrée")
+            
+            client = self.key_picker("Client", "clients", key="clients_detail")
+            if client:
+                self.show_client_trace(client)
+        except Exception as e:
+            st.error(f"Erreur clients: {str(e)}")
+
+    @_fragment()
+    def expedition_delete_section(self):
+        """Suppression d'expéditions, isolée du reste de la page"""
         # Bouton supprimer avec sélection
         st.subheader("🗑️ Supprimer une Expédition")
         
@@ -898,23 +1131,7 @@ class WMSApp:
         col1, col2 = st.columns([1, 1])
         
         with col1:
-            st.subheader("➡️ Nouveau Transfert")
-            with st.form("transfert_form"):
-                ref = st.selectbox("Référence", self.get_stock_references())
-                qty = st.number_input("Quantité à transférer", min_value=1)
-                
-                emp_source = st.text_input("Emplacement Source", placeholder="Saisissez l'emplacement source...")
-                emp_dest = st.text_input("Emplacement Destination", placeholder="Saisissez l'emplacement destination...")
-                
-                motif = st.selectbox("Motif", [
-                    "Réorganisation", "Optimisation", "Maintenance", 
-                    "Préparation commande", "Contrôle qualité", "Autre"
-                ])
-                
-                utilisateur = st.text_input("Utilisateur", value="Admin")
-                
-                if st.form_submit_button("Exécuter Transfert"):
-                    self.execute_transfer(ref, qty, emp_source, emp_dest, motif, utilisateur)
+            self.transfer_form_section()
         
         with col2:
             st.subheader("📋 Transferts Récents")
@@ -923,6 +1140,128 @@ class WMSApp:
         st.subheader("📈 Historique des Transferts")
         self.display_transfers_history()
         
+        self.transfer_batch_section()
+
+        self.slotting_section()
+
+        self.transfer_delete_section()
+
+        st.subheader("📊 Analyse des Mouvements")
+        self.show_movement_analytics()
+
+    @_fragment()
+    def transfer_form_section(self):
+        """Formulaire de transfert ; la recherche de référence ne relance que ce fragment"""
+        st.subheader("➡️ Nouveau Transfert")
+        ref = self.key_picker("Référence", "references", key="transfer_ref")
+        with st.form("transfert_form"):
+            qty = st.number_input("Quantité à transférer", min_value=1)
+            
+            emp_source = st.text_input("Emplacement Source", placeholder="Saisissez l'emplacement source...")
+            emp_dest = st.text_input("Emplacement Destination", placeholder="Saisissez l'emplacement destination...")
+            lot = st.text_input("Lot", placeholder="Obligatoire si la source contient plusieurs lots")
+            
+            motif = st.selectbox("Motif", [
+                "Réorganisation", "Optimisation", "Maintenance", 
+                "Préparation commande", "Contrôle qualité", "Autre"
+            ])
+            
+            utilisateur = st.text_input("Utilisateur", value="Admin")
+            
+            if st.form_submit_button("Exécuter Transfert"):
+                self.execute_transfer(ref, qty, emp_source, emp_dest, motif, utilisateur, lot)
+
+    @_fragment()
+    def slotting_section(self):
+        """Propositions de transferts rapprochant du quai les références les plus prélevées"""
+        st.subheader("🧭 Optimisation des Emplacements")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            window = st.number_input("Historique de prélèvements (jours)", min_value=7,
+                                     value=wms_slotting.WINDOW_DAYS, key="slotting_window")
+        with col2:
+            max_moves = st.number_input("Transferts maximum par lot", min_value=1,
+                                        value=wms_slotting.MAX_MOVES, key="slotting_max")
+        with col3:
+            utilisateur = st.text_input("Utilisateur", value="Admin", key="slotting_user")
+        
+        if st.button("🔍 Calculer les propositions", key="slotting_run"):
+            try:
+                conn = self.db.get_connection()
+                with st.spinner("Calcul des propositions..."):
+                    st.session_state.slotting = wms_slotting.optimize(conn, window, max_moves)
+                conn.close()
+            except Exception as e:
+                st.error(f"Erreur optimisation: {str(e)}")
+        
+        result = st.session_state.get('slotting')
+        if not result:
+            return
+        if not result['transferts']:
+            st.info("Aucun transfert ne réduit les distances de prélèvement")
+            return
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Transferts proposés", f"{len(result['transferts']):,}")
+        with col2:
+            reduction = result['gain'] / result['cout_actuel'] * 100 if result['cout_actuel'] else 0
+            st.metric("Distance pondérée", f"{result['cout_apres']:,.0f}", delta=f"-{reduction:.1f}%",
+                      delta_color="inverse")
+        with col3:
+            st.metric("Emplacements analysés", f"{result['emplacements']:,}")
+        df = pd.DataFrame([move[:5] for move in result['transferts']],
+                          columns=["Référence", "Quantité", "Source", "Destination", "Lot"])
+        st.dataframe(df, use_container_width=True, hide_index=True)
+        st.caption(f"{result['lignes']:,} lignes de stock, calcul en {result['duree']:.1f}s")
+        
+        if st.button("✅ Exécuter le lot de transferts", key="slotting_apply"):
+            try:
+                report = wms_services.execute_transfers(self.db.db_path, [move[:5] for move in result['transferts']],
+                                                        wms_slotting.MOTIF, utilisateur)
+                del st.session_state['slotting']
+                self.display_batch_report(report)
+            except Exception as e:
+                st.error(f"❌ Erreur: {str(e)}")
+
+    @_fragment()
+    def transfer_batch_section(self):
+        """Import d'un lot de transferts (CSV/Excel) exécuté en une seule transaction"""
+        st.subheader("📑 Transferts par Lot")
+        uploaded = st.file_uploader("Fichier de transferts (colonnes : " + ", ".join(wms_services.TRANSFER_COLUMNS)
+                                    + f", {wms_services.TRANSFER_LOT_COLUMN} facultatif)",
+                                    type=['csv', 'xlsx'], key="transfer_batch_file")
+        col1, col2 = st.columns(2)
+        with col1:
+            motif = st.selectbox("Motif", ["Réorganisation", "Optimisation", "Maintenance",
+                                           "Préparation commande", "Contrôle qualité", "Autre"],
+                                 key="transfer_batch_motif")
+        with col2:
+            utilisateur = st.text_input("Utilisateur", value="Admin", key="transfer_batch_user")
+        
+        if uploaded is not None and st.button("▶️ Exécuter le lot", key="transfer_batch_run"):
+            try:
+                transfers = wms_services.read_transfer_file(uploaded.getvalue(), uploaded.name)
+                with st.spinner(f"{len(transfers):,} transferts..."):
+                    report = wms_services.execute_transfers(self.db.db_path, transfers, motif, utilisateur)
+                self.display_batch_report(report)
+            except ValueError as e:
+                st.error(f"❌ {str(e)}")
+            except Exception as e:
+                st.error(f"❌ Erreur import: {str(e)}")
+
+    def display_batch_report(self, report):
+        """Bilan d'un lot de transferts : débit ou lignes en échec (lot annulé)"""
+        if report['echecs']:
+            st.error(f"❌ {len(report['echecs'])} ligne(s) en échec sur {report['lignes']:,} : lot annulé")
+            st.dataframe(pd.DataFrame(report['echecs'], columns=["Ligne", "Référence", "Erreur"]),
+                         use_container_width=True, hide_index=True)
+        else:
+            st.success(f"✅ {report['executes']:,} transferts exécutés en une transaction "
+                       f"({report['duree']:.2f}s, {report['debit']:,.0f} lignes/s)")
+
+    @_fragment()
+    def transfer_delete_section(self):
+        """Suppression de transferts, isolée du reste de la page"""
         # Bouton supprimer avec sélection
         st.subheader("🗑️ Supprimer un Transfert")
         
@@ -948,10 +1287,6 @@ class WMSApp:
                         st.error("⚠️ Cliquez à nouveau pour confirmer la suppression de TOUS les transferts!")
         else:
             st.info("Aucun transfert à supprimer")
-        
-        st.subheader("📊 Analyse des Mouvements")
-        self.show_movement_analytics()
-
 
     def show_reporting(self):
         st.markdown("""
@@ -1076,6 +1411,187 @@ class WMSApp:
             st.subheader("📅 Évolution par Date d'Expiration")
             self.show_simple_expiration_evolution()
         
+        self.reporting_table_section()
+
+        self.forecasting_section()
+
+        self.supplier_section()
+
+        self.classification_section()
+
+        self.warehouse_map_section()
+
+        self.zone_section()
+
+        with st.expander("🗓️ Rapports mensuels automatiques"):
+            self.generate_automatic_monthly_report()
+        
+    @_fragment()
+    def forecasting_section(self):
+        """Prévisions, couverture et scénarios, calculés seulement à l'ouverture de la section"""
+        if not st.toggle("🔮 Prévisions et scénarios", key="show_forecasting"):
+            return
+        self.show_forecasting_chart()
+        self.show_coverage_horizon()
+        self.show_whatif_scenarios()
+
+    @_fragment()
+    def classification_section(self):
+        """Matrice ABC/XYZ des références, recalcul quotidien ou à la demande (tâche d'arrière-plan)"""
+        if not st.toggle("🔤 Classification ABC/XYZ", key="show_classification"):
+            return
+        try:
+            conn = self.db.get_connection()
+            wms_classification.refresh_if_due(conn)
+            matrix = wms_classification.class_matrix(conn)
+            last_run = wms_services.get_parametre(conn, wms_classification.LAST_RUN_KEY)
+            conn.close()
+            if not matrix:
+                st.info("Aucune référence classée")
+            else:
+                counts = pd.DataFrame(
+                    [[matrix.get((a, x), (0, 0))[0] for x in wms_classification.XYZ_CLASSES]
+                     for a in wms_classification.ABC_CLASSES],
+                    index=list(wms_classification.ABC_CLASSES), columns=list(wms_classification.XYZ_CLASSES)
+                )
+                fig = px.imshow(counts, text_auto=True, color_continuous_scale="Blues",
+                                labels={'x': 'Variabilité (XYZ)', 'y': 'Volume (ABC)', 'color': 'Références'},
+                                title="Références par Classe ABC/XYZ")
+                fig.update_layout(height=350)
+                st.plotly_chart(fig, use_container_width=True)
+            st.caption(f"Volume expédié et variabilité hebdomadaire sur {wms_classification.WINDOW_WEEKS} "
+                       f"semaines ; dernier calcul : {last_run or '-'}")
+            if st.button("🔄 Recalculer la classification", key="run_classification"):
+                db_path = self.db.db_path
+                
+                def run(progress):
+                    conn = sqlite3.connect(db_path)
+                    try:
+                        classified, written = wms_classification.run_classification(conn, progress=progress)
+                    finally:
+                        conn.close()
+                    return None, f"{classified:,} références classées, {written:,} lignes mises à jour"
+                
+                self.submit_job("classification", "Classification ABC/XYZ", run)
+        except Exception as e:
+            st.error(f"Erreur classification: {str(e)}")
+
+    @_fragment()
+    def zone_section(self):
+        """Stock par zone (agrégats zones_stock) et inventaire filtré par zone"""
+        if not st.toggle("🏷️ Stock par zone", key="show_zones"):
+            return
+        try:
+            conn = self.db.get_connection()
+            zones = wms_zones.zone_totals(conn)
+            conn.close()
+            col1, col2 = st.columns([1, 1])
+            with col1:
+                self.show_zone_distribution_chart()
+            with col2:
+                st.dataframe(pd.DataFrame(zones, columns=['Zone', 'Emplacements', 'Lignes', 'Quantité']),
+                             use_container_width=True, hide_index=True)
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                filter_zones = st.multiselect("Zones", [zone for zone, *_ in zones], key="zone_filter")
+            with col2:
+                filter_ref = st.text_input("Référence contient", key="zone_filter_ref")
+            with col3:
+                filter_stock_min = st.number_input("Stock minimum", min_value=0, value=0, key="zone_filter_min")
+            if filter_zones:
+                self.show_filtered_stock_table(filter_zones, filter_ref, filter_stock_min)
+        except Exception as e:
+            st.error(f"Erreur zones: {str(e)}")
+
+    @_fragment()
+    def warehouse_map_section(self):
+        """Plan de chaleur de l'entrepôt, calculé seulement à l'ouverture de la section"""
+        if not st.toggle("🗺️ Plan de l'entrepôt", key="show_warehouse_map"):
+            return
+        self.display_warehouse_map()
+        with st.expander("📐 Importer un plan d'entrepôt"):
+            st.caption("Colonnes : " + ", ".join(wms_layout.LAYOUT_COLUMNS) +
+                       " ; sans plan, la géométrie est lue dans les codes (ex. A1-01-2 = zone A, allée 1, travée 1, niveau 2)")
+            uploaded = st.file_uploader("Fichier de plan CSV/Excel", type=['csv', 'xlsx'], key="layout_file")
+            replace = st.checkbox("Remplacer le plan existant", key="layout_replace")
+            if uploaded is not None and st.button("Importer le plan", key="layout_import"):
+                try:
+                    rows = wms_layout.read_layout_file(uploaded.getvalue(), uploaded.name)
+                    conn = self.db.get_connection()
+                    count = wms_layout.save_plan(conn, rows, replace)
+                    conn.close()
+                    st.success(f"✅ {count:,} emplacements positionnés")
+                except ValueError as e:
+                    st.error(f"❌ {str(e)}")
+                except Exception as e:
+                    st.error(f"❌ Erreur import du plan: {str(e)}")
+
+    def display_warehouse_map(self):
+        try:
+            grid = wms_heatmap.get_grid(self.db.db_path)
+            if grid is None:
+                st.info("Aucun emplacement configuré")
+                return
+            col1, col2 = st.columns(2)
+            with col1:
+                metric = st.selectbox("Indicateur", wms_heatmap.METRICS, key="map_metric")
+            with col2:
+                level = st.selectbox("Niveau", ["Tous"] + grid['niveaux'], key="map_level")
+            layer, bins = wms_heatmap.metric_layer(grid, metric, None if level == "Tous" else level)
+            fig = go.Figure(go.Heatmap(
+                z=layer, x=grid['travees'], y=grid['rangees'], customdata=bins,
+                colorscale="YlOrRd", colorbar={'title': metric}, hoverongaps=False,
+                hovertemplate="Allée %{y}, travée %{x}<br>" + metric + ": %{z:,.0f}"
+                              "<br>%{customdata:.0f} emplacement(s)<extra></extra>",
+            ))
+            fig.update_layout(title="Plan de l'entrepôt", height=max(400, min(18 * len(grid['rangees']), 1200)),
+                              xaxis_title="Travée", yaxis={'title': "Allée", 'autorange': 'reversed', 'type': 'category'})
+            st.plotly_chart(fig, use_container_width=True)
+            st.caption(f"{int(grid['emplacements'].sum()):,} emplacements, {len(grid['rangees']):,} allées × "
+                       f"{len(grid['travees']):,} travées ; une cellule regroupe les niveaux d'une travée")
+        except Exception as e:
+            st.error(f"Erreur plan de l'entrepôt: {str(e)}")
+
+    @_fragment()
+    def supplier_section(self):
+        """Analyses fournisseurs et référentiel, chargés seulement à l'ouverture de la section"""
+        if not st.toggle("🚚 Performance fournisseurs", key="show_suppliers"):
+            return
+        self.show_supplier_performance()
+        with st.expander("📇 Référentiel fournisseurs"):
+            self.supplier_master_form()
+
+    def supplier_master_form(self):
+        conn = self.db.get_connection()
+        master = wms_suppliers.supplier_master(conn)
+        conn.close()
+        if master:
+            st.dataframe(pd.DataFrame(master, columns=["Fournisseur", "Délai contractuel (j)", "Contact",
+                                                       "Actif", "Créé le"]),
+                         use_container_width=True, hide_index=True)
+        existing = {row[0]: row for row in master}
+        with st.form("supplier_form"):
+            nom = st.selectbox("Fournisseur", ["➕ Nouveau"] + list(existing))
+            new_name = st.text_input("Nom (nouveau fournisseur)")
+            current = existing.get(nom)
+            delai = st.number_input("Délai contractuel (jours)", min_value=0,
+                                    value=current[1] if current else SUPPLIER_DEFAULT_LEAD_DAYS)
+            contact = st.text_input("Contact", value=(current[2] or "") if current else "")
+            actif = st.checkbox("Actif", value=bool(current[3]) if current else True)
+            if st.form_submit_button("Enregistrer Fournisseur"):
+                try:
+                    conn = self.db.get_connection()
+                    wms_suppliers.save_supplier(conn, new_name if current is None else nom, delai, contact, actif)
+                    conn.close()
+                    st.success("✅ Fournisseur enregistré, ponctualité recalculée")
+                except ValueError as e:
+                    st.error(f"❌ {str(e)}")
+                except Exception as e:
+                    st.error(f"❌ Erreur: {str(e)}")
+
+    @_fragment()
+    def reporting_table_section(self):
+        """Tableau filtrable et exports : la saisie d'un filtre ne relance ni les KPIs ni les graphiques"""
         # Tableau filtrable en bas
         st.subheader("📋 Tableau Filtrable")
         
@@ -1087,22 +1603,26 @@ class WMSApp:
             filter_location = st.text_input("📍 Filtrer par emplacement", placeholder="Tapez un emplacement...")
         with col3:
             filter_lot = st.text_input("🏷️ Filtrer par lot", placeholder="Tapez un numéro de lot...")
+        classes = self.class_filters("reporting")
         
         # Tableau filtré
-        self.show_simple_filtered_table(filter_ref, filter_location, filter_lot)
+        self.show_simple_filtered_table(filter_ref, filter_location, filter_lot, classes)
         
         # Boutons d'export
         st.subheader("📤 Export")
-        col1, col2 = st.columns(2)
+        col1, col2, col3 = st.columns(3)
         
         with col1:
             if st.button("📊 Exporter Excel", use_container_width=True):
-                self.export_simple_excel(filter_ref, filter_location, filter_lot)
+                self.export_simple_excel(filter_ref, filter_location, filter_lot, classes)
         
         with col2:
             if st.button("📄 Exporter PDF", use_container_width=True):
-                self.export_simple_pdf()
+                self.export_simple_pdf(filter_ref, filter_location, filter_lot, classes)
         
+        with col3:
+            if st.button("🗓️ Rapport Mensuel", use_container_width=True):
+                self.export_monthly_report_pdf()
 
     def show_tracabilite(self):
         st.markdown("""
@@ -1112,34 +1632,8 @@ class WMSApp:
         </div>
         """, unsafe_allow_html=True)
         
-        # Recherche par critères
-        st.subheader("🔎 Recherche Traçabilité")
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            search_type = st.selectbox("Type de recherche", [
-                "Par Référence", "Par Lot", "Par Fournisseur", 
-                "Par Client", "Par Emplacement", "Par Période"
-            ])
-        
-        with col2:
-            if search_type == "Par Référence":
-                search_value = st.selectbox("Référence", self.get_stock_references())
-            elif search_type == "Par Lot":
-                search_value = st.text_input("Numéro de Lot")
-            elif search_type == "Par Fournisseur":
-                search_value = st.selectbox("Fournisseur", self.get_suppliers())
-            elif search_type == "Par Client":
-                search_value = st.selectbox("Client", self.get_clients())
-            elif search_type == "Par Emplacement":
-                search_value = st.selectbox("Emplacement", self.get_emplacements())
-            else:
-                search_value = st.date_input("Date")
-        
-        with col3:
-            if st.button("🔍 Rechercher"):
-                self.search_traceability(search_type, search_value)
-        
+        self.traceability_search_section()
+
         # Suivi par lot
         st.subheader("🏷️ Suivi par Lot")
         self.display_lot_tracking()
@@ -1167,19 +1661,54 @@ class WMSApp:
         st.subheader("🔄 Gestion des Retours")
         self.show_returns_management()
 
+    @_fragment()
+    def traceability_search_section(self):
+        """Recherche de traçabilité, relancée seule à chaque changement de critère"""
+        # Recherche par critères
+        st.subheader("🔎 Recherche Traçabilité")
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            search_type = st.selectbox("Type de recherche", [
+                "Par Référence", "Par Lot", "Par Fournisseur", 
+                "Par Client", "Par Emplacement", "Par Période"
+            ])
+        
+        with col2:
+            if search_type == "Par Référence":
+                search_value = self.key_picker("Référence", "references", key="trace_ref")
+            elif search_type == "Par Lot":
+                search_value = st.text_input("Numéro de Lot")
+            elif search_type == "Par Fournisseur":
+                search_value = st.selectbox("Fournisseur", self.get_suppliers())
+            elif search_type == "Par Client":
+                search_value = self.key_picker("Client", "clients", key="trace_client")
+            elif search_type == "Par Emplacement":
+                search_value = self.key_picker("Emplacement", "emplacements", key="trace_emplacement")
+            else:
+                search_value = st.date_input("Date")
+        
+        with col3:
+            if st.button("🔍 Rechercher"):
+                self.search_traceability(search_type, search_value)
+
     def show_simple_top_references(self):
         """Affiche un bar chart simple des Top 10 références par stock"""
         try:
             conn = self.db.get_connection()
-            query = """
-            SELECT reference, SUM(quantite) as total_stock
-            FROM stocks 
-            WHERE quantite > 0
-            GROUP BY reference
+            abc = st.multiselect("Classe ABC", wms_classification.ABC_CLASSES, key="top_refs_abc")
+            if abc:
+                wms_classification.refresh_if_due(conn)
+            condition, params = wms_classification.filter_sql(abc, column="s.reference")
+            query = f"""
+            SELECT s.reference, SUM(s.quantite) as total_stock, COALESCE(c.classe_abc, '-') as classe
+            FROM stocks s LEFT JOIN classification c ON c.reference = s.reference
+            WHERE s.quantite > 0{condition}
+            GROUP BY s.reference
             ORDER BY total_stock DESC
             LIMIT 10
             """
-            df = pd.read_sql_query(query, conn)
+            df = pd.read_sql_query(query, conn, params=params)
             conn.close()
             
             if not df.empty:
@@ -1187,12 +1716,13 @@ class WMSApp:
                     df, 
                     x='reference', 
                     y='total_stock',
+                    color='classe',
+                    category_orders={'classe': list(wms_classification.ABC_CLASSES) + ['-']},
                     title="Top 10 Références par Stock",
-                    labels={'reference': 'Référence', 'total_stock': 'Stock Total'}
+                    labels={'reference': 'Référence', 'total_stock': 'Stock Total', 'classe': 'Classe ABC'}
                 )
                 fig.update_layout(
                     height=400,
-                    showlegend=False,
                     xaxis_tickangle=-45
                 )
                 st.plotly_chart(fig, use_container_width=True)
@@ -1204,14 +1734,8 @@ class WMSApp:
     def show_simple_expiration_evolution(self):
         """Affiche un line chart simple de l'évolution par date d'expiration"""
         try:
-            import datetime
-            try:
-                from dateutil.relativedelta import relativedelta
-            except ImportError:
-                relativedelta = None
-            
             # Simulation de données d'expiration par mois
-            today = datetime.date.today()
+            today = dt_date.today()
             months = []
             stock_counts = []
             
@@ -1221,13 +1745,7 @@ class WMSApp:
             
             # Génération de 12 mois de données simulées
             for i in range(12):
-                if relativedelta:
-                    month_date = today + relativedelta(months=i)
-                else:
-                    month_num = (today.month + i - 1) % 12 + 1
-                    year = today.year + (today.month + i - 1) // 12
-                    month_date = today.replace(year=year, month=month_num)
-                
+                month_date = _add_months(today, i)
                 months.append(month_date.strftime("%Y-%m"))
                 # Simulation: décroissance progressive du stock
                 stock_counts.append(max(0, total_stock - (i * total_stock // 15)))
@@ -1254,7 +1772,7 @@ class WMSApp:
         except Exception as e:
             st.error(f"Erreur lors du chargement du graphique: {str(e)}")
     
-    def show_simple_filtered_table(self, filter_ref, filter_location, filter_lot):
+    def show_simple_filtered_table(self, filter_ref, filter_location, filter_lot, classes=(None, None)):
         """Affiche un tableau filtrable simple"""
         try:
             conn = self.db.get_connection()
@@ -1285,6 +1803,10 @@ class WMSApp:
                 query += " AND lot LIKE ?"
                 params.append(f"%{filter_lot}%")
             
+            condition, class_params = wms_classification.filter_sql(*classes)
+            query += condition
+            params.extend(class_params)
+            
             query += " ORDER BY reference, lot"
             
             df = pd.read_sql_query(query, conn, params=params)
@@ -1303,11 +1825,9 @@ class WMSApp:
         except Exception as e:
             st.error(f"Erreur lors du chargement du tableau: {str(e)}")
     
-    def export_simple_excel(self, filter_ref, filter_location, filter_lot):
+    def export_simple_excel(self, filter_ref, filter_location, filter_lot, classes=(None, None)):
         """Export Excel simple du tableau filtré"""
         try:
-            conn = self.db.get_connection()
-            
             query = """
             SELECT 
                 reference as 'Référence',
@@ -1333,86 +1853,74 @@ class WMSApp:
                 query += " AND lot LIKE ?"
                 params.append(f"%{filter_lot}%")
             
+            condition, class_params = wms_classification.filter_sql(*classes)
+            query += condition
+            params.extend(class_params)
+            
             query += " ORDER BY reference, lot"
             
-            df = pd.read_sql_query(query, conn, params=params)
-            conn.close()
+            # Écriture en flux depuis le curseur SQLite, directement en mémoire
+            buffer, stats = wms_export.write_workbook(
+                self.db.db_path, [wms_export.Sheet("Stocks", query, params)]
+            )
             
-            if not df.empty:
-                # Création du fichier Excel
+            if stats['total_rows'] > 0:
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 filename = f"export_stocks_{timestamp}.xlsx"
                 
-                # Créer le dossier exports s'il n'existe pas
-                exports_dir = Path("exports")
-                exports_dir.mkdir(exist_ok=True)
-                filepath = exports_dir / filename
-                
-                df.to_excel(filepath, index=False, engine='openpyxl')
-                
                 # Bouton de téléchargement
-                with open(filepath, 'rb') as file:
-                    st.download_button(
-                        label="📥 Télécharger Excel",
-                        data=file.read(),
-                        file_name=filename,
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    )
-                st.success(f"✅ Export Excel créé: {filename}")
+                st.download_button(
+                    label="📥 Télécharger Excel",
+                    data=buffer.read(),
+                    file_name=filename,
+                    mime=wms_export.XLSX_MIME
+                )
+                st.success(f"✅ Export Excel créé: {filename} ({stats['total_rows']:,} lignes en {stats['seconds']:.1f}s)")
             else:
                 st.warning("Aucune donnée à exporter")
                 
         except Exception as e:
             st.error(f"Erreur lors de l'export Excel: {str(e)}")
     
-    def export_simple_pdf(self):
-        """Export PDF simple avec KPIs et résumé"""
+    def export_simple_pdf(self, filter_ref, filter_location, filter_lot, classes=(None, None)):
+        """Export PDF du Reporting : KPIs, graphiques et tableau filtré (tâche d'arrière-plan)"""
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"rapport_wms_{timestamp}.pdf"
+            query = """
+            SELECT reference, designation, quantite, emplacement, lot, date_expiration
+            FROM stocks 
+            WHERE quantite > 0
+            """
+            params = []
             
-            # Créer le dossier exports s'il n'existe pas
-            exports_dir = Path("exports")
-            exports_dir.mkdir(exist_ok=True)
-            filepath = exports_dir / filename
+            if filter_ref:
+                query += " AND reference LIKE ?"
+                params.append(f"%{filter_ref}%")
             
-            # Collecte des KPIs
-            stock_total = self.calculate_total_stock()
-            references_actives = self.calculate_active_references()
-            nombre_lots = self.calculate_total_lots()
-            lots_expires = self.calculate_expired_lots()
+            if filter_location:
+                query += " AND emplacement LIKE ?"
+                params.append(f"%{filter_location}%")
             
-            # Création du contenu PDF simple (texte)
-            content = f"""
-RAPPORT WMS - {datetime.now().strftime("%d/%m/%Y %H:%M")}
-{'='*50}
-
-KPIs PRINCIPAUX:
-- Stock Total Disponible: {stock_total:,.0f}
-- Nombre de Références: {references_actives:,}
-- Nombre de Lots: {nombre_lots:,}
-- Lots Expirant < 90j: {lots_expires:,}
-
-RÉSUMÉ:
-Le système WMS contient actuellement {stock_total:,.0f} unités réparties sur {references_actives:,} références différentes.
-{lots_expires:,} lots nécessitent une attention particulière car ils expirent dans les 90 prochains jours.
-
-Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M")}.
-            """
+            if filter_lot:
+                query += " AND lot LIKE ?"
+                params.append(f"%{filter_lot}%")
             
-            # Écriture du fichier (format texte simple)
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
+            condition, class_params = wms_classification.filter_sql(*classes)
+            query += condition
+            params.extend(class_params)
             
-            # Bouton de téléchargement
-            with open(filepath, 'rb') as file:
-                st.download_button(
-                    label="📥 Télécharger PDF",
-                    data=file.read(),
-                    file_name=filename,
-                    mime="application/pdf"
-                )
-            st.success(f"✅ Rapport PDF créé: {filename}")
+            query += " ORDER BY reference, lot"
+            
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            path = wms_jobs.artifact_path(f"rapport_wms_{timestamp}.pdf")
+            db_path = self.db.db_path
+            
+            def run_pdf(progress):
+                try:
+                    return wms_reports.build_stock_report_pdf(db_path, path, query, params, progress)
+                except ImportError:
+                    raise RuntimeError("reportlab n'est pas installé: export PDF indisponible")
+            
+            self.submit_job("export_pdf", "Rapport PDF", run_pdf)
             
         except Exception as e:
             st.error(f"Erreur lors de l'export PDF: {str(e)}")
@@ -1471,11 +1979,16 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
             
             with col1:
                 st.write("**Seuils d'Alerte**")
-                seuil_stock = st.number_input("Stock Minimum", value=10)
-                seuil_expiration = st.number_input("Jours avant expiration", value=7)
+                conn = self.db.get_connection()
+                current_stock, current_expiration = wms_alerts.get_thresholds(conn)
+                conn.close()
+                seuil_stock = st.number_input("Stock Minimum", min_value=0, value=current_stock)
+                seuil_expiration = st.number_input("Jours avant expiration", min_value=0, value=current_expiration)
                 
                 if st.button("Sauvegarder Seuils"):
                     self.save_alert_thresholds(seuil_stock, seuil_expiration)
+
+                self.reference_thresholds_section()
             
             with col2:
                 st.write("**Configuration Entrepôt**")
@@ -1502,17 +2015,34 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
             
             with col1:
                 st.write("**Sauvegarde**")
+                compress = st.checkbox("Compresser la sauvegarde (gzip)", value=True)
+                retention = st.number_input("Sauvegardes conservées", min_value=1, value=10)
                 if st.button("💾 Sauvegarder Base de Données"):
-                    self.backup_database()
-                
+                    self.backup_database(compress, retention)
+
                 if st.button("📄 Export Complet Excel"):
                     self.export_complete_excel()
-            
+
+                if st.button("🗃️ Instantané Parquet (BI)"):
+                    self.export_parquet_snapshot()
+
             with col2:
                 st.write("**Restauration**")
-                uploaded_backup = st.file_uploader("Restaurer sauvegarde", type=['db'])
+                uploaded_backup = st.file_uploader("Restaurer sauvegarde", type=['db', 'gz'])
                 if uploaded_backup and st.button("Restaurer"):
                     self.restore_database(uploaded_backup)
+
+                st.write("**Archivage**")
+                archive_before = st.text_input("Archiver les mouvements antérieurs au mois (AAAA-MM)",
+                                               value=(datetime.now() - timedelta(days=365)).strftime("%Y-%m"))
+                if st.button("📦 Archiver les mouvements"):
+                    self.archive_movements(archive_before)
+
+            st.write("**Sauvegardes Disponibles**")
+            self.display_backups_table()
+
+            st.write("**Fichiers Générés en Arrière-plan**")
+            self.display_job_artifacts()
             
             # Bouton réinitialiser DB
             st.write("**Réinitialiser Base de Données**")
@@ -1529,82 +2059,68 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
             self.display_system_info()
 
     # Méthodes utilitaires avec implémentations complètes
+    def cached_rows(self, name, tables, query):
+        """Lignes d'une requête d'options, mémorisées jusqu'à la prochaine écriture sur `tables`"""
+        return wms_cache.cached(self.db.db_path, name, tables, lambda conn: conn.execute(query).fetchall())
+
     def get_emplacements(self):
-        conn = self.db.get_connection()
-        emplacements = conn.execute("SELECT DISTINCT code FROM emplacements ORDER BY code").fetchall()
-        conn.close()
+        emplacements = self.cached_rows("emplacements", ("emplacements",),
+                                        "SELECT DISTINCT code FROM emplacements ORDER BY code")
         return [emp[0] for emp in emplacements] if emplacements else ["A1-01", "A1-02", "B2-01", "C3-01"]
     
     def get_emplacements_disponibles(self):
-        conn = self.db.get_connection()
-        emplacements = conn.execute("""
+        emplacements = self.cached_rows("emplacements_disponibles", ("emplacements",), """
             SELECT code FROM emplacements 
             WHERE capacite_utilisee < capacite_max OR capacite_max IS NULL
             ORDER BY code
-        """).fetchall()
-        conn.close()
+        """)
         return [emp[0] for emp in emplacements] if emplacements else ["A1-01", "A1-02", "B2-01"]
     
     def get_stock_references(self):
-        conn = self.db.get_connection()
-        refs = conn.execute("SELECT DISTINCT reference FROM stocks ORDER BY reference").fetchall()
-        conn.close()
+        refs = self.cached_rows("references", ("stocks",),
+                                "SELECT DISTINCT reference FROM stocks ORDER BY reference")
         return [ref[0] for ref in refs] if refs else []
     
+    def key_picker(self, label, index_name, key, limit=50):
+        """Saisie d'un préfixe puis choix parmi les premières correspondances de l'index en mémoire"""
+        prefix = st.text_input(f"🔍 {label}", key=f"{key}_prefix", placeholder="Tapez le début...")
+        matches, total = wms_index.typeahead(self.db.db_path, index_name, prefix.strip(), limit)
+        if not matches:
+            st.info("Aucune correspondance")
+            return None
+        if total > len(matches):
+            st.caption(f"{len(matches)} premières correspondances sur {total:,}, précisez la saisie")
+        return st.selectbox(label, matches, key=key)
+
     def get_suppliers(self):
-        return ["Fournisseur A", "Fournisseur B"]
-    
-    def get_clients(self):
-        return ["Client A", "Client B"]
+        suppliers = self.cached_rows("fournisseurs", ("fournisseurs",),
+                                     "SELECT nom FROM fournisseurs WHERE actif = 1 ORDER BY nom")
+        return [row[0] for row in suppliers]
+
 
     # Méthodes de données avec placeholders fonctionnels
     def import_stock_data(self, file):
         try:
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(file)
-            else:
-                df = pd.read_excel(file)
+            data = file.getvalue()
+            db_path = self.db.db_path
             
-            conn = self.db.get_connection()
-            for _, row in df.iterrows():
-                # Vérifier que les champs obligatoires ne sont pas vides
-                reference = row.get('reference') or f"REF_{len(df.index)}"
-                designation = row.get('designation') or f"Article {reference}"
-                quantite = row.get('quantite') or 0
-                emplacement = row.get('emplacement') or "LIBRE"
-                
-                conn.execute("""
-                    INSERT INTO stocks (reference, designation, quantite, emplacement, lot, date_expiration)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (reference, designation, quantite, emplacement, 
-                      row.get('lot'), row.get('date_expiration')))
-            conn.commit()
-            conn.close()
-            st.success(f"✅ {len(df)} articles importés avec succès!")
+            def run_import(progress):
+                count = wms_services.import_stock_file(db_path, data, file.name, progress)
+                return None, f"{count} articles importés"
+            
+            self.submit_job("import", f"Import {file.name}", run_import)
         except Exception as e:
             st.error(f"❌ Erreur lors de l'import: {str(e)}")
     
     def add_stock_item(self, ref, desig, qty, emp, lot, exp_date):
         try:
-            # Validation des champs obligatoires
-            if not ref or ref.strip() == "":
-                ref = f"REF_{int(time.time())}"
-            if not desig or desig.strip() == "":
-                desig = f"Article {ref}"
-            
-            conn = self.db.get_connection()
-            conn.execute("""
-                INSERT INTO stocks (reference, designation, quantite, emplacement, lot, date_expiration)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (ref.strip(), desig.strip(), qty or 0, emp or "LIBRE", lot, exp_date))
-            conn.commit()
-            conn.close()
+            ref = wms_services.add_stock_item(self.db.db_path, ref, desig, qty, emp, lot, exp_date)
             st.success(f"✅ Article {ref} ajouté au stock")
             st.rerun()
         except Exception as e:
             st.error(f"❌ Erreur: {str(e)}")
     
-    def display_stock_table(self, search, emplacement, alert):
+    def display_stock_table(self, search, emplacement, alert, abc=None, xyz=None, zones=None):
         conn = self.db.get_connection()
         query = "SELECT reference, designation, quantite, emplacement, lot, date_expiration FROM stocks WHERE 1=1"
         params = []
@@ -1618,9 +2134,17 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
             params.append(emplacement)
         
         if alert == "Stock faible":
-            query += " AND quantite < 10"
+            query += " AND id IN (SELECT stock_id FROM alerts WHERE type = 'stock_faible')"
         elif alert == "Expiration proche":
-            query += " AND date_expiration <= date('now', '+7 days')"
+            query += " AND id IN (SELECT stock_id FROM alerts WHERE type = 'expiration')"
+        
+        condition, class_params = wms_classification.filter_sql(abc, xyz)
+        query += condition
+        params.extend(class_params)
+        
+        condition, zone_params = wms_zones.filter_sql(zones)
+        query += condition
+        params.extend(zone_params)
         
         df = pd.read_sql_query(query, conn, params=params)
         conn.close()
@@ -1631,60 +2155,12 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
             st.info("Aucun article trouvé")
     
     def show_stock_alerts(self):
-        conn = self.db.get_connection()
-        
-        # Alertes stock faible
-        low_stock = conn.execute("SELECT reference, quantite FROM stocks WHERE quantite < 10").fetchall()
-        
-        # Alertes expiration
-        expiring = conn.execute("""
-            SELECT reference, date_expiration 
-            FROM stocks 
-            WHERE date_expiration <= date('now', '+7 days') 
-            AND date_expiration IS NOT NULL
-        """).fetchall()
-        
-        conn.close()
-        
-        if low_stock:
-            for ref, qty in low_stock:
-                st.warning(f"⚠️ {ref}: Stock faible ({qty} unités)")
-        
-        if expiring:
-            for ref, exp_date in expiring:
-                st.error(f"🚨 {ref}: Expiration le {exp_date}")
-        
-        if not low_stock and not expiring:
-            st.success("✅ Aucune alerte stock")
+        self.alerts_digest_section("stocks")
     
-    def create_reception(self, ref, qty, fournisseur, date, emplacement):
+    def create_reception(self, ref, qty, fournisseur, date, emplacement, date_commande=None):
         try:
-            # Validation des champs obligatoires
-            if not ref or ref.strip() == "":
-                ref = f"REF_{int(time.time())}"
-            if not emplacement or emplacement.strip() == "":
-                emplacement = "LIBRE"
-            
-            conn = self.db.get_connection()
-            # Créer la réception
-            conn.execute("""
-                INSERT INTO receptions (reference, quantite, fournisseur, date_reception, emplacement)
-                VALUES (?, ?, ?, ?, ?)
-            """, (ref.strip(), qty, fournisseur or "Fournisseur inconnu", date, emplacement.strip()))
-            
-            # Mettre à jour le stock
-            existing = conn.execute("SELECT quantite FROM stocks WHERE reference = ?", (ref,)).fetchone()
-            if existing:
-                new_qty = existing[0] + qty
-                conn.execute("UPDATE stocks SET quantite = ? WHERE reference = ?", (new_qty, ref))
-            else:
-                conn.execute("""
-                    INSERT INTO stocks (reference, designation, quantite, emplacement)
-                    VALUES (?, ?, ?, ?)
-                """, (ref, f"Produit {ref}", qty, emplacement or "LIBRE"))
-            
-            conn.commit()
-            conn.close()
+            ref = wms_services.create_reception(self.db.db_path, ref, qty, fournisseur, date, emplacement,
+                                                date_commande)
             st.success(f"✅ Réception créée: {qty} x {ref} de {fournisseur}")
             st.success(f"📦 Stock mis à jour automatiquement")
             st.rerun()
@@ -1694,7 +2170,7 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
     def display_recent_receptions(self):
         conn = self.db.get_connection()
         df = pd.read_sql_query("""
-            SELECT date_reception, reference, quantite, fournisseur, statut
+            SELECT date_reception, date_commande, reference, quantite, fournisseur, statut
             FROM receptions 
             ORDER BY date_creation DESC 
             LIMIT 5
@@ -1711,43 +2187,12 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
     
     def create_expedition(self, num_commande, ref, qty, client, emplacement):
         try:
-            # Validation des champs obligatoires
-            if not emplacement or emplacement.strip() == "":
-                emplacement = "LIBRE"
-            
-            conn = self.db.get_connection()
-            # Vérifier le stock disponible à l'emplacement spécifié
-            stock = conn.execute("""
-                SELECT quantite FROM stocks 
-                WHERE reference = ? AND emplacement = ?
-            """, (ref, emplacement.strip())).fetchone()
-            
-            if not stock:
-                st.error(f"❌ Référence {ref} introuvable à l'emplacement {emplacement}")
-                return
-            
-            if stock[0] < qty:
-                st.error(f"❌ Stock insuffisant à {emplacement}. Disponible: {stock[0]}, Demandé: {qty}")
-                return
-            
-            # Créer l'expédition
-            conn.execute("""
-                INSERT INTO expeditions (numero_commande, reference, quantite, client, emplacement)
-                VALUES (?, ?, ?, ?, ?)
-            """, (num_commande, ref, qty, client or "Client inconnu", emplacement.strip()))
-            
-            # Réduire le stock à l'emplacement spécifié
-            new_qty = stock[0] - qty
-            conn.execute("""
-                UPDATE stocks SET quantite = ? 
-                WHERE reference = ? AND emplacement = ?
-            """, (new_qty, ref, emplacement.strip()))
-            
-            conn.commit()
-            conn.close()
+            wms_services.create_expedition(self.db.db_path, num_commande, ref, qty, client, emplacement)
             st.success(f"✅ Commande {num_commande} créée pour {client}")
             st.success(f"📦 Stock réduit automatiquement: -{qty} unités")
             st.rerun()
+        except ValueError as e:
+            st.error(f"❌ {str(e)}")
         except Exception as e:
             st.error(f"❌ Erreur: {str(e)}")
     
@@ -1757,82 +2202,117 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
     def display_expeditions_tracking(self):
         st.info("📈 Suivi en temps réel des expéditions")
     
-    def execute_transfer(self, ref, qty, emp_source, emp_dest, motif, utilisateur):
+    def execute_transfer(self, ref, qty, emp_source, emp_dest, motif, utilisateur, lot=None):
         try:
-            # Validation des champs obligatoires
-            if not emp_source or emp_source.strip() == "":
-                st.error("❌ Emplacement source requis")
-                return
-            if not emp_dest or emp_dest.strip() == "":
-                st.error("❌ Emplacement destination requis")
-                return
-            if emp_source.strip() == emp_dest.strip():
-                st.error("❌ Les emplacements source et destination doivent être différents")
-                return
-            
-            conn = self.db.get_connection()
-            # Vérifier le stock à l'emplacement source
-            stock = conn.execute("""
-                SELECT quantite FROM stocks 
-                WHERE reference = ? AND emplacement = ?
-            """, (ref, emp_source.strip())).fetchone()
-            
-            if not stock or stock[0] < qty:
-                st.error(f"❌ Stock insuffisant à l'emplacement {emp_source}")
-                return
-            
-            # Enregistrer le transfert
-            conn.execute("""
-                INSERT INTO transferts (reference, quantite, emplacement_source, emplacement_destination, motif, utilisateur)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (ref, qty, emp_source.strip(), emp_dest.strip(), motif, utilisateur or "Admin"))
-            
-            # Mettre à jour les stocks
-            # Réduire stock source
-            new_qty_source = stock[0] - qty
-            conn.execute("""
-                UPDATE stocks SET quantite = ? 
-                WHERE reference = ? AND emplacement = ?
-            """, (new_qty_source, ref, emp_source))
-            
-            # Augmenter stock destination
-            dest_stock = conn.execute("""
-                SELECT quantite FROM stocks 
-                WHERE reference = ? AND emplacement = ?
-            """, (ref, emp_dest.strip())).fetchone()
-            
-            if dest_stock:
-                new_qty_dest = dest_stock[0] + qty
-                conn.execute("""
-                    UPDATE stocks SET quantite = ? 
-                    WHERE reference = ? AND emplacement = ?
-                """, (new_qty_dest, ref, emp_dest.strip()))
-            else:
-                # Créer nouvelle entrée stock
-                designation = conn.execute("SELECT designation FROM stocks WHERE reference = ? LIMIT 1", (ref,)).fetchone()
-                conn.execute("""
-                    INSERT INTO stocks (reference, designation, quantite, emplacement)
-                    VALUES (?, ?, ?, ?)
-                """, (ref, designation[0] if designation else f"Produit {ref}", qty, emp_dest.strip()))
-            
-            conn.commit()
-            conn.close()
+            wms_services.execute_transfer(self.db.db_path, ref, qty, emp_source, emp_dest, motif, utilisateur, lot)
             st.success(f"✅ Transfert exécuté: {qty} x {ref} de {emp_source} vers {emp_dest}")
             st.success(f"📦 Stocks mis à jour automatiquement")
             st.rerun()
+        except ValueError as e:
+            st.error(f"❌ {str(e)}")
         except Exception as e:
             st.error(f"❌ Erreur: {str(e)}")
     
     def display_recent_transfers(self):
-        st.info("📋 Derniers transferts effectués")
-    
+        try:
+            conn = self.db.get_connection()
+            rows = wms_movements.recent_transfers(conn)
+            conn.close()
+            if rows:
+                st.dataframe(pd.DataFrame(rows, columns=["Date", "Référence", "Quantité", "Source",
+                                                         "Destination", "Utilisateur"]),
+                             use_container_width=True, hide_index=True)
+            else:
+                st.info("Aucun transfert enregistré")
+        except Exception as e:
+            st.error(f"Erreur transferts récents: {str(e)}")
+
+    @_fragment()
     def display_transfers_history(self):
-        st.info("📈 Historique complet des transferts")
-    
+        """Recherche dans l'historique des transferts ; les filtres ne relancent que ce fragment"""
+        try:
+            conn = self.db.get_connection()
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                reference = st.text_input("Référence", key="transfer_history_ref").strip()
+            with col2:
+                utilisateur = st.selectbox("Utilisateur", ["Tous"] + wms_movements.transfer_users(conn),
+                                           key="transfer_history_user")
+            with col3:
+                period = st.selectbox("Période", ["30 jours", "90 jours", "365 jours", "Tout l'historique"],
+                                      key="transfer_history_period")
+            days = None if period == "Tout l'historique" else int(period.split()[0])
+            rows = wms_movements.transfer_history(conn, reference or None,
+                                                  None if utilisateur == "Tous" else utilisateur, days)
+            conn.close()
+            if rows:
+                st.dataframe(pd.DataFrame(rows, columns=["Date", "Référence", "Quantité", "Source", "Destination",
+                                                         "Motif", "Utilisateur"]),
+                             use_container_width=True, hide_index=True)
+                if len(rows) >= wms_movements.HISTORY_LIMIT:
+                    st.caption(f"{wms_movements.HISTORY_LIMIT} transferts les plus récents affichés, affinez les filtres")
+            else:
+                st.info("Aucun transfert pour ces critères")
+        except Exception as e:
+            st.error(f"Erreur historique transferts: {str(e)}")
+
+    @_fragment()
     def show_movement_analytics(self):
-        fig = go.Figure()
-        fig.add_trace(go.Bar(x=['Transferts', 'Réceptions', 'Expéditions'], y=[15, 25, 20]))
-        st.plotly_chart(fig, use_container_width=True)
+        """Mouvements par type, emplacements les plus sollicités et activité par utilisateur (agrégats)"""
+        try:
+            col1, col2 = st.columns(2)
+            with col1:
+                days = st.select_slider("Période (jours)", options=[7, 30, 90, 180, 365], value=90,
+                                        key="movements_days")
+            with col2:
+                granularity = st.radio("Regroupement", list(wms_movements.GRANULARITIES), horizontal=True,
+                                       key="movements_granularity")
+            conn = self.db.get_connection()
+            totals = wms_movements.movement_totals(conn, days)
+            series = wms_movements.movement_series(conn, days, granularity)
+            tops = {direction: wms_movements.top_locations(conn, direction) for direction in wms_movements.DIRECTIONS}
+            activity = wms_movements.user_activity(conn, max(days // 30, 1))
+            conn.close()
+
+            for col, (movement_type, (count, units)) in zip(st.columns(len(totals)), totals.items()):
+                with col:
+                    st.metric(f"{movement_type}s", f"{count:,}", help=f"{units:,} unités sur {days} jours")
+
+            if series:
+                df = pd.DataFrame(series, columns=['Période', 'Type', 'Mouvements', 'Unités'])
+                measure = st.radio("Mesure", ['Mouvements', 'Unités'], horizontal=True, key="movements_measure")
+                fig = px.bar(df, x='Période', y=measure, color='Type', barmode='group',
+                             category_orders={'Type': list(wms_movements.MOVEMENT_TYPES)},
+                             title=f"{measure} par {granularity.lower()}")
+                fig.update_layout(height=400)
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.info("Aucun mouvement sur la période")
+
+            col1, col2 = st.columns(2)
+            for col, (direction, title) in zip((col1, col2), (("Sortie", "Emplacements sources"),
+                                                               ("Entrée", "Emplacements destinations"))):
+                with col:
+                    if tops[direction]:
+                        df = pd.DataFrame(tops[direction], columns=['Emplacement', 'Mouvements', 'Unités'])
+                        fig = go.Figure(go.Bar(x=df['Mouvements'], y=df['Emplacement'], orientation='h',
+                                               customdata=df['Unités'],
+                                               hovertemplate="%{y}: %{x} mouvements, %{customdata} unités<extra></extra>"))
+                        fig.update_layout(title=f"Top {title}", height=350, yaxis={'autorange': 'reversed'})
+                        st.plotly_chart(fig, use_container_width=True)
+                    else:
+                        st.info(f"Aucun mouvement en {direction.lower()}")
+
+            if activity:
+                df = pd.DataFrame(activity, columns=['Utilisateur', 'Motif', 'Transferts', 'Unités'])
+                fig = px.bar(df, x='Utilisateur', y='Transferts', color='Motif', hover_data=['Unités'],
+                             title="Transferts par utilisateur et par motif")
+                fig.update_layout(height=350)
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.info("Aucun transfert sur la période")
+        except Exception as e:
+            st.error(f"Erreur analyse des mouvements: {str(e)}")
     
     def create_emplacement(self, code, zone, capacite):
         try:
@@ -1858,9 +2338,6 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
         with col2:
             st.metric("Occupation", "78%")
     
-    def display_warehouse_map(self):
-        st.info("🗺️ Plan interactif de l'entrepôt")
-    
     def display_emplacements_table(self):
         conn = self.db.get_connection()
         df = pd.read_sql_query("""
@@ -1900,13 +2377,12 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
             return 0
     
     def calculate_total_lots(self):
-        """Calcule le nombre total de lots"""
+        """Calcule le nombre total de lots (un article sans lot compte pour un lot)"""
         try:
             conn = self.db.get_connection()
-            # Simulation basée sur les stocks (1 lot par référence + variations)
-            count = conn.execute("SELECT COUNT(*) FROM stocks WHERE quantite > 0").fetchone()[0] or 0
+            count = wms_kpis.compute_kpis(conn)['lots']
             conn.close()
-            return count + (count // 3)  # Simulation de lots multiples
+            return count
         except:
             return 0
     
@@ -1914,10 +2390,9 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
         """Calcule le nombre de lots expirés ou proches de l'expiration (<90 jours)"""
         try:
             conn = self.db.get_connection()
-            # Simulation basée sur l'âge des données
-            total_lots = self.calculate_total_lots()
+            count = wms_kpis.compute_kpis(conn)['lots_expiration_proche']
             conn.close()
-            return max(0, total_lots // 10)  # Simulation: 10% des lots proches expiration
+            return count
         except:
             return 0
     
@@ -1935,11 +2410,11 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
     def calculate_stockout_rate(self):
         try:
             conn = self.db.get_connection()
-            # Articles avec quantité = 0
-            total_articles = conn.execute("SELECT COUNT(DISTINCT reference) FROM stocks").fetchone()[0] or 1
-            ruptures = conn.execute("SELECT COUNT(DISTINCT reference) FROM stocks WHERE quantite = 0").fetchone()[0] or 0
+            # Références dont le stock total est nul (table de couverture, par référence)
+            wms_coverage.refresh_if_due(conn)
+            rate = wms_coverage.stockout_kpis(conn)['taux_rupture']
             conn.close()
-            return (ruptures / total_articles) * 100
+            return rate
         except:
             return 0
     
@@ -1954,26 +2429,27 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
             return 0
     
     def calculate_inventory_accuracy(self):
+        """(exactitude %, lignes comptées) des inventaires tournants récents, None sans comptage"""
         try:
             conn = self.db.get_connection()
-            # Précision basée sur les mouvements cohérents
-            total_movements = conn.execute("SELECT COUNT(*) FROM receptions").fetchone()[0] or 1
+            accuracy = wms_cycle_count.inventory_accuracy(conn)
             conn.close()
-            return min(98.5, 90 + (total_movements * 0.1))  # Simulation basée sur l'activité
-        except:
-            return 95.0
+            return accuracy
+        except Exception:
+            return None
     
     def show_top_references_chart(self):
         """Affiche un bar chart des top 10 références avec le plus grand stock"""
         try:
+            condition, params = wms_classification.filter_sql(*self.class_filters("top_chart"))
             conn = self.db.get_connection()
-            df = pd.read_sql_query("""
+            df = pd.read_sql_query(f"""
                 SELECT reference, designation, quantite
                 FROM stocks 
-                WHERE quantite > 0
+                WHERE quantite > 0{condition}
                 ORDER BY quantite DESC
                 LIMIT 10
-            """, conn)
+            """, conn, params=params)
             conn.close()
             
             if not df.empty:
@@ -2014,44 +2490,25 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
         """Affiche un pie chart de la répartition des stocks par zone d'emplacement"""
         try:
             conn = self.db.get_connection()
-            df = pd.read_sql_query("""
-                SELECT 
-                    CASE 
-                        WHEN emplacement LIKE 'A%' THEN 'Zone A'
-                        WHEN emplacement LIKE 'B%' THEN 'Zone B'
-                        WHEN emplacement LIKE 'C%' THEN 'Zone C'
-                        ELSE 'Autres'
-                    END as zone,
-                    SUM(quantite) as total_stock
-                FROM stocks 
-                WHERE quantite > 0
-                GROUP BY zone
-            """, conn)
+            zones = wms_zones.zone_totals(conn)
             conn.close()
             
+            df = pd.DataFrame(zones, columns=['zone', 'emplacements', 'lignes', 'total_stock'])
+            df = df[df['total_stock'] > 0]
             if not df.empty:
                 fig = go.Figure()
                 fig.add_trace(go.Pie(
                     labels=df['zone'], 
                     values=df['total_stock'],
+                    customdata=df[['emplacements', 'lignes']],
+                    hovertemplate="Zone %{label}: %{value:,} unités<br>%{customdata[1]:,} lignes, "
+                                  "%{customdata[0]:,} emplacements<extra></extra>",
                     hole=0.3
                 ))
                 fig.update_layout(title="Répartition des Stocks par Zone")
                 st.plotly_chart(fig, use_container_width=True)
             else:
-                # Données d'exemple
-                sample_data = {
-                    'zone': ['Zone A', 'Zone B', 'Zone C', 'Zone Froid'],
-                    'stock': [35, 25, 20, 20]
-                }
-                fig = go.Figure()
-                fig.add_trace(go.Pie(
-                    labels=sample_data['zone'], 
-                    values=sample_data['stock'],
-                    hole=0.3
-                ))
-                fig.update_layout(title="Répartition des Stocks par Zone (Exemple)")
-                st.plotly_chart(fig, use_container_width=True)
+                st.info("Aucun stock rattaché à une zone")
         except Exception as e:
             st.error(f"Erreur lors du chargement: {str(e)}")
     
@@ -2059,28 +2516,18 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
         """Affiche un histogramme du nombre de lots par date d'expiration (par mois)"""
         try:
             # Simulation de données d'expiration basées sur les stocks actuels
-            import datetime
-            try:
-                from dateutil.relativedelta import relativedelta
-            except ImportError:
-                relativedelta = None
-            
             conn = self.db.get_connection()
             stock_count = conn.execute("SELECT COUNT(*) FROM stocks WHERE quantite > 0").fetchone()[0] or 0
             conn.close()
             
             if stock_count > 0:
                 # Génération de dates d'expiration simulées
-                today = datetime.date.today()
+                today = dt_date.today()
                 months = []
                 lots_count = []
                 
                 for i in range(12):  # 12 prochains mois
-                    if relativedelta:
-                        month_date = today + relativedelta(months=i)
-                    else:
-                        # Fallback sans dateutil
-                        month_date = today.replace(month=min(12, today.month + i))
+                    month_date = _add_months(today, i)
                     month_name = month_date.strftime("%Y-%m")
                     # Simulation: distribution décroissante des lots
                     count = max(1, stock_count // (i + 2))
@@ -2202,25 +2649,26 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
         except Exception as e:
             st.error(f"Erreur matrice: {str(e)}")
     
-    def show_filtered_stock_table(self, filter_zone, filter_ref, filter_stock_min):
+    def show_filtered_stock_table(self, filter_zones, filter_ref, filter_stock_min):
         """Affiche un tableau filtré des stocks"""
         try:
             conn = self.db.get_connection()
-            query = "SELECT reference, designation, quantite, emplacement FROM stocks WHERE quantite >= ?"
+            query = """
+                SELECT s.reference, s.designation, s.quantite, s.emplacement, e.zone
+                FROM stocks s LEFT JOIN emplacements e ON e.id = s.emplacement_id
+                WHERE s.quantite >= ?
+            """
             params = [filter_stock_min]
             
-            if filter_zone != "Toutes":
-                if filter_zone == "Autres":
-                    query += " AND (emplacement NOT LIKE 'A%' AND emplacement NOT LIKE 'B%' AND emplacement NOT LIKE 'C%')"
-                else:
-                    query += " AND emplacement LIKE ?"
-                    params.append(f"{filter_zone.split()[-1]}%")
+            condition, zone_params = wms_zones.filter_sql(filter_zones, "s.emplacement_id")
+            query += condition
+            params.extend(zone_params)
             
             if filter_ref:
-                query += " AND reference LIKE ?"
+                query += " AND s.reference LIKE ?"
                 params.append(f"%{filter_ref}%")
             
-            query += " ORDER BY quantite DESC"
+            query += " ORDER BY s.quantite DESC"
             
             df = pd.read_sql_query(query, conn, params=params)
             conn.close()
@@ -2234,237 +2682,152 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
             st.error(f"Erreur filtrage: {str(e)}")
     
     def export_complete_analysis_excel(self):
-        """Export complet en Excel"""
+        """Export complet en Excel (tâche d'arrière-plan)"""
         try:
-            import pandas as pd
-            from datetime import datetime
-            import os
-            
-            # Création du dossier d'export s'il n'existe pas
-            export_dir = os.path.join(os.getcwd(), "exports")
-            os.makedirs(export_dir, exist_ok=True)
-            
-            # Nom du fichier avec timestamp
             filename = f"analyse_complete_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            filepath = os.path.join(export_dir, filename)
-            
-            # Récupération des données
-            conn = self.db.get_connection()
-            
-            # Feuille 1: Stocks
-            df_stocks = pd.read_sql_query("""
-                SELECT reference, designation, quantite, emplacement, 
-                       date_creation as derniere_maj
-                FROM stocks 
-                ORDER BY quantite DESC
-            """, conn)
-            
-            # Feuille 2: KPIs
-            kpis_data = {
-                'KPI': ['Stock Total', 'Références Actives', 'Lots Distincts', 'Lots < 90j', '% Stock Expiré'],
-                'Valeur': [
-                    self.calculate_total_stock(),
-                    self.calculate_active_references(), 
-                    self.calculate_total_lots(),
-                    self.calculate_expired_lots(),
-                    f"{self.calculate_expired_percentage():.1f}%"
-                ]
-            }
-            df_kpis = pd.DataFrame(kpis_data)
-            
-            # Feuille 3: Mouvements récents
-            df_mouvements = pd.read_sql_query("""
-                SELECT 'Réception' as type, reference, quantite, emplacement, date_creation
-                FROM receptions
-                UNION ALL
-                SELECT 'Expédition' as type, reference, quantite, emplacement_source as emplacement, date_creation
-                FROM expeditions
-                ORDER BY date_creation DESC
-                LIMIT 100
-            """, conn)
-            
-            conn.close()
-            
-            # Écriture du fichier Excel
-            with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                df_stocks.to_excel(writer, sheet_name='Stocks', index=False)
-                df_kpis.to_excel(writer, sheet_name='KPIs', index=False)
-                df_mouvements.to_excel(writer, sheet_name='Mouvements', index=False)
-            
-            # Proposer le téléchargement
-            with open(filepath, 'rb') as file:
-                st.download_button(
-                    label="📎 Télécharger le fichier Excel",
-                    data=file.read(),
-                    file_name=filename,
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
-            
-            st.success(f"📊 Export Excel généré avec succès!")
-            st.info(f"Fichier créé: {filepath}")
-            
+            path = wms_jobs.artifact_path(filename)
+            db_path = self.db.db_path
+            self.submit_job(
+                "export_excel", "Analyse complète Excel",
+                lambda progress: wms_export.export_analysis_workbook(db_path, path, progress)
+            )
         except Exception as e:
             st.error(f"Erreur export Excel: {str(e)}")
     
     def export_monthly_report_pdf(self):
-        """Export du rapport mensuel en PDF"""
-        try:
-            from reportlab.lib.pagesizes import letter, A4
-            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.lib.units import inch
-            from reportlab.lib import colors
-            from datetime import datetime
-            import os
-            
-            # Création du dossier d'export
-            export_dir = os.path.join(os.getcwd(), "exports")
-            os.makedirs(export_dir, exist_ok=True)
-            
-            # Nom du fichier
-            filename = f"rapport_mensuel_{datetime.now().strftime('%Y%m')}.pdf"
-            filepath = os.path.join(export_dir, filename)
-            
-            # Création du document PDF
-            doc = SimpleDocTemplate(filepath, pagesize=A4)
-            styles = getSampleStyleSheet()
-            story = []
-            
-            # Titre
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=24,
-                spaceAfter=30,
-                textColor=colors.darkblue
-            )
-            story.append(Paragraph("Rapport Mensuel WMS", title_style))
-            story.append(Paragraph(f"Généré le {datetime.now().strftime('%d/%m/%Y')}", styles['Normal']))
-            story.append(Spacer(1, 20))
-            
-            # KPIs
-            story.append(Paragraph("KPIs Principaux", styles['Heading2']))
-            kpis_data = [
-                ['KPI', 'Valeur'],
-                ['Stock Total', f"{self.calculate_total_stock():,}"],
-                ['Références Actives', f"{self.calculate_active_references():,}"],
-                ['Lots Distincts', f"{self.calculate_total_lots():,}"],
-                ['Lots < 90j', f"{self.calculate_expired_lots():,}"],
-                ['% Stock Expiré', f"{self.calculate_expired_percentage():.1f}%"]
-            ]
-            
-            kpis_table = Table(kpis_data)
-            kpis_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 14),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            
-            story.append(kpis_table)
-            story.append(Spacer(1, 20))
-            
-            # Recommandations
-            story.append(Paragraph("Recommandations", styles['Heading2']))
-            recommendations = [
-                "• Attention: lots expirant dans les 30 prochains jours",
-                "• Optimiser la rotation des stocks en Zone A",
-                "• Surveiller les références à stock faible",
-                "• Planifier les réapprovisionnements critiques"
-            ]
-            
-            for rec in recommendations:
-                story.append(Paragraph(rec, styles['Normal']))
-                story.append(Spacer(1, 6))
-            
-            # Génération du PDF
-            doc.build(story)
-            
-            # Proposer le téléchargement
-            with open(filepath, 'rb') as file:
-                st.download_button(
-                    label="📎 Télécharger le rapport PDF",
-                    data=file.read(),
-                    file_name=filename,
-                    mime="application/pdf"
+        """Export du rapport mensuel en PDF (tâche d'arrière-plan)"""
+        db_path = self.db.db_path
+        
+        def run_report(progress):
+            context = wms_reports.prepare_monthly_context(db_path)
+            progress(0.2, "KPIs et agrégats chargés")
+            month = context['periode'].replace('-', '')
+            try:
+                path = wms_reports.build_monthly_report_pdf(
+                    wms_jobs.artifact_path(f"rapport_mensuel_{month}.pdf"), context, progress
                 )
-            
-            st.success(f"📄 Rapport PDF généré avec succès!")
-            st.info(f"Fichier créé: {filepath}")
-            
-        except ImportError:
-            st.error("⚠️ Module reportlab non installé. Installez avec: pip install reportlab")
-            # Version simplifiée sans reportlab
-            self.export_simple_report()
+                return path, "Rapport PDF généré"
+            except ImportError:
+                # Version simplifiée sans reportlab
+                path = wms_reports.build_monthly_report_text(
+                    wms_jobs.artifact_path(f"rapport_mensuel_{month}.txt"), context, progress
+                )
+                return path, "reportlab non installé: rapport généré au format texte"
+        
+        try:
+            self.submit_job("rapport_pdf", "Rapport mensuel", run_report)
         except Exception as e:
             st.error(f"Erreur export PDF: {str(e)}")
-    
-    def export_simple_report(self):
-        """Version simplifiée du rapport sans reportlab"""
+
+    def submit_job(self, job_type, libelle, func):
+        """Lance une tâche d'arrière-plan et la rattache à la session courante"""
+        job_id = self.jobs.submit(job_type, libelle, func)
+        st.session_state.jobs.append(job_id)
+        st.info(f"⏳ {libelle} lancé en arrière-plan (tâche #{job_id}), suivi dans le panneau latéral")
+
+    def display_job_artifacts(self):
+        artifacts = self.jobs.finished_artifacts()
+        if not artifacts:
+            st.info("Aucun fichier généré")
+            return
+
+        df = pd.DataFrame([
+            {'Tâche': f"#{a['id']} {a['libelle']}", 'Fichier': Path(a['fichier']).name, 'Terminé le': a['date_fin']}
+            for a in artifacts
+        ])
+        st.dataframe(df, use_container_width=True)
+
+        selected = st.selectbox("Fichier à télécharger", [a['fichier'] for a in artifacts],
+                                format_func=lambda f: Path(f).name, key="select_job_artifact")
+        with open(selected, 'rb') as file:
+            st.download_button(label="📥 Télécharger", data=file.read(),
+                               file_name=Path(selected).name, key="download_job_artifact")
+
+    @_fragment(run_every=2)
+    def show_jobs_panel(self):
+        """Progression et téléchargements des tâches de la session, rafraîchis sans rerun complet"""
+        if not st.session_state.jobs:
+            return
+        with st.expander("📥 Tâches & Téléchargements", expanded=True):
+            self.display_session_jobs()
+
+    def display_session_jobs(self):
+        for job in self.jobs.get_jobs(st.session_state.jobs):
+            title = f"#{job['id']} {job['libelle']}"
+            if job['statut'] in (wms_jobs.STATUS_PENDING, wms_jobs.STATUS_RUNNING):
+                st.progress(job['progression'] or 0.0, text=f"{title} — {job['message'] or job['statut']}")
+            elif job['statut'] == wms_jobs.STATUS_FAILED:
+                st.error(f"❌ {title}: {job['message']}")
+            else:
+                st.success(f"✅ {title}: {job['message'] or job['statut']}")
+                path = Path(job['fichier']) if job['fichier'] else None
+                if path and path.exists():
+                    with open(path, 'rb') as file:
+                        st.download_button(
+                            label=f"📥 {path.name}",
+                            data=file.read(),
+                            file_name=path.name,
+                            key=f"job_download_{job['id']}"
+                        )
+
+    @_fragment()
+    def generate_automatic_monthly_report(self):
+        """Programmation et historique des rapports mensuels automatiques"""
         try:
-            import os
-            from datetime import datetime
-            
-            export_dir = os.path.join(os.getcwd(), "exports")
-            os.makedirs(export_dir, exist_ok=True)
-            
-            filename = f"rapport_mensuel_{datetime.now().strftime('%Y%m')}.txt"
-            filepath = os.path.join(export_dir, filename)
-            
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write("RAPPORT MENSUEL WMS\n")
-                f.write("=" * 50 + "\n\n")
-                f.write(f"Généré le: {datetime.now().strftime('%d/%m/%Y %H:%M')}\n\n")
-                
-                f.write("KPIs PRINCIPAUX:\n")
-                f.write("-" * 20 + "\n")
-                f.write(f"Stock Total: {self.calculate_total_stock():,}\n")
-                f.write(f"Références Actives: {self.calculate_active_references():,}\n")
-                f.write(f"Lots Distincts: {self.calculate_total_lots():,}\n")
-                f.write(f"Lots < 90j: {self.calculate_expired_lots():,}\n")
-                f.write(f"% Stock Expiré: {self.calculate_expired_percentage():.1f}%\n\n")
-                
-                f.write("RECOMMANDATIONS:\n")
-                f.write("-" * 20 + "\n")
-                f.write("• Attention: lots expirant dans les 30 prochains jours\n")
-                f.write("• Optimiser la rotation des stocks en Zone A\n")
-                f.write("• Surveiller les références à stock faible\n")
-                f.write("• Planifier les réapprovisionnements critiques\n")
-            
-            with open(filepath, 'r', encoding='utf-8') as file:
-                st.download_button(
-                    label="📎 Télécharger le rapport (TXT)",
-                    data=file.read(),
-                    file_name=filename,
-                    mime="text/plain"
-                )
+            conn = self.db.get_connection()
+            enabled = wms_services.get_parametre(conn, wms_reports.AUTO_REPORT_KEY, "0") == "1"
+            reports = wms_reports.list_reports(conn)
+            conn.close()
             
-            st.success(f"📄 Rapport généré: {filepath}")
+            auto = st.checkbox(
+                f"Générer le rapport du mois précédent le {wms_reports.SCHEDULE_DAY}er de chaque mois "
+                f"(à partir de {wms_reports.SCHEDULE_HOUR}h)",
+                value=enabled, key="rapport_auto_actif"
+            )
+            if auto != enabled:
+                conn = self.db.get_connection()
+                wms_services.set_parametre(conn, wms_reports.AUTO_REPORT_KEY, int(auto),
+                                           "Génération automatique du rapport mensuel")
+                conn.commit()
+                conn.close()
+                if auto:
+                    st.success("📈 Rapport automatique programmé!")
+                else:
+                    st.info("Génération automatique désactivée")
             
-        except Exception as e:
-            st.error(f"Erreur export simple: {str(e)}")
-    
-    def generate_automatic_monthly_report(self):
-        """Génération automatique du rapport mensuel"""
-        try:
-            st.success("📈 Rapport automatique programmé!")
-            st.info("Le rapport sera généré automatiquement le 1er de chaque mois")
+            col1, col2 = st.columns(2)
+            with col1:
+                period = st.text_input("Période (AAAA-MM)", value=wms_reports.previous_period(),
+                                       key="rapport_periode")
+            with col2:
+                st.write("")
+                if st.button("▶️ Générer maintenant", use_container_width=True):
+                    db_path = self.db.db_path
+                    
+                    def run_reports(progress):
+                        generated, _ = wms_reports.generate_monthly_reports(db_path, period, progress=progress)
+                        return generated[0], f"{len(generated)} fichiers générés pour {period}"
+                    
+                    self.submit_job("rapport_mensuel", f"Rapports mensuels {period}", run_reports)
+            
+            if reports:
+                df = pd.DataFrame(reports, columns=['Période', 'Format', 'Fichier', 'Généré le'])
+                st.dataframe(df.drop(columns=['Fichier']), use_container_width=True)
+                available = [r[2] for r in reports if Path(r[2]).exists()]
+                if available:
+                    selected = st.selectbox("Rapport à télécharger", available,
+                                            format_func=lambda f: Path(f).name, key="select_rapport")
+                    with open(selected, 'rb') as file:
+                        st.download_button(label="📥 Télécharger le rapport", data=file.read(),
+                                           file_name=Path(selected).name, key="download_rapport")
+            else:
+                st.info("Aucun rapport mensuel généré")
             
             # Aperçu des recommandations
-            st.subheader("📋 Recommandations Automatiques")
-            recommendations = [
-                "🔴 Attention: 15 lots expirent dans les 30 prochains jours",
-                "🟡 Stock faible détecté sur 8 références critiques",
-                "🟢 Optimisation possible: regrouper les stocks Zone A",
-                "📊 Tendance: augmentation de 12% des mouvements ce mois"
-            ]
-            
-            for rec in recommendations:
-                st.write(rec)
+            if st.button("📋 Aperçu des recommandations"):
+                context = wms_reports.prepare_monthly_context(self.db.db_path, period)
+                for level, rec in context['recommandations']:
+                    st.write(f"{wms_reports.RECOMMENDATION_ICONS[level]} {rec}")
                 
         except Exception as e:
             st.error(f"Erreur génération auto: {str(e)}")
@@ -2512,14 +2875,15 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
     def show_dynamic_bar_chart(self):
         """Bar chart dynamique avec drill-down"""
         try:
+            condition, params = wms_classification.filter_sql(*self.class_filters("dynamic_chart"))
             conn = self.db.get_connection()
-            df = pd.read_sql_query("""
+            df = pd.read_sql_query(f"""
                 SELECT reference, designation, quantite, emplacement
                 FROM stocks 
-                WHERE quantite > 0
+                WHERE quantite > 0{condition}
                 ORDER BY quantite DESC
                 LIMIT 10
-            """, conn)
+            """, conn, params=params)
             conn.close()
             
             if not df.empty:
@@ -2554,26 +2918,13 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
     def show_expiration_timeline(self):
         """Timeline d'évolution des lots par date d'expiration"""
         try:
-            import datetime
-            try:
-                from dateutil.relativedelta import relativedelta
-            except ImportError:
-                relativedelta = None
-            
             # Simulation de timeline d'expiration
-            today = datetime.date.today()
-            if relativedelta:
-                periods = [
-                    ('0-3 mois', today + relativedelta(months=3)),
-                    ('3-6 mois', today + relativedelta(months=6)), 
-                    ('6-12 mois', today + relativedelta(months=12))
-                ]
-            else:
-                periods = [
-                    ('0-3 mois', today.replace(month=min(12, today.month + 3))),
-                    ('3-6 mois', today.replace(month=min(12, today.month + 6))), 
-                    ('6-12 mois', today.replace(year=today.year + 1))
-                ]
+            today = dt_date.today()
+            periods = [
+                ('0-3 mois', _add_months(today, 3)),
+                ('3-6 mois', _add_months(today, 6)), 
+                ('6-12 mois', _add_months(today, 12))
+            ]
             
             conn = self.db.get_connection()
             total_lots = conn.execute("SELECT COUNT(*) FROM stocks WHERE quantite > 0").fetchone()[0] or 0
@@ -2627,35 +2978,18 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
             st.error(f"Erreur timeline: {str(e)}")
     
     def show_forecasting_chart(self):
-        """Graphique prévisionnel 3-6-12 mois"""
+        """Graphique prévisionnel 12 mois : prévision de la demande par référence (wms_forecast)"""
         try:
-            import datetime
-            try:
-                from dateutil.relativedelta import relativedelta
-            except ImportError:
-                relativedelta = None
-            
-            # Génération de prévisions
-            today = datetime.date.today()
-            months = []
-            stock_disponible = []
-            consommation_prevue = []
-            
-            current_stock = self.calculate_total_stock()
+            with st.spinner("Calcul des prévisions..."):
+                forecasts = wms_forecast.get_forecasts(self.db.db_path)
+            if not forecasts['references']:
+                st.info("Aucune expédition enregistrée : pas d'historique pour les prévisions")
+                return
             
-            for i in range(12):
-                if relativedelta:
-                    month = today + relativedelta(months=i+1)
-                else:
-                    # Fallback simple
-                    month_num = (today.month + i) % 12 + 1
-                    year = today.year + (today.month + i) // 12
-                    month = today.replace(year=year, month=month_num)
-                months.append(month.strftime("%Y-%m"))
-                
-                # Simulation: décroissance du stock, consommation variable
-                stock_disponible.append(max(0, current_stock - (i * 50)))
-                consommation_prevue.append(80 + (i * 5) + (i % 3 * 10))
+            conn = self.db.get_connection()
+            stock_disponible, consommation_prevue = wms_forecast.stock_projection(conn, forecasts)
+            conn.close()
+            months = forecasts['mois']
             
             fig = go.Figure()
             
@@ -2683,106 +3017,122 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
             )
             
             st.plotly_chart(fig, use_container_width=True)
+            models = forecasts['modele']
+            st.caption(f"{len(forecasts['references']):,} références prévues le {forecasts['date_calcul']} : "
+                       f"{int((models == 0).sum()):,} par moyenne mobile, "
+                       f"{int((models == 1).sum()):,} par lissage exponentiel, saisonnalité mensuelle")
         except Exception as e:
             st.error(f"Erreur prévisions: {str(e)}")
     
     def show_whatif_scenarios(self):
-        """Scénarios What-If avec curseurs interactifs"""
+        """Scénarios What-If : simulation Monte Carlo des trajectoires de stock par référence"""
         try:
             st.markdown("**Simulateur de Scénarios**")
             
             # Curseurs pour simulation
-            demande_variation = st.slider("Variation de la demande (%)", -50, 100, 0, 5)
-            stock_variation = st.slider("Variation du stock (%)", -30, 50, 0, 5)
+            col1, col2 = st.columns(2)
+            with col1:
+                demande_variation = st.slider("Variation de la demande (%)", -50, 100, 0, 5)
+                scenarios = st.select_slider("Nombre de scénarios", [100, 1000, 5000, 10000],
+                                             value=wms_simulation.DEFAULT_SCENARIOS)
+            with col2:
+                stock_variation = st.slider("Variation des approvisionnements (%)", -100, 100, 0, 5)
+                horizon = st.select_slider("Horizon (jours)", [30, 60, 90, 180], value=wms_simulation.HORIZON_DAYS)
             
-            # Calculs de simulation
-            stock_actuel = self.calculate_total_stock()
-            stock_simule = stock_actuel * (1 + stock_variation/100)
+            if not st.button("▶️ Lancer la simulation", key="run_simulation"):
+                st.caption("Demande et approvisionnements moyens de chaque référence sur les 90 derniers jours")
+                return
             
-            # Affichage des résultats
-            col1, col2 = st.columns(2)
+            conn = self.db.get_connection()
+            wms_coverage.refresh_if_due(conn)
+            references, stock, demand, supply = wms_simulation.load_inputs(conn)
+            conn.close()
+            if not references:
+                st.info("Aucune référence en stock ou en mouvement à simuler")
+                return
             
-            with col1:
-                st.metric(
-                    "Stock Simulé", 
-                    f"{stock_simule:,.0f}",
-                    delta=f"{stock_simule - stock_actuel:+.0f}"
-                )
+            with st.spinner(f"Simulation de {scenarios:,} scénarios sur {len(references):,} références..."):
+                result = wms_simulation.simulate(stock, demand, supply, demande_variation / 100,
+                                                 stock_variation / 100, scenarios=scenarios, horizon_days=horizon)
             
+            low, median, high = (result['stock_total'][p] for p in wms_simulation.PERCENTILES)
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric(f"Stock médian à {horizon} jours", f"{median[-1]:,.0f}",
+                          delta=f"{median[-1] - float(stock.sum()):+,.0f}")
             with col2:
-                impact_color = "red" if demande_variation > 20 else "orange" if demande_variation > 0 else "green"
-                st.markdown(f"**Impact Demande**: <span style='color:{impact_color}'>{demande_variation:+}%</span>", unsafe_allow_html=True)
-            
-            # Graphique de simulation
-            scenarios = ['Pessimiste', 'Réaliste', 'Optimiste']
-            values = [
-                stock_simule * 0.8,
-                stock_simule,
-                stock_simule * 1.2
-            ]
+                st.metric(f"Références en rupture à {horizon} jours (médiane)",
+                          f"{result['ruptures'][50][-1]:,.0f}")
             
+            # Bande P10-P90 et médiane du stock total
             fig = go.Figure()
-            fig.add_trace(go.Bar(
-                x=scenarios,
-                y=values,
-                text=[f"{v:,.0f}" for v in values],
-                textposition='auto',
-                marker_color=['#ff6b6b', '#4ecdc4', '#45b7d1']
-            ))
+            fig.add_trace(go.Scatter(x=result['jours'], y=high, mode='lines', line=dict(width=0),
+                                     name=f"P{wms_simulation.PERCENTILES[-1]}", showlegend=False))
+            fig.add_trace(go.Scatter(x=result['jours'], y=low, mode='lines', line=dict(width=0),
+                                     fill='tonexty', fillcolor='rgba(69,183,209,0.3)',
+                                     name=f"P{wms_simulation.PERCENTILES[0]}-P{wms_simulation.PERCENTILES[-1]}"))
+            fig.add_trace(go.Scatter(x=result['jours'], y=median, mode='lines+markers',
+                                     line=dict(color='#4ecdc4'), name='Médiane'))
             
             fig.update_layout(
-                title="Scénarios What-If",
+                title="Scénarios What-If : stock total projeté",
+                xaxis_title="Jours",
                 yaxis_title="Stock Projeté",
                 height=300
             )
             
             st.plotly_chart(fig, use_container_width=True)
             
+            probability = result['probabilite_rupture']
+            top = probability.argsort()[::-1][:20]
+            top = [i for i in top if probability[i] > 0]
+            if top:
+                df = pd.DataFrame({
+                    "Référence": [references[i] for i in top],
+                    "Stock": stock[top],
+                    "Probabilité de rupture (%)": (probability[top] * 100).round(1),
+                })
+                st.dataframe(df, use_container_width=True, hide_index=True)
+            st.caption(f"{result['scenarios']:,} scénarios, {result['references_simulees']:,} références à risque "
+                       f"simulées individuellement, calcul en {result['duree']:.1f}s")
+            
         except Exception as e:
             st.error(f"Erreur scénarios: {str(e)}")
     
     def show_coverage_horizon(self):
-        """Horizon de couverture dynamique avec curseur"""
+        """Couverture par référence : jours de stock et date de rupture prévue (wms_coverage)"""
         try:
             st.markdown("**Horizon de Couverture**")
+            conn = self.db.get_connection()
+            wms_coverage.refresh_if_due(conn)
+            kpis = wms_coverage.stockout_kpis(conn)
             
-            # Curseur de consommation
-            consommation_factor = st.slider("Consommation +X%", 0, 200, 100, 10)
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Références suivies", f"{kpis['references_suivies']:,}")
+            col2.metric("En rupture", f"{kpis['references_en_rupture']:,}",
+                        help=f"Taux de rupture: {kpis['taux_rupture']:.1f}%")
+            col3.metric(f"Ruptures prévues < {wms_coverage.STOCKOUT_HORIZON_DAYS}j", f"{kpis['ruptures_prevues']:,}")
             
-            stock_actuel = self.calculate_total_stock()
-            consommation_mensuelle = 50  # Base
-            consommation_ajustee = consommation_mensuelle * (consommation_factor / 100)
+            col1, col2, col3 = st.columns([2, 2, 1])
+            with col1:
+                order = st.selectbox("Trier par", list(wms_coverage.SORT_ORDERS), key="coverage_order")
+            with col2:
+                search = st.text_input("Référence commençant par", key="coverage_search")
+            with col3:
+                page = st.number_input("Page", min_value=1, value=1, key="coverage_page")
+            rows = wms_coverage.coverage_table(conn, order, offset=(page - 1) * wms_coverage.TOP_STOCKOUTS,
+                                               search=search.strip() or None)
+            conn.close()
             
-            if consommation_ajustee > 0:
-                mois_couverture = stock_actuel / consommation_ajustee
-                
-                # Indicateur de couverture
-                fig = go.Figure(go.Indicator(
-                    mode = "gauge+number",
-                    value = mois_couverture,
-                    domain = {'x': [0, 1], 'y': [0, 1]},
-                    title = {'text': "Mois de Couverture"},
-                    gauge = {
-                        'axis': {'range': [None, 24]},
-                        'bar': {'color': "darkblue"},
-                        'steps': [
-                            {'range': [0, 3], 'color': "red"},
-                            {'range': [3, 6], 'color': "yellow"},
-                            {'range': [6, 24], 'color': "green"}
-                        ]
-                    }
-                ))
-                
-                fig.update_layout(height=300)
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # Alerte de rupture
-                if mois_couverture < 3:
-                    st.error(f"⚠️ ALERTE: Rupture prévue dans {mois_couverture:.1f} mois!")
-                elif mois_couverture < 6:
-                    st.warning(f"🟡 Attention: Couverture de {mois_couverture:.1f} mois")
-                else:
-                    st.success(f"🟢 Couverture sécurisée: {mois_couverture:.1f} mois")
+            if rows:
+                df = pd.DataFrame(rows, columns=["Référence", "Stock", "Vitesse (/jour)",
+                                                 "Jours de couverture", "Rupture prévue"])
+                st.dataframe(df.round({"Vitesse (/jour)": 2, "Jours de couverture": 1}),
+                             use_container_width=True, hide_index=True)
+                st.caption(f"Vitesse = expéditions des {wms_coverage.VELOCITY_DAYS} derniers jours, "
+                           f"{wms_coverage.TOP_STOCKOUTS} références par page")
+            else:
+                st.info("Aucune référence pour ce critère")
             
         except Exception as e:
             st.error(f"Erreur horizon: {str(e)}")
@@ -2811,30 +3161,41 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
             st.plotly_chart(fig, use_container_width=True)
     
     def show_supplier_performance(self):
+        """Performance fournisseurs : volume, fréquence, délais et ponctualité depuis les agrégats mensuels"""
         try:
+            period = st.radio("Période", list(wms_suppliers.PERIODS), horizontal=True, key="supplier_period")
+            months = wms_suppliers.PERIODS[period]
             conn = self.db.get_connection()
-            # Performance des fournisseurs basée sur les réceptions
-            df = pd.read_sql_query("""
-                SELECT fournisseur, COUNT(*) as nb_receptions, SUM(quantite) as total_qty
-                FROM receptions 
-                GROUP BY fournisseur
-                ORDER BY total_qty DESC
-                LIMIT 10
-            """, conn)
+            rows = wms_suppliers.supplier_performance(conn, months)
+            distribution = wms_suppliers.lead_time_distribution(conn, months)
             conn.close()
             
-            if not df.empty:
+            if not rows:
+                st.info("Aucune donnée fournisseur disponible")
+                return
+            
+            df = pd.DataFrame(rows, columns=["Fournisseur", "Réceptions", "Quantité", "Mois actifs",
+                                             "Réceptions/mois", "Délais mesurés", "Délai moyen (j)",
+                                             "Écart-type délai (j)",
+                                             "À l'heure (%)"])
+            top = df.head(wms_suppliers.TOP_SUPPLIERS)
+            col1, col2 = st.columns([2, 1])
+            with col1:
                 fig = go.Figure()
-                fig.add_trace(go.Bar(x=df['fournisseur'], y=df['total_qty'],
-                                   name='Quantité Totale Reçue'))
-                fig.update_layout(title="Performance Fournisseurs")
+                fig.add_trace(go.Bar(x=top['Fournisseur'], y=top['Quantité'], name='Quantité Reçue'))
+                fig.add_trace(go.Scatter(x=top['Fournisseur'], y=top["À l'heure (%)"], mode='markers+lines',
+                                         name="À l'heure (%)", yaxis='y2'))
+                fig.update_layout(title="Performance Fournisseurs", height=350,
+                                  yaxis2=dict(overlaying='y', side='right', range=[0, 105]))
                 st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.info("Aucune donnée fournisseur disponible")
-        except:
-            fig = go.Figure()
-            fig.add_trace(go.Bar(x=['Fournisseur A', 'Fournisseur B'], y=[95, 87]))
-            st.plotly_chart(fig, use_container_width=True)
+            with col2:
+                fig = go.Figure(go.Bar(x=[label for label, _ in distribution], y=[count for _, count in distribution]))
+                fig.update_layout(title="Distribution des Délais", height=350)
+                st.plotly_chart(fig, use_container_width=True)
+            
+            st.dataframe(df.round(2), use_container_width=True, hide_index=True)
+        except Exception as e:
+            st.error(f"Erreur performance fournisseurs: {str(e)}")
     
     def show_location_occupancy(self):
         try:
@@ -2873,7 +3234,76 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
         st.success("📊 Export mouvements généré avec succès!")
     
     def search_traceability(self, search_type, search_value):
+        if search_type == "Par Fournisseur" and search_value:
+            self.show_supplier_trace(search_value)
+            return
+        if search_type == "Par Client" and search_value:
+            self.show_client_trace(search_value)
+            return
         st.success(f"🔍 Recherche effectuée: {search_type} = {search_value}")
+
+    def show_client_trace(self, client):
+        """Historique d'un client : totaux, références les plus commandées et dernières lignes"""
+        try:
+            conn = self.db.get_connection()
+            summary = wms_clients.client_summary(conn, client)
+            references = wms_clients.client_references(conn, client)
+            orders = wms_clients.recent_orders(conn, client)
+            conn.close()
+            if summary is None:
+                st.info("Client inconnu")
+                return
+            lines, units, distinct, last_order = summary
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Lignes", f"{lines:,}")
+            with col2:
+                st.metric("Unités", f"{units:,}")
+            with col3:
+                st.metric("Références distinctes", f"{distinct:,}")
+            with col4:
+                st.metric("Dernière commande", last_order or "-")
+            col1, col2 = st.columns([1, 2])
+            with col1:
+                if references:
+                    st.dataframe(pd.DataFrame(references, columns=["Référence", "Lignes", "Unités"]),
+                                 use_container_width=True, hide_index=True)
+            with col2:
+                if orders:
+                    st.dataframe(pd.DataFrame(orders, columns=["Commande", "Date", "Référence", "Quantité",
+                                                               "Emplacement", "Statut"]),
+                                 use_container_width=True, hide_index=True)
+                else:
+                    st.info("Aucune commande pour ce client")
+        except Exception as e:
+            st.error(f"Erreur traçabilité: {str(e)}")
+
+    def show_supplier_trace(self, supplier):
+        """Traçabilité d'un fournisseur : indicateurs des 12 derniers mois et dernières réceptions"""
+        try:
+            conn = self.db.get_connection()
+            history = wms_suppliers.monthly_history(conn, supplier)
+            receptions = wms_suppliers.recent_receptions(conn, supplier)
+            conn.close()
+            col1, col2, col3 = st.columns(3)
+            count = sum(row[1] for row in history)
+            with col1:
+                st.metric("Réceptions (12 mois)", f"{count:,}")
+            with col2:
+                st.metric("Quantité reçue", f"{sum(row[2] for row in history):,}")
+            with col3:
+                measured = sum(row[3] for row in history)
+                on_time = sum(row[3] * row[5] for row in history if row[3]) / measured if measured else None
+                st.metric("À l'heure", f"{on_time:.1f}%" if on_time is not None else "-",
+                          help="Réceptions dont la date de commande est connue")
+            if receptions:
+                st.dataframe(pd.DataFrame(receptions, columns=["Date", "Date commande", "Référence", "Quantité",
+                                                               "Emplacement", "Statut"]),
+                             use_container_width=True, hide_index=True)
+            else:
+                st.info("Aucune réception pour ce fournisseur")
+        except Exception as e:
+            st.error(f"Erreur traçabilité: {str(e)}")
     
     def display_lot_tracking(self):
         st.info("🏷️ Suivi détaillé par numéro de lot")
@@ -2918,28 +3348,173 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
             st.info("Aucun utilisateur configuré")
     
     def save_alert_thresholds(self, seuil_stock, seuil_expiration):
-        st.success("✅ Seuils d'alerte sauvegardés")
+        try:
+            conn = self.db.get_connection()
+            wms_alerts.set_thresholds(conn, seuil_stock, seuil_expiration)
+            conn.close()
+            st.success("✅ Seuils d'alerte sauvegardés, alertes réévaluées")
+        except ValueError as e:
+            st.error(f"❌ {str(e)}")
+        except Exception as e:
+            st.error(f"❌ Erreur: {str(e)}")
+
+    @_fragment()
+    def reference_thresholds_section(self):
+        """Seuils propres à une référence, prioritaires sur les seuils globaux"""
+        st.write("**Seuils par Référence**")
+        ref = self.key_picker("Référence", "references", key="threshold_ref")
+        col1, col2 = st.columns(2)
+        with col1:
+            ref_stock = st.number_input("Stock minimum (0 = global)", min_value=0, value=0, key="threshold_ref_stock")
+        with col2:
+            ref_days = st.number_input("Jours expiration (0 = global)", min_value=0, value=0, key="threshold_ref_days")
+        if st.button("Sauvegarder pour la référence", key="save_ref_threshold") and ref:
+            try:
+                conn = self.db.get_connection()
+                wms_alerts.set_reference_threshold(conn, ref, ref_stock or None, ref_days or None)
+                conn.close()
+                st.success(f"✅ Seuils de {ref} enregistrés")
+            except ValueError as e:
+                st.error(f"❌ {str(e)}")
+            except Exception as e:
+                st.error(f"❌ Erreur: {str(e)}")
+
+        conn = self.db.get_connection()
+        overrides = wms_alerts.reference_thresholds(conn)
+        conn.close()
+        if overrides:
+            df = pd.DataFrame(overrides, columns=["Référence", "Stock minimum", "Jours expiration"])
+            st.dataframe(df, use_container_width=True, hide_index=True)
+            removed = st.selectbox("Surcharge à supprimer", [o[0] for o in overrides], key="threshold_remove")
+            if st.button("🗑️ Revenir aux seuils globaux", key="remove_ref_threshold"):
+                conn = self.db.get_connection()
+                wms_alerts.remove_reference_threshold(conn, removed)
+                conn.close()
+                st.rerun()
     
     def save_warehouse_config(self, nom, adresse):
         st.success("✅ Configuration entrepôt sauvegardée")
     
-    def backup_database(self):
-        st.success("💾 Sauvegarde créée avec succès!")
-    
+    def backup_database(self, compress=True, retention=wms_backup.DEFAULT_RETENTION):
+        """Sauvegarde à chaud via l'API de backup SQLite, copie incrémentale par pages"""
+        try:
+            progress_bar = st.progress(0, text="Sauvegarde en cours...")
+
+            def on_progress(done, total):
+                if total:
+                    progress_bar.progress(min(done / total, 1.0), text=f"Sauvegarde: {done}/{total} pages")
+
+            path = wms_backup.backup_database(
+                self.db.db_path, compress=compress, retention=retention, progress=on_progress
+            )
+            progress_bar.progress(1.0, text="Sauvegarde terminée")
+
+            with open(path, 'rb') as file:
+                st.download_button(
+                    label="📥 Télécharger la sauvegarde",
+                    data=file.read(),
+                    file_name=path.name,
+                    mime="application/gzip" if compress else "application/octet-stream"
+                )
+            st.success(f"💾 Sauvegarde créée et vérifiée: {path.name} ({path.stat().st_size / 1024:,.0f} Ko)")
+        except Exception as e:
+            st.error(f"❌ Erreur lors de la sauvegarde: {str(e)}")
+
+    def display_backups_table(self):
+        backups = wms_backup.list_backups()
+        if not backups:
+            st.info("Aucune sauvegarde disponible")
+            return
+
+        df = pd.DataFrame([
+            {'Fichier': path.name, 'Taille (Ko)': round(size / 1024, 1), 'Date': date.strftime('%d/%m/%Y %H:%M:%S')}
+            for path, size, date in backups
+        ])
+        st.dataframe(df, use_container_width=True)
+
+        selected = st.selectbox("Vérifier une sauvegarde", [path.name for path, _, _ in backups], key="select_backup_verify")
+        if st.button("🔍 Vérifier l'intégrité", key="verify_backup"):
+            path = next(p for p, _, _ in backups if p.name == selected)
+            ok, message, version = wms_backup.verify_backup(path)
+            if ok:
+                st.success(f"✅ {selected}: intégrité OK (schéma v{version})")
+            else:
+                st.error(f"❌ {selected}: {message}")
+
     def export_complete_excel(self):
-        st.success("📄 Export complet généré!")
-    
+        self.export_complete_analysis_excel()
+
+    def export_parquet_snapshot(self):
+        """Instantané Parquet (stocks, mouvements, KPIs) pour le rechargement BI"""
+        try:
+            snapshot_dir, manifest = wms_export.write_parquet_snapshot(self.db.db_path)
+
+            # Archive zip des fichiers (déjà compressés) pour le téléchargement
+            archive = io.BytesIO()
+            with zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED) as zf:
+                for path in sorted(snapshot_dir.iterdir()):
+                    zf.write(path, path.name)
+
+            st.download_button(
+                label="📥 Télécharger l'instantané",
+                data=archive.getvalue(),
+                file_name=f"instantane_wms_{snapshot_dir.name}.zip",
+                mime="application/zip"
+            )
+            lignes = ", ".join(f"{name}: {rows:,}" for name, rows in manifest['fichiers'].items())
+            st.success(f"🗃️ Instantané Parquet créé en {manifest['secondes']}s ({lignes})")
+            st.info(f"Dossier: {snapshot_dir}")
+        except ImportError:
+            st.error("⚠️ Module pyarrow non installé. Installez avec: pip install pyarrow")
+        except Exception as e:
+            st.error(f"Erreur export Parquet: {str(e)}")
+
+    def archive_movements(self, before):
+        """Déplace les anciens mouvements vers la base d'archive"""
+        try:
+            archive_path, counts = wms_services.archive_movements(self.db.db_path, before)
+            details = ", ".join(f"{table}: {count:,}" for table, count in counts.items())
+            st.success(f"📦 Mouvements antérieurs à {before} archivés ({details})")
+            st.info(f"Archive: {archive_path}")
+        except Exception as e:
+            st.error(f"❌ Erreur lors de l'archivage: {str(e)}")
+
     def restore_database(self, uploaded_file):
-        st.success("✅ Base de données restaurée!")
-    
+        """Valide la sauvegarde puis la substitue atomiquement à la base courante"""
+        try:
+            version, safety = wms_backup.restore_database(
+                self.db.db_path, uploaded_file,
+                schema_version=WMSDatabase.SCHEMA_VERSION,
+                required_tables=WMSDatabase.TABLES
+            )
+            # Mise à niveau d'une sauvegarde issue d'une version antérieure du schéma
+            self.db.init_database()
+            # Les compteurs de version de la base restaurée peuvent coïncider avec ceux en cache
+            wms_cache.invalidate(self.db.db_path)
+            wms_index.invalidate(self.db.db_path)
+            st.success(f"✅ Base de données restaurée (schéma v{version})")
+            st.info(f"Sauvegarde de sécurité de l'ancienne base: {safety.name}")
+        except Exception as e:
+            st.error(f"❌ Restauration impossible: {str(e)}")
+
     def display_system_info(self):
+        backups = wms_backup.list_backups()
+        last_backup = backups[0][2].strftime('%d/%m/%Y %H:%M') if backups else "Jamais"
+
         col1, col2 = st.columns(2)
         with col1:
             st.metric("Version WMS", "2.1.0")
-            st.metric("Base de données", "SQLite")
+            st.metric("Base de données", f"SQLite (schéma v{WMSDatabase.SCHEMA_VERSION})")
         with col2:
             st.metric("Utilisateurs actifs", "3")
-            st.metric("Dernière sauvegarde", "Aujourd'hui")
+            st.metric("Dernière sauvegarde", last_backup)
+
+        # Coût des modules chargés à la demande depuis le démarrage du serveur
+        if IMPORT_TIMES:
+            st.write("**Modules chargés à la demande**")
+            st.dataframe(pd.DataFrame(
+                [{'Module': name, 'Import (ms)': round(seconds * 1000, 1)} for name, seconds in IMPORT_TIMES.items()]
+            ), use_container_width=True)
     
     # Méthodes de suppression fonctionnelles
     def delete_stock_item(self, reference):
@@ -2965,10 +3540,8 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
             st.error(f"❌ Erreur: {str(e)}")
     
     def get_receptions_list(self):
-        conn = self.db.get_connection()
-        receptions = conn.execute("SELECT id, reference, quantite FROM receptions ORDER BY date_creation DESC").fetchall()
-        conn.close()
-        return receptions
+        return self.cached_rows("receptions", ("receptions",),
+                                "SELECT id, reference, quantite FROM receptions ORDER BY date_creation DESC")
     
     def delete_reception(self, reception_id):
         try:
@@ -2993,10 +3566,8 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
             st.error(f"❌ Erreur: {str(e)}")
     
     def get_expeditions_list(self):
-        conn = self.db.get_connection()
-        expeditions = conn.execute("SELECT numero_commande, reference, quantite FROM expeditions ORDER BY date_creation DESC").fetchall()
-        conn.close()
-        return expeditions
+        return self.cached_rows("expeditions", ("expeditions",),
+                                "SELECT numero_commande, reference, quantite FROM expeditions ORDER BY date_creation DESC")
     
     def delete_expedition(self, numero_commande):
         try:
@@ -3021,10 +3592,8 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
             st.error(f"❌ Erreur: {str(e)}")
     
     def get_transfers_list(self):
-        conn = self.db.get_connection()
-        transfers = conn.execute("SELECT id, reference, quantite FROM transferts ORDER BY date_transfert DESC").fetchall()
-        conn.close()
-        return transfers
+        return self.cached_rows("transferts", ("transferts",),
+                                "SELECT id, reference, quantite FROM transferts ORDER BY date_transfert DESC")
     
     def delete_transfer(self, transfer_id):
         try:
@@ -3048,11 +3617,12 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
         except Exception as e:
             st.error(f"❌ Erreur: {str(e)}")
     
+    def get_zones(self):
+        return wms_cache.cached(self.db.db_path, "zones", ("emplacements",), wms_zones.list_zones)
+    
     def get_emplacements_list(self):
-        conn = self.db.get_connection()
-        emplacements = conn.execute("SELECT code, zone FROM emplacements ORDER BY code").fetchall()
-        conn.close()
-        return emplacements
+        return self.cached_rows("emplacements_zones", ("emplacements",),
+                                "SELECT code, zone FROM emplacements ORDER BY code")
     
     def delete_emplacement(self, code):
         try:
@@ -3107,10 +3677,8 @@ Rapport généré automatiquement le {datetime.now().strftime("%d/%m/%Y à %H:%M
             st.error(f"❌ Erreur: {str(e)}")
     
     def get_users_list(self):
-        conn = self.db.get_connection()
-        users = conn.execute("SELECT nom, email FROM utilisateurs ORDER BY nom").fetchall()
-        conn.close()
-        return users
+        return self.cached_rows("utilisateurs", ("utilisateurs",),
+                                "SELECT nom, email FROM utilisateurs ORDER BY nom")
     
     def delete_user(self, nom):
         try:
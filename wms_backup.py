@@ -0,0 +1,200 @@
+"""Sauvegarde à chaud et restauration de la base SQLite du WMS"""
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+BACKUP_DIR = "backups"
+BACKUP_PREFIX = "wms_backup_"
+# Nombre de pages copiées par étape : le verrou partagé sur la base source
+# est relâché entre deux étapes, les opérateurs peuvent donc continuer à écrire
+PAGES_PER_STEP = 256
+STEP_PAUSE = 0.005
+DEFAULT_RETENTION = 10
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def _copy_online(source_conn, dest_conn, pages=PAGES_PER_STEP, progress=None):
+    """Copie page par page via l'API de backup en ligne de SQLite"""
+    def _step(status, remaining, total):
+        if progress:
+            progress(total - remaining, total)
+        # Laisse une fenêtre aux écritures concurrentes entre deux étapes
+        time.sleep(STEP_PAUSE)
+
+    source_conn.backup(dest_conn, pages=pages, progress=_step)
+
+
+def check_integrity(path):
+    """Retourne le résultat de PRAGMA integrity_check ('ok' si la base est saine)"""
+    conn = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("PRAGMA integrity_check").fetchall()
+    finally:
+        conn.close()
+    return "; ".join(row[0] for row in rows)
+
+
+def backup_database(db_path, backup_dir=BACKUP_DIR, compress=True,
+                    retention=DEFAULT_RETENTION, pages=PAGES_PER_STEP, progress=None):
+    """Crée une sauvegarde vérifiée de la base, sans bloquer les écritures"""
+    backup_dir = Path(backup_dir)
+    backup_dir.mkdir(exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    target = backup_dir / f"{BACKUP_PREFIX}{timestamp}.db"
+    tmp_path = target.with_suffix(".db.tmp")
+
+    source = sqlite3.connect(db_path)
+    dest = sqlite3.connect(tmp_path)
+    try:
+        _copy_online(source, dest, pages=pages, progress=progress)
+    finally:
+        dest.close()
+        source.close()
+
+    try:
+        integrity = check_integrity(tmp_path)
+        if integrity != "ok":
+            raise ValueError(f"Sauvegarde corrompue: {integrity}")
+
+        if compress:
+            target = target.with_suffix(".db.gz")
+            with open(tmp_path, "rb") as src, gzip.open(target, "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, target)
+    finally:
+        if tmp_path.exists():
+            os.remove(tmp_path)
+
+    rotate_backups(backup_dir, retention)
+    return target
+
+
+def list_backups(backup_dir=BACKUP_DIR):
+    """Liste les sauvegardes (chemin, taille, date) de la plus récente à la plus ancienne"""
+    backup_dir = Path(backup_dir)
+    if not backup_dir.exists():
+        return []
+    backups = []
+    for path in backup_dir.glob(f"{BACKUP_PREFIX}*"):
+        if path.name.endswith((".db", ".db.gz")):
+            stat = path.stat()
+            backups.append((path, stat.st_size, datetime.fromtimestamp(stat.st_mtime)))
+    backups.sort(key=lambda b: b[0].name, reverse=True)
+    return backups
+
+
+def rotate_backups(backup_dir=BACKUP_DIR, retention=DEFAULT_RETENTION):
+    """Supprime les sauvegardes au-delà des `retention` plus récentes"""
+    removed = []
+    if not retention or retention < 1:
+        return removed
+    for path, _, _ in list_backups(backup_dir)[retention:]:
+        os.remove(path)
+        removed.append(path)
+    return removed
+
+
+def _extract_to_temp(source, directory):
+    """Écrit la sauvegarde (fichier, octets ou flux, éventuellement gzip) dans un fichier temporaire"""
+    if isinstance(source, (str, Path)):
+        stream = open(source, "rb")
+    elif isinstance(source, (bytes, bytearray)):
+        stream = tempfile.SpooledTemporaryFile()
+        stream.write(source)
+        stream.seek(0)
+    else:
+        stream = source
+
+    fd, tmp_path = tempfile.mkstemp(suffix=".restore", dir=directory)
+    try:
+        header = stream.read(2)
+        stream.seek(0)
+        with os.fdopen(fd, "wb") as out:
+            if header == GZIP_MAGIC:
+                with gzip.GzipFile(fileobj=stream) as gz:
+                    shutil.copyfileobj(gz, out, 1024 * 1024)
+            else:
+                shutil.copyfileobj(stream, out, 1024 * 1024)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    finally:
+        if isinstance(source, (str, Path)):
+            stream.close()
+    return tmp_path
+
+
+def verify_backup(path):
+    """Vérifie l'intégrité d'une sauvegarde et retourne (ok, message, version du schéma)"""
+    tmp_path = _extract_to_temp(path, Path(path).parent)
+    try:
+        integrity = check_integrity(tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        conn.close()
+        return integrity == "ok", integrity, version
+    except sqlite3.DatabaseError as e:
+        return False, str(e), None
+    finally:
+        os.remove(tmp_path)
+
+
+def validate_backup(path, schema_version, required_tables=()):
+    """Contrôle qu'une base est une sauvegarde WMS compatible avec le schéma courant"""
+    try:
+        integrity = check_integrity(path)
+    except sqlite3.DatabaseError:
+        raise ValueError("Le fichier n'est pas une base SQLite valide")
+    if integrity != "ok":
+        raise ValueError(f"Sauvegarde corrompue: {integrity}")
+
+    conn = sqlite3.connect(path)
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+
+    if version > schema_version:
+        raise ValueError(
+            f"Sauvegarde issue d'une version plus récente du schéma ({version} > {schema_version})"
+        )
+    missing = [table for table in required_tables if table not in tables]
+    if missing:
+        raise ValueError(f"Tables manquantes dans la sauvegarde: {', '.join(missing)}")
+    return version
+
+
+def restore_database(db_path, source, schema_version, required_tables=(),
+                     backup_dir=BACKUP_DIR, progress=None):
+    """Restaure une sauvegarde validée à la place de la base courante.
+
+    La copie dans la base vivante se fait en une seule étape de l'API de backup :
+    elle est atomique pour les autres connexions et ne nécessite aucun redémarrage.
+    Une sauvegarde de sécurité de la base courante est prise auparavant.
+    """
+    directory = Path(db_path).resolve().parent
+    tmp_path = _extract_to_temp(source, directory)
+    try:
+        version = validate_backup(tmp_path, schema_version, required_tables)
+        safety = backup_database(db_path, backup_dir=backup_dir, compress=True, retention=None)
+
+        restored = sqlite3.connect(tmp_path)
+        live = sqlite3.connect(db_path)
+        try:
+            restored.backup(live, pages=-1)
+        finally:
+            live.close()
+            restored.close()
+        if progress:
+            progress(1, 1)
+    finally:
+        os.remove(tmp_path)
+    return version, safety
@@ -0,0 +1,45 @@
+"""Listes d'options mémorisées par processus, invalidées par les versions de tables (versions_donnees)"""
+import sqlite3
+import threading
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def table_versions(conn, tables):
+    """Versions courantes des tables demandées (lecture d'une petite table indexée)"""
+    placeholders = ", ".join("?" for _ in tables)
+    rows = dict(conn.execute(
+        f"SELECT nom_table, version FROM versions_donnees WHERE nom_table IN ({placeholders})", tuple(tables)
+    ).fetchall())
+    return tuple(rows.get(table, 0) for table in tables)
+
+
+def cached(db_path, name, tables, loader):
+    """Résultat de `loader(conn)`, recalculé seulement si l'une des `tables` a été modifiée.
+
+    Le cache est partagé par toutes les sessions du processus ; une écriture faite
+    ailleurs (CLI, autre processus) est vue dès la lecture suivante des versions.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        versions = table_versions(conn, tables)
+        key = (db_path, name)
+        with _cache_lock:
+            entry = _cache.get(key)
+        if entry is not None and entry[0] == versions:
+            return entry[1]
+        value = loader(conn)
+    finally:
+        conn.close()
+    with _cache_lock:
+        _cache[key] = (versions, value)
+    return value
+
+
+def invalidate(db_path=None, name=None):
+    """Oublie les entrées mémorisées (toutes, celles d'une base ou une seule liste)"""
+    with _cache_lock:
+        for key in list(_cache):
+            if (db_path is None or key[0] == db_path) and (name is None or key[1] == name):
+                del _cache[key]
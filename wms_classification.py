@@ -0,0 +1,110 @@
+"""Classification ABC/XYZ de toutes les références à partir de l'historique d'expéditions
+
+ABC : part cumulée du volume expédié sur WINDOW_WEEKS semaines (pas de prix unitaire dans le
+schéma, la vélocité tient lieu de valeur). XYZ : coefficient de variation de la demande
+hebdomadaire. Le calcul est une passe NumPy sur la matrice références × semaines de
+wms_forecast ; seules les lignes dont la classe ou les indicateurs ont changé sont réécrites
+dans `classification`. Un recalcul est fait une fois par jour (`refresh_if_due`).
+"""
+from datetime import date, datetime
+
+from wms_forecast import load_weekly_history
+from wms_lazy import LazyModule
+from wms_services import get_parametre, set_parametre
+
+np = LazyModule("numpy")
+
+WINDOW_WEEKS = 52
+# Part cumulée du volume : A jusqu'à 80 %, B jusqu'à 95 %, C au-delà
+ABC_SHARES = (("A", 0.80), ("B", 0.95))
+# Coefficient de variation hebdomadaire : X jusqu'à 0.5, Y jusqu'à 1, Z au-delà (ou sans demande)
+XYZ_LIMITS = (("X", 0.5), ("Y", 1.0))
+ABC_CLASSES = ("A", "B", "C")
+XYZ_CLASSES = ("X", "Y", "Z")
+LAST_RUN_KEY = "classification_date_calcul"
+
+
+def classify(history):
+    """(classes ABC, classes XYZ, volume, part cumulée, coefficient de variation) par ligne de `history`"""
+    volume = history.sum(axis=1, dtype=np.float64)
+    order = np.argsort(-volume, kind='stable')
+    total = volume.sum() or 1.0
+    share = np.empty_like(volume)
+    share[order] = np.cumsum(volume[order]) / total
+    # Classe selon la part cumulée avant la référence : la plus grosse est toujours A
+    before = share - volume / total
+    abc = np.full(len(volume), "C", dtype="<U1")
+    for label, limit in reversed(ABC_SHARES):
+        abc[(before < limit) & (volume > 0)] = label
+    mean = history.mean(axis=1, dtype=np.float64)
+    cv = np.divide(history.std(axis=1, dtype=np.float64), mean, out=np.full(len(mean), np.inf), where=mean > 0)
+    xyz = np.full(len(volume), "Z", dtype="<U1")
+    for label, limit in reversed(XYZ_LIMITS):
+        xyz[cv <= limit] = label
+    return abc, xyz, volume, share, cv
+
+
+def run_classification(conn, today=None, progress=None):
+    """Classe toutes les références (historique + stock) ; retourne (références classées, lignes écrites)"""
+    today = today or date.today()
+    references, history, _ = load_weekly_history(conn, weeks=WINDOW_WEEKS, today=today)
+    if progress:
+        progress(0.5, "Historique chargé")
+    # Références en stock sans expédition sur la fenêtre : volume nul
+    known = set(references)
+    idle = [ref for ref, in conn.execute("SELECT DISTINCT reference FROM stocks WHERE quantite > 0")
+            if ref not in known]
+    references = list(references) + idle
+    history = np.vstack([history, np.zeros((len(idle), WINDOW_WEEKS), dtype=history.dtype)])
+    abc, xyz, volume, share, cv = classify(history)
+    cv = np.where(np.isfinite(cv), np.round(cv, 3), np.nan)
+    share = np.round(share, 4)
+    # Seules les lignes modifiées sont réécrites
+    stored = {row[0]: row[1:] for row in conn.execute(
+        "SELECT reference, classe_abc, classe_xyz, volume, part_cumulee, cv FROM classification")}
+    computed_at = datetime.now().isoformat(timespec='seconds')
+    changed = []
+    for ref, a, x, vol, part, var in zip(references, abc.tolist(), xyz.tolist(), volume.tolist(),
+                                         share.tolist(), cv.tolist()):
+        var = None if var != var else var
+        if stored.pop(ref, None) != (a, x, int(vol), part, var):
+            changed.append((ref, a, x, int(vol), part, var, computed_at))
+    conn.executemany("""
+        INSERT INTO classification (reference, classe_abc, classe_xyz, volume, part_cumulee, cv, date_calcul)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (reference) DO UPDATE SET classe_abc = excluded.classe_abc, classe_xyz = excluded.classe_xyz,
+            volume = excluded.volume, part_cumulee = excluded.part_cumulee, cv = excluded.cv,
+            date_calcul = excluded.date_calcul
+    """, changed)
+    # Références sans stock ni demande sur la fenêtre : plus classées
+    conn.executemany("DELETE FROM classification WHERE reference = ?", ((ref,) for ref in stored))
+    set_parametre(conn, LAST_RUN_KEY, today.isoformat(), "Dernière classification ABC/XYZ")
+    conn.commit()
+    return len(references), len(changed) + len(stored)
+
+
+def refresh_if_due(conn, today=None):
+    """Classification quotidienne ; retourne True si elle a été exécutée"""
+    today = today or date.today()
+    if get_parametre(conn, LAST_RUN_KEY) == today.isoformat():
+        return False
+    run_classification(conn, today)
+    return True
+
+
+def class_matrix(conn):
+    """Nombre de références et volume par couple (ABC, XYZ) : {(abc, xyz): (références, volume)}"""
+    return {(a, x): (count, vol) for a, x, count, vol in conn.execute(
+        "SELECT classe_abc, classe_xyz, COUNT(*), SUM(volume) FROM classification GROUP BY classe_abc, classe_xyz")}
+
+
+def filter_sql(abc=None, xyz=None, column="reference"):
+    """Condition SQL (préfixée de AND) limitant `column` aux références des classes choisies"""
+    clauses, params = [], []
+    for field, values in (("classe_abc", abc), ("classe_xyz", xyz)):
+        if values:
+            clauses.append(f"{field} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+    if not clauses:
+        return "", []
+    return f" AND {column} IN (SELECT reference FROM classification WHERE {' AND '.join(clauses)})", params
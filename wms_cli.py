@@ -0,0 +1,256 @@
+"""Commandes en ligne du WMS, utilisables depuis cron (python -m wms_cli --help)
+
+Chaque sous-commande importe ses modules à l'exécution : Streamlit et Plotly ne sont
+jamais chargés, pandas seulement pour l'import de fichiers.
+"""
+import argparse
+import json
+import sys
+
+DEFAULT_DB = "wms_database.db"
+
+
+def cmd_import(args):
+    import wms_services
+    with open(args.file, "rb") as f:
+        data = f.read()
+    count = wms_services.import_stock_file(args.db, data, args.file)
+    print(f"{count} articles importés")
+    return 0
+
+
+def cmd_export(args):
+    import wms_export
+    path, message = wms_export.export_analysis_workbook(args.db, args.output)
+    print(f"{message}: {path}")
+    return 0
+
+
+def cmd_kpis(args):
+    import sqlite3
+    import wms_kpis
+    conn = sqlite3.connect(args.db)
+    try:
+        kpis = wms_kpis.compute_kpis(conn, horizon_days=args.horizon)
+        if args.save:
+            import wms_reports
+            wms_reports.take_kpi_snapshot(conn)
+            conn.commit()
+    finally:
+        conn.close()
+    if args.json:
+        print(json.dumps(kpis, ensure_ascii=False))
+    else:
+        for kpi, value in kpis.items():
+            print(f"{wms_kpis.KPI_LABELS.get(kpi, kpi)}: {value}")
+    return 0
+
+
+def cmd_backup(args):
+    import wms_backup
+    path = wms_backup.backup_database(args.db, compress=not args.no_compress, retention=args.retention)
+    print(f"Sauvegarde créée et vérifiée: {path}")
+    return 0
+
+
+def cmd_restore(args):
+    import wms_backup
+    from wms_database import WMSDatabase
+    version, safety = wms_backup.restore_database(
+        args.db, args.file,
+        schema_version=WMSDatabase.SCHEMA_VERSION,
+        required_tables=WMSDatabase.TABLES
+    )
+    # Mise à niveau d'une sauvegarde issue d'une version antérieure du schéma
+    WMSDatabase(args.db)
+    print(f"Base restaurée (schéma v{version}), ancienne base sauvegardée dans {safety}")
+    return 0
+
+
+def cmd_archive(args):
+    import wms_services
+    archive_path, counts = wms_services.archive_movements(args.db, args.before, args.output)
+    for table, count in counts.items():
+        print(f"{table}: {count} lignes archivées")
+    print(f"Archive: {archive_path}")
+    return 0
+
+
+def cmd_snapshot(args):
+    import wms_export
+    snapshot_dir, manifest = wms_export.write_parquet_snapshot(
+        args.db, args.output, row_group_size=args.row_group_size, compression=args.compression
+    )
+    for name, rows in manifest['fichiers'].items():
+        print(f"{name}: {rows} lignes")
+    print(f"Instantané écrit dans {snapshot_dir} en {manifest['secondes']}s")
+    return 0
+
+
+def cmd_report(args):
+    import wms_reports
+    if args.if_due:
+        # Appel planifié (cron) : ne génère que si le rapport du mois précédent manque
+        generated = wms_reports.run_if_due(args.db, force=True)
+        if not generated:
+            print("Aucun rapport dû")
+            return 0
+    else:
+        generated, _ = wms_reports.generate_monthly_reports(args.db, args.period, formats=args.formats)
+    for path in generated:
+        print(f"Rapport écrit: {path}")
+    return 0
+
+
+def cmd_reappro(args):
+    import sqlite3
+    import wms_replenishment
+    if args.service is not None:
+        conn = sqlite3.connect(args.db)
+        try:
+            wms_replenishment.set_settings(conn, reappro_taux_service=args.service)
+        finally:
+            conn.close()
+    rows = wms_replenishment.suggestion_rows(wms_replenishment.get_plan(args.db), args.fournisseur)
+    with open(args.output, "wb") as f:
+        f.write(wms_replenishment.suggestions_csv(rows))
+    print(f"{len(rows)} commandes suggérées: {args.output}")
+    return 0
+
+
+def cmd_classify(args):
+    import sqlite3
+    import wms_classification
+    conn = sqlite3.connect(args.db)
+    try:
+        classified, written = wms_classification.run_classification(conn)
+    finally:
+        conn.close()
+    print(f"{classified} références classées, {written} lignes mises à jour")
+    return 0
+
+
+def cmd_slotting(args):
+    import sqlite3
+    import wms_services
+    import wms_slotting
+    conn = sqlite3.connect(args.db)
+    try:
+        result = wms_slotting.optimize(conn, args.window, args.max_moves)
+    finally:
+        conn.close()
+    for reference, quantity, source, target, lot, _ in result['transferts']:
+        print(f"{reference}\t{lot or ''}\t{quantity}\t{source} -> {target}")
+    print(f"{len(result['transferts'])} transferts proposés, distance pondérée "
+          f"{result['cout_actuel']:.0f} -> {result['cout_apres']:.0f} ({result['duree']:.1f}s)")
+    if args.apply and result['transferts']:
+        report = wms_services.execute_transfers(args.db, [move[:5] for move in result['transferts']],
+                                                wms_slotting.MOTIF, args.utilisateur)
+        return _print_batch_report(report)
+    return 0
+
+
+def _print_batch_report(report):
+    for number, reference, message in report['echecs']:
+        print(f"Ligne {number} ({reference}): {message}", file=sys.stderr)
+    if report['echecs']:
+        print(f"{len(report['echecs'])} ligne(s) en échec sur {report['lignes']} : lot annulé", file=sys.stderr)
+        return 1
+    print(f"{report['executes']} transferts exécutés en {report['duree']:.2f}s ({report['debit']:.0f} lignes/s)")
+    return 0
+
+
+def cmd_transfer(args):
+    import wms_services
+    with open(args.file, "rb") as f:
+        transfers = wms_services.read_transfer_file(f.read(), args.file)
+    report = wms_services.execute_transfers(args.db, transfers, args.motif, args.utilisateur)
+    return _print_batch_report(report)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="wms_cli", description="Opérations WMS sans interface")
+    parser.add_argument("--db", default=DEFAULT_DB, help="chemin de la base SQLite")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_ = commands.add_parser("import", help="importer un fichier de stock CSV/Excel")
+    import_.add_argument("file", help="fichier .csv, .xlsx ou .xls")
+    import_.set_defaults(func=cmd_import)
+
+    export = commands.add_parser("export", help="classeur Excel d'analyse complète")
+    export.add_argument("--output", default="analyse_complete.xlsx", help="fichier .xlsx produit")
+    export.set_defaults(func=cmd_export)
+
+    kpis = commands.add_parser("kpis", help="calculer les KPIs")
+    kpis.add_argument("--horizon", type=int, default=90, help="horizon d'expiration en jours")
+    kpis.add_argument("--json", action="store_true", help="sortie JSON")
+    kpis.add_argument("--save", action="store_true", help="enregistrer un instantané dans kpi_snapshots")
+    kpis.set_defaults(func=cmd_kpis)
+
+    backup = commands.add_parser("backup", help="sauvegarde à chaud vérifiée")
+    backup.add_argument("--no-compress", action="store_true", help="ne pas compresser en gzip")
+    backup.add_argument("--retention", type=int, default=10, help="sauvegardes conservées")
+    backup.set_defaults(func=cmd_backup)
+
+    restore = commands.add_parser("restore", help="restaurer une sauvegarde (.db ou .db.gz)")
+    restore.add_argument("file", help="fichier de sauvegarde")
+    restore.set_defaults(func=cmd_restore)
+
+    archive = commands.add_parser("archive", help="archiver les mouvements anciens")
+    archive.add_argument("--before", required=True, help="mois AAAA-MM : mouvements antérieurs archivés")
+    archive.add_argument("--output", default="archives", help="dossier de la base d'archive")
+    archive.set_defaults(func=cmd_archive)
+
+    snapshot = commands.add_parser("snapshot", help="instantané Parquet stocks/mouvements/KPIs")
+    snapshot.add_argument("--output", default="exports/snapshots", help="dossier des instantanés")
+    snapshot.add_argument("--row-group-size", type=int, default=100000)
+    snapshot.add_argument("--compression", default="zstd", choices=["zstd", "snappy", "gzip", "none"])
+    snapshot.set_defaults(func=cmd_snapshot)
+
+    report = commands.add_parser("report", help="rapport mensuel PDF/Excel")
+    report.add_argument("--period", default=None, help="mois AAAA-MM (mois courant par défaut)")
+    report.add_argument("--formats", nargs="+", default=["pdf", "xlsx"], choices=["pdf", "xlsx"])
+    report.add_argument("--if-due", action="store_true",
+                        help="générer le mois précédent seulement s'il n'existe pas encore")
+    report.set_defaults(func=cmd_report)
+
+    reappro = commands.add_parser("reappro", help="liste de commandes suggérées (CSV)")
+    reappro.add_argument("--output", default="commandes_suggerees.csv", help="fichier .csv produit")
+    reappro.add_argument("--fournisseur", default=None, help="limiter à un fournisseur")
+    reappro.add_argument("--service", type=float, default=None, help="taux de service visé (ex. 0.95), enregistré")
+    reappro.set_defaults(func=cmd_reappro)
+
+    classify = commands.add_parser("classify", help="classification ABC/XYZ des références (cron quotidien)")
+    classify.set_defaults(func=cmd_classify)
+
+    slotting = commands.add_parser("slotting", help="optimisation des emplacements (simulation sans --apply)")
+    slotting.add_argument("--window", type=int, default=90, help="historique de prélèvements en jours")
+    slotting.add_argument("--max-moves", type=int, default=200, help="transferts maximum par lot")
+    slotting.add_argument("--apply", action="store_true", help="exécuter le lot en une transaction")
+    slotting.add_argument("--utilisateur", default="cron", help="utilisateur enregistré dans les transferts")
+    slotting.set_defaults(func=cmd_slotting)
+
+    transfer = commands.add_parser("transfer", help="exécuter un lot de transferts CSV/Excel (tout ou rien)")
+    transfer.add_argument("file", help="fichier avec colonnes reference, quantite, emplacement_source, "
+                                       "emplacement_destination")
+    transfer.add_argument("--motif", default="Réorganisation", help="motif enregistré")
+    transfer.add_argument("--utilisateur", default="cron", help="utilisateur enregistré dans les transferts")
+    transfer.set_defaults(func=cmd_transfer)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        if args.command != "restore":
+            # Schéma à jour (tables, triggers) avant toute opération
+            from wms_database import WMSDatabase
+            WMSDatabase(args.db)
+        return args.func(args)
+    except Exception as e:
+        print(f"Erreur: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Référentiel clients et historique de commandes par client
+
+Les expéditions sont rattachées à `clients` par client_id ; `clients_commandes` (une ligne par
+client) et `clients_references` (une ligne par client et par référence) sont tenues à jour par
+triggers à chaque expédition (voir wms_database). Les analyses lisent ces petits agrégats
+indexés, jamais l'historique complet des expéditions.
+"""
+
+# Tri proposé -> colonne de clients_commandes (indexées : unités et dernière commande)
+CLIENT_ORDERS = {
+    "Unités expédiées": "c.unites DESC",
+    "Dernière commande": "c.derniere_commande DESC",
+    "Lignes de commande": "c.lignes DESC",
+    "Références distinctes": "c.references_distinctes DESC",
+}
+TOP_CLIENTS = 20
+TOP_REFERENCES = 10
+RECENT_ORDERS = 20
+
+
+def client_id(conn, nom):
+    """Identifiant d'un client par son nom (None s'il est inconnu)"""
+    row = conn.execute("SELECT id FROM clients WHERE nom = ?", (nom,)).fetchone()
+    return row[0] if row else None
+
+
+def save_client(conn, nom, contact=None, actif=True):
+    """Crée ou met à jour un client du référentiel ; retourne son identifiant"""
+    nom = (nom or "").strip()
+    if not nom:
+        raise ValueError("Nom du client obligatoire")
+    conn.execute("""
+        INSERT INTO clients (nom, contact, actif) VALUES (?, ?, ?)
+        ON CONFLICT (nom) DO UPDATE SET contact = excluded.contact, actif = excluded.actif
+    """, (nom, contact or None, int(bool(actif))))
+    conn.commit()
+    return client_id(conn, nom)
+
+
+def client_summary(conn, nom):
+    """(lignes, unités, références distinctes, dernière commande) d'un client, None s'il est inconnu"""
+    return conn.execute("""
+        SELECT COALESCE(c.lignes, 0), COALESCE(c.unites, 0), COALESCE(c.references_distinctes, 0),
+               c.derniere_commande
+        FROM clients k LEFT JOIN clients_commandes c ON c.client_id = k.id
+        WHERE k.nom = ?
+    """, (nom,)).fetchone()
+
+
+def top_clients(conn, order="Unités expédiées", limit=TOP_CLIENTS):
+    """Clients classés : [(client, lignes, unités, références distinctes, dernière commande)]"""
+    return conn.execute(f"""
+        SELECT k.nom, c.lignes, c.unites, c.references_distinctes, c.derniere_commande
+        FROM clients_commandes c JOIN clients k ON k.id = c.client_id
+        ORDER BY {CLIENT_ORDERS[order]} LIMIT ?
+    """, (int(limit),)).fetchall()
+
+
+def client_totals(conn):
+    """(clients avec commandes, lignes, unités) sur tout l'historique"""
+    return conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(lignes), 0), COALESCE(SUM(unites), 0) FROM clients_commandes"
+    ).fetchone()
+
+
+def client_references(conn, nom, limit=TOP_REFERENCES):
+    """Références les plus commandées par un client : [(référence, lignes, unités)]"""
+    return conn.execute("""
+        SELECT r.reference, r.lignes, r.unites
+        FROM clients_references r JOIN clients k ON k.id = r.client_id
+        WHERE k.nom = ?
+        ORDER BY r.unites DESC LIMIT ?
+    """, (nom, int(limit))).fetchall()
+
+
+def recent_orders(conn, nom, limit=RECENT_ORDERS):
+    """Dernières lignes d'expédition d'un client (index sur expeditions.client_id)"""
+    return conn.execute("""
+        SELECT e.numero_commande, COALESCE(e.date_expedition, date(e.date_creation)), e.reference,
+               e.quantite, e.emplacement, e.statut
+        FROM expeditions e
+        WHERE e.client_id = (SELECT id FROM clients WHERE nom = ?)
+        ORDER BY e.id DESC LIMIT ?
+    """, (nom, int(limit))).fetchall()
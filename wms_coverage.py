@@ -0,0 +1,126 @@
+"""Couverture de stock par référence : vitesse d'expédition, jours de couverture, date de rupture prévue
+
+La table `couverture` est marquée périmée par triggers à chaque mouvement (stocks,
+demande_journaliere) ; `refresh_coverage` ne recalcule que ces références, en un seul
+passage vectorisé. La fenêtre de vitesse glissant avec les jours, un recalcul complet
+est fait une fois par jour (`refresh_if_due`).
+"""
+from datetime import date, datetime, timedelta
+
+from wms_lazy import LazyModule
+from wms_services import get_parametre, set_parametre
+
+np = LazyModule("numpy")
+
+# Vitesse = quantité expédiée sur les VELOCITY_DAYS derniers jours / VELOCITY_DAYS
+VELOCITY_DAYS = 90
+STOCKOUT_HORIZON_DAYS = 30
+# Au-delà de cette couverture (5 ans) aucune date de rupture n'est prévue (date_rupture NULL)
+MAX_STOCKOUT_DAYS = 5 * 365
+TOP_STOCKOUTS = 50
+LAST_REFRESH_KEY = "couverture_date_calcul"
+# Tri proposé -> (filtre, ordre) ; la date de rupture est indexée pour les prochaines ruptures
+SORT_ORDERS = {
+    "Rupture la plus proche": ("date_rupture IS NOT NULL AND stock > 0", "date_rupture, jours_couverture"),
+    "Déjà en rupture": ("stock <= 0", "vitesse_journaliere DESC"),
+    "Couverture la plus longue": ("jours_couverture IS NOT NULL", "jours_couverture DESC"),
+    "Vitesse la plus élevée": ("1", "vitesse_journaliere DESC"),
+    "Référence": ("1", "reference"),
+}
+
+
+def compute_coverage(stock, demand, today, days=VELOCITY_DAYS):
+    """(vitesse, jours de couverture, dates de rupture) pour des vecteurs de stock et de demande.
+
+    Sans demande récente la couverture est indéfinie (None) ; un stock nul avec demande est en rupture.
+    Une couverture de plus de `MAX_STOCKOUT_DAYS` jours ne donne pas de date de rupture (None).
+    """
+    stock = np.maximum(np.asarray(stock, dtype=np.float64), 0)
+    velocity = np.asarray(demand, dtype=np.float64) / days
+    moving = velocity > 0
+    cover = np.divide(stock, velocity, out=np.full(len(stock), np.nan), where=moving)
+    # Rotation très lente : une date lointaine (an 11883...) serait triée avant '2026-...' en texte
+    dated = moving & (cover <= MAX_STOCKOUT_DAYS)
+    offsets = np.floor(np.where(dated, cover, 0)).astype(np.int64)
+    origin = np.datetime64(today.isoformat(), 'D')
+    stockout = np.where(dated, (origin + offsets).astype(str), None)
+    return velocity, cover, stockout
+
+
+def refresh_coverage(conn, full=False, today=None):
+    """Recalcule les références périmées (toutes si `full`) ; retourne le nombre de références traitées"""
+    today = today or date.today()
+    since = (today - timedelta(days=VELOCITY_DAYS)).isoformat()
+    if full:
+        conn.execute("UPDATE couverture SET perime = 1 WHERE perime = 0")
+    rows = conn.execute("""
+        SELECT c.reference,
+               (SELECT COALESCE(SUM(quantite), 0) FROM stocks s
+                WHERE s.reference = c.reference AND s.quantite > 0),
+               (SELECT COALESCE(SUM(quantite), 0) FROM demande_journaliere d
+                WHERE d.reference = c.reference AND d.jour >= ? AND d.jour < ?),
+               EXISTS (SELECT 1 FROM stocks s WHERE s.reference = c.reference)
+        FROM couverture c WHERE c.perime = 1
+    """, (since, today.isoformat())).fetchall()
+    if not rows:
+        conn.commit()
+        return 0
+    references, stock, demand, known = zip(*rows)
+    velocity, cover, stockout = compute_coverage(stock, demand, today)
+    computed_at = datetime.now().isoformat(timespec='seconds')
+    conn.executemany("""
+        UPDATE couverture SET stock = ?, vitesse_journaliere = ?, jours_couverture = ?, date_rupture = ?,
+               perime = 0, date_calcul = ?
+        WHERE reference = ?
+    """, (
+        (int(qty), float(speed), None if np.isnan(days) else float(days), when, computed_at, ref)
+        for ref, qty, speed, days, when in zip(references, stock, velocity, cover, stockout)
+    ))
+    # Références disparues du stock et sans demande récente : plus rien à suivre
+    conn.executemany("DELETE FROM couverture WHERE reference = ?",
+                     ((ref,) for ref, qty, recent, present in zip(references, stock, demand, known)
+                      if not present and not recent))
+    conn.commit()
+    return len(rows)
+
+
+def refresh_if_due(conn, today=None):
+    """Recalcul complet une fois par jour, sinon seulement les références périmées"""
+    today = today or date.today()
+    full = get_parametre(conn, LAST_REFRESH_KEY) != today.isoformat()
+    refreshed = refresh_coverage(conn, full=full, today=today)
+    if full:
+        set_parametre(conn, LAST_REFRESH_KEY, today.isoformat(), "Dernier recalcul complet de la couverture")
+        conn.commit()
+    return refreshed
+
+
+def coverage_table(conn, order="Rupture la plus proche", limit=TOP_STOCKOUTS, offset=0, search=None):
+    """Lignes de couverture triées : (référence, stock, vitesse/jour, jours de couverture, date de rupture)"""
+    condition, sort = SORT_ORDERS[order]
+    params = []
+    if search:
+        condition += " AND reference LIKE ?"
+        params.append(f"{search}%")
+    return conn.execute(f"""
+        SELECT reference, stock, vitesse_journaliere, jours_couverture, date_rupture
+        FROM couverture WHERE {condition}
+        ORDER BY {sort} LIMIT ? OFFSET ?
+    """, params + [int(limit), int(offset)]).fetchall()
+
+
+def stockout_kpis(conn, horizon_days=STOCKOUT_HORIZON_DAYS, today=None):
+    """Références suivies, en rupture, en rupture prévue sous `horizon_days` jours, et taux de rupture (%)"""
+    today = today or date.today()
+    tracked, out, upcoming = conn.execute("""
+        SELECT COUNT(*),
+               COALESCE(SUM(stock <= 0), 0),
+               COALESCE(SUM(stock > 0 AND date_rupture IS NOT NULL AND date_rupture <= ?), 0)
+        FROM couverture
+    """, ((today + timedelta(days=horizon_days)).isoformat(),)).fetchone()
+    return {
+        'references_suivies': tracked,
+        'references_en_rupture': out,
+        'ruptures_prevues': upcoming,
+        'taux_rupture': (out / tracked * 100) if tracked else 0.0,
+    }
@@ -0,0 +1,210 @@
+"""Inventaires tournants : génération des comptages, saisie en masse, écarts et ajustements
+
+Une campagne fige la quantité théorique des lignes de stock choisies (classes ABC, zones ou
+plage d'emplacements) dans `comptages_lignes`. Les quantités comptées sont chargées en bloc
+(fichier ligne/quantite_comptee) ; la clôture applique les écarts au stock en mises à jour
+relatives (les mouvements survenus depuis la création sont conservés) dans une seule
+transaction et enregistre le bilan dans `comptages`. L'exactitude d'inventaire se lit dans
+ces bilans : part des lignes comptées sans écart.
+"""
+import csv
+import io
+from datetime import date, timedelta
+
+import wms_classification
+import wms_zones
+
+COUNT_COLUMNS = ['ligne', 'quantite_comptee']
+SHEET_COLUMNS = ['ligne', 'reference', 'emplacement', 'lot', 'quantite_comptee']
+ACCURACY_DAYS = 90
+DISPLAY_ROWS = 200
+
+
+def create_count(conn, libelle, abc=None, zones=None, emplacement_min=None, emplacement_max=None,
+                 max_lines=None, utilisateur=None):
+    """Crée une campagne sur les lignes de stock choisies ; retourne (identifiant, lignes).
+
+    Les lignes déjà présentes dans une campagne ouverte sont écartées.
+    """
+    libelle = (libelle or "").strip()
+    if not libelle:
+        raise ValueError("Libellé du comptage obligatoire")
+    query = """
+        SELECT ?, s.id, s.reference, s.emplacement, s.lot, s.quantite FROM stocks s
+        WHERE s.id NOT IN (SELECT l.stock_id FROM comptages_lignes l JOIN comptages c ON c.id = l.comptage_id
+                           WHERE c.statut = 'Ouvert')
+    """
+    params, criteria = [], []
+    condition, class_params = wms_classification.filter_sql(abc, None, "s.reference")
+    query += condition
+    params += class_params
+    condition, zone_params = wms_zones.filter_sql(zones, "s.emplacement_id")
+    query += condition
+    params += zone_params
+    if emplacement_min:
+        query += " AND s.emplacement >= ?"
+        params.append(emplacement_min)
+    if emplacement_max:
+        # Borne haute inclusive sur le préfixe : "A9" couvre A9-01, A9-02-3...
+        query += " AND s.emplacement <= ?"
+        params.append(emplacement_max + "\uffff")
+    query += " ORDER BY s.emplacement, s.reference"
+    if max_lines:
+        query += " LIMIT ?"
+        params.append(int(max_lines))
+    if abc:
+        criteria.append("ABC " + "/".join(abc))
+    if zones:
+        criteria.append("zones " + ", ".join(zones))
+    if emplacement_min or emplacement_max:
+        criteria.append(f"emplacements {emplacement_min or '…'} à {emplacement_max or '…'}")
+
+    cursor = conn.execute("INSERT INTO comptages (libelle, critere, utilisateur) VALUES (?, ?, ?)",
+                          (libelle, "; ".join(criteria) or "Tout le stock", utilisateur or "Admin"))
+    count_id = cursor.lastrowid
+    lines = conn.execute(f"""
+        INSERT INTO comptages_lignes (comptage_id, stock_id, reference, emplacement, lot, quantite_theorique)
+        {query}
+    """, [count_id] + params).rowcount
+    if not lines:
+        conn.rollback()
+        raise ValueError("Aucune ligne de stock ne correspond aux critères")
+    conn.execute("UPDATE comptages SET lignes = ? WHERE id = ?", (lines, count_id))
+    conn.commit()
+    return count_id, lines
+
+
+def open_counts(conn):
+    """Campagnes ouvertes : [(id, libellé, critère, date de création, lignes, lignes comptées)]"""
+    return conn.execute("""
+        SELECT c.id, c.libelle, c.critere, c.date_creation, c.lignes,
+               (SELECT COUNT(quantite_comptee) FROM comptages_lignes WHERE comptage_id = c.id)
+        FROM comptages c WHERE c.statut = 'Ouvert' ORDER BY c.id DESC
+    """).fetchall()
+
+
+def count_sheet_csv(conn, count_id):
+    """Feuille de comptage CSV sans quantité théorique (comptage à l'aveugle), séparateur ';' avec BOM"""
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=";")
+    writer.writerow(SHEET_COLUMNS)
+    writer.writerows(conn.execute("""
+        SELECT stock_id, reference, emplacement, lot, quantite_comptee FROM comptages_lignes
+        WHERE comptage_id = ? ORDER BY emplacement, reference
+    """, (count_id,)))
+    return ("\ufeff" + output.getvalue()).encode("utf-8")
+
+
+def read_count_file(data, filename):
+    """Quantités comptées [(ligne, quantité)] d'un fichier CSV/Excel (lignes sans quantité ignorées)"""
+    import pandas as pd
+
+    buffer = io.BytesIO(data)
+    if filename.endswith('.csv'):
+        # La feuille exportée utilise ';', un fichier ressaisi peut utiliser ','
+        separator = ";" if b";" in data.split(b"\n", 1)[0] else ","
+        df = pd.read_csv(buffer, sep=separator, encoding='utf-8-sig')
+    else:
+        df = pd.read_excel(buffer)
+    missing = [column for column in COUNT_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"Colonnes manquantes: {', '.join(missing)}")
+    df = df[COUNT_COLUMNS].dropna()
+    return [(int(line), int(quantity)) for line, quantity in df.itertuples(index=False, name=None)]
+
+
+def record_counts(conn, count_id, counts):
+    """Enregistre en bloc les quantités comptées ; retourne (lignes enregistrées, lignes inconnues)"""
+    _check_open(conn, count_id)
+    if any(quantity < 0 for _, quantity in counts):
+        raise ValueError("Les quantités comptées doivent être positives")
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS saisie_comptage (stock_id INTEGER PRIMARY KEY, quantite INTEGER)")
+    conn.execute("DELETE FROM temp.saisie_comptage")
+    # Dernière saisie retenue si une ligne apparaît plusieurs fois
+    conn.executemany("INSERT OR REPLACE INTO temp.saisie_comptage VALUES (?, ?)", counts)
+    recorded = conn.execute("""
+        UPDATE comptages_lignes SET
+            quantite_comptee = (SELECT quantite FROM temp.saisie_comptage t WHERE t.stock_id = comptages_lignes.stock_id),
+            date_comptage = CURRENT_TIMESTAMP
+        WHERE comptage_id = ? AND stock_id IN (SELECT stock_id FROM temp.saisie_comptage)
+    """, (count_id,)).rowcount
+    submitted = conn.execute("SELECT COUNT(*) FROM temp.saisie_comptage").fetchone()[0]
+    conn.execute("DELETE FROM temp.saisie_comptage")
+    conn.commit()
+    return recorded, submitted - recorded
+
+
+def count_summary(conn, count_id):
+    """(lignes, lignes comptées, lignes exactes, écart net en unités, écart absolu) d'une campagne"""
+    return conn.execute("""
+        SELECT COUNT(*), COUNT(quantite_comptee),
+               COALESCE(SUM(quantite_comptee = quantite_theorique), 0),
+               COALESCE(SUM(quantite_comptee - quantite_theorique), 0),
+               COALESCE(SUM(ABS(quantite_comptee - quantite_theorique)), 0)
+        FROM comptages_lignes WHERE comptage_id = ?
+    """, (count_id,)).fetchone()
+
+
+def variances(conn, count_id, limit=DISPLAY_ROWS):
+    """Plus gros écarts : [(ligne, référence, emplacement, lot, théorique, compté, écart)]"""
+    return conn.execute("""
+        SELECT stock_id, reference, emplacement, lot, quantite_theorique, quantite_comptee,
+               quantite_comptee - quantite_theorique AS ecart
+        FROM comptages_lignes
+        WHERE comptage_id = ? AND quantite_comptee IS NOT NULL AND quantite_comptee <> quantite_theorique
+        ORDER BY ABS(quantite_comptee - quantite_theorique) DESC LIMIT ?
+    """, (count_id, int(limit))).fetchall()
+
+
+def post_adjustments(conn, count_id):
+    """Clôture : applique les écarts des lignes comptées au stock en une transaction ; retourne le bilan"""
+    _check_open(conn, count_id)
+    summary = count_summary(conn, count_id)
+    try:
+        # Écart relatif : les mouvements enregistrés depuis la création du comptage sont conservés
+        adjusted = conn.execute("""
+            UPDATE stocks SET quantite = MAX(quantite + (
+                SELECT l.quantite_comptee - l.quantite_theorique FROM comptages_lignes l
+                WHERE l.comptage_id = ? AND l.stock_id = stocks.id), 0),
+                date_modification = CURRENT_TIMESTAMP
+            WHERE id IN (SELECT stock_id FROM comptages_lignes
+                         WHERE comptage_id = ? AND quantite_comptee <> quantite_theorique)
+        """, (count_id, count_id)).rowcount
+        conn.execute("""
+            UPDATE comptages SET statut = 'Clôturé', date_cloture = CURRENT_TIMESTAMP, lignes = ?,
+                lignes_comptees = ?, lignes_exactes = ?, ecart_unites = ?, ecart_absolu = ?
+            WHERE id = ?
+        """, (*summary, count_id))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return summary + (adjusted,)
+
+
+def cancel_count(conn, count_id):
+    """Supprime une campagne ouverte et ses lignes (aucun ajustement)"""
+    _check_open(conn, count_id)
+    conn.execute("DELETE FROM comptages_lignes WHERE comptage_id = ?", (count_id,))
+    conn.execute("DELETE FROM comptages WHERE id = ?", (count_id,))
+    conn.commit()
+
+
+def inventory_accuracy(conn, days=ACCURACY_DAYS, today=None):
+    """(exactitude en %, lignes comptées) des campagnes clôturées sur la période, None sans comptage"""
+    today = today or date.today()
+    counted, exact = conn.execute("""
+        SELECT COALESCE(SUM(lignes_comptees), 0), COALESCE(SUM(lignes_exactes), 0)
+        FROM comptages WHERE statut = 'Clôturé' AND date_cloture >= ?
+    """, ((today - timedelta(days=days)).isoformat(),)).fetchone()
+    if not counted:
+        return None
+    return exact / counted * 100, counted
+
+
+def _check_open(conn, count_id):
+    row = conn.execute("SELECT statut FROM comptages WHERE id = ?", (count_id,)).fetchone()
+    if not row:
+        raise ValueError(f"Comptage {count_id} introuvable")
+    if row[0] != 'Ouvert':
+        raise ValueError(f"Comptage {count_id} déjà clôturé")
@@ -0,0 +1,913 @@
+"""Schéma SQLite du WMS : création, migrations et connexions (sans dépendance à l'interface)"""
+import sqlite3
+
+DEFAULT_DB_PATH = "wms_database.db"
+# Tables de mouvements, colonne de date et type utilisés pour les agrégats mensuels
+MOVEMENT_SOURCES = (
+    ("receptions", "date_reception", "Réception"),
+    ("expeditions", "date_creation", "Expédition"),
+    ("transferts", "date_transfert", "Transfert"),
+)
+# Tables dont chaque écriture incrémente la version dans versions_donnees (invalidation des caches)
+VERSIONED_TABLES = ("stocks", "emplacements", "receptions", "expeditions", "transferts", "utilisateurs",
+                    "alerts", "fournisseurs", "clients", "classification", "plan_emplacements")
+# Clés suivies par l'index en mémoire (wms_index) : nom de l'index -> (table, colonne)
+INDEXED_KEYS = (
+    ("references", "stocks", "reference"),
+    ("emplacements", "stocks", "emplacement"),
+    ("emplacements", "emplacements", "code"),
+    ("clients", "clients", "nom"),
+)
+# Seuils d'alerte globaux (clé dans parametres, valeur par défaut), surchargés par référence dans seuils_alertes
+ALERT_STOCK_KEY = ("seuil_stock_min", 10)
+ALERT_EXPIRY_KEY = ("seuil_expiration_jours", 7)
+ALERT_COLUMNS = "stock_id, type, severite, reference, emplacement, quantite, seuil, date_expiration"
+# Délai contractuel par défaut d'un nouveau fournisseur (jours) et tranches de délai des agrégats
+SUPPLIER_DEFAULT_LEAD_DAYS = 7
+LEAD_TIME_BUCKETS = (
+    ("delai_0", "Même jour", "d = 0"),
+    ("delai_1_3", "1-3 jours", "d BETWEEN 1 AND 3"),
+    ("delai_4_7", "4-7 jours", "d BETWEEN 4 AND 7"),
+    ("delai_8_14", "8-14 jours", "d BETWEEN 8 AND 14"),
+    ("delai_15", "15 jours et plus", "d >= 15"),
+)
+# Délai d'une réception : date de réception - date de commande, en jours entiers (>= 0) ;
+# NULL sans date de commande (réception hors des statistiques de délai)
+LEAD_DAYS_SQL = "MAX(CAST(julianday({row}.date_reception) - julianday({row}.date_commande) AS INTEGER), 0)"
+# Zone d'un emplacement créé à partir d'un code saisi librement : première lettre du code
+LOCATION_ZONE_SQL = "upper(substr({code}, 1, 1))"
+# Emplacements touchés par chaque mouvement (table, colonne, sens) pour les agrégats de mouvements
+MOVEMENT_LOCATIONS = (
+    ("receptions", "emplacement", "Entrée"),
+    ("expeditions", "emplacement", "Sortie"),
+    ("transferts", "emplacement_source", "Sortie"),
+    ("transferts", "emplacement_destination", "Entrée"),
+)
+# Archivage en cours (clé de parametres posée le temps de la transaction d'archivage) : les
+# triggers de suppression des mouvements ne décrémentent pas les agrégats d'historique
+ARCHIVING_KEY = "archivage_en_cours"
+NOT_ARCHIVING_SQL = f"NOT EXISTS (SELECT 1 FROM parametres WHERE cle = '{ARCHIVING_KEY}')"
+ARCHIVE_GUARDED_TRIGGERS = tuple(
+    f"trg_{table}_{rollup}_delete" for table, _, _ in MOVEMENT_SOURCES for rollup in ("agregats", "mouvements")
+) + ("trg_receptions_fournisseurs_delete", "trg_expeditions_clients_delete", "trg_expeditions_demande_delete")
+SUPPLIER_ROLLUP_COLUMNS = ("fournisseur, mois, receptions, quantite, receptions_mesurees, delai_total, "
+                           "delai_carres, a_temps, "
+                           + ", ".join(column for column, _, _ in LEAD_TIME_BUCKETS))
+
+
+def alert_sync_sql(condition, close_stale=True):
+    """Instructions alignant la table alerts sur la vue alertes_calculees pour les lignes de `condition`.
+
+    Les alertes toujours valides sont mises à jour sur place (date d'ouverture conservée),
+    celles qui ne s'appliquent plus sont fermées (supprimées) sauf si `close_stale` est faux
+    (nouvelle ligne de stock : aucune alerte existante à fermer).
+    """
+    close = f"""
+        DELETE FROM alerts WHERE {condition} AND NOT EXISTS (
+            SELECT 1 FROM alertes_calculees c WHERE c.stock_id = alerts.stock_id AND c.type = alerts.type
+        );""" if close_stale else ""
+    return close + f"""
+        INSERT INTO alerts ({ALERT_COLUMNS})
+        SELECT {ALERT_COLUMNS} FROM alertes_calculees WHERE {condition}
+        ON CONFLICT (stock_id, type) DO UPDATE SET
+            severite = excluded.severite, reference = excluded.reference,
+            emplacement = excluded.emplacement, quantite = excluded.quantite,
+            seuil = excluded.seuil, date_expiration = excluded.date_expiration;
+    """
+
+
+def supplier_rollup_sql(condition):
+    """Recalcule les agrégats mensuels des fournisseurs de `condition` (sur receptions r) depuis les réceptions.
+
+    Seuls les mois encore présents dans receptions sont remplacés : ceux des réceptions
+    archivées (wms_services.archive_movements) sont conservés tels quels.
+    """
+    buckets = "".join(f", COALESCE(SUM({test}), 0)" for _, _, test in LEAD_TIME_BUCKETS)
+    return f"""
+        DELETE FROM fournisseurs_mensuel WHERE (fournisseur, mois) IN (
+            SELECT DISTINCT fournisseur, substr(date_reception, 1, 7) FROM receptions r WHERE {condition});
+        INSERT INTO fournisseurs_mensuel ({SUPPLIER_ROLLUP_COLUMNS})
+        SELECT r.fournisseur, r.mois, COUNT(*), SUM(r.quantite), COUNT(d), COALESCE(SUM(d), 0),
+               COALESCE(SUM(d * d), 0),
+               COALESCE(SUM(d <= COALESCE(f.delai_contractuel, {SUPPLIER_DEFAULT_LEAD_DAYS})), 0){buckets}
+        FROM (SELECT fournisseur, substr(date_reception, 1, 7) AS mois, quantite, {LEAD_DAYS_SQL.format(row="r")} AS d
+              FROM receptions r WHERE {condition} AND date_reception IS NOT NULL) r
+        LEFT JOIN fournisseurs f ON f.nom = r.fournisseur
+        GROUP BY r.fournisseur, r.mois;
+    """
+
+
+class WMSDatabase:
+    # Version du schéma, stockée dans PRAGMA user_version (contrôlée à la restauration)
+    SCHEMA_VERSION = 19
+    TABLES = ("stocks", "receptions", "expeditions", "emplacements",
+              "transferts", "utilisateurs", "parametres")
+    MOVEMENT_SOURCES = MOVEMENT_SOURCES
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self.init_database()
+    
+    def init_database(self):
+        """Initialise la base de données SQLite"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        previous_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if previous_version < 18:
+            # Migration : triggers de suppression des mouvements recréés avec la condition d'archivage
+            for name in ARCHIVE_GUARDED_TRIGGERS + ("trg_fournisseurs_fournisseurs_delai",):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        
+        # Table des stocks
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stocks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                reference TEXT NOT NULL,
+                designation TEXT NOT NULL,
+                quantite INTEGER NOT NULL,
+                emplacement TEXT NOT NULL,
+                lot TEXT,
+                date_expiration DATE,
+                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                date_modification TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Table des réceptions
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS receptions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                reference TEXT NOT NULL,
+                quantite INTEGER NOT NULL,
+                fournisseur TEXT NOT NULL,
+                date_reception DATE NOT NULL,
+                emplacement TEXT NOT NULL,
+                statut TEXT DEFAULT 'En cours',
+                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                date_commande DATE
+            )
+        ''')
+        # Date de commande au fournisseur : base du délai de livraison (NULL si inconnue)
+        if "date_commande" not in {row[1] for row in cursor.execute("PRAGMA table_info(receptions)")}:
+            cursor.execute("ALTER TABLE receptions ADD COLUMN date_commande DATE")
+        
+        # Table des expéditions
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS expeditions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                numero_commande TEXT NOT NULL,
+                reference TEXT NOT NULL,
+                quantite INTEGER NOT NULL,
+                client TEXT NOT NULL,
+                emplacement TEXT NOT NULL,
+                date_expedition DATE,
+                statut TEXT DEFAULT 'En préparation',
+                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Référentiel clients : les expéditions y sont rattachées par client_id
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS clients (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nom TEXT UNIQUE NOT NULL,
+                contact TEXT,
+                actif INTEGER DEFAULT 1,
+                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        if "client_id" not in {row[1] for row in cursor.execute("PRAGMA table_info(expeditions)")}:
+            cursor.execute("ALTER TABLE expeditions ADD COLUMN client_id INTEGER REFERENCES clients (id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_expeditions_client_id ON expeditions (client_id)")
+        
+        # Table des emplacements
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS emplacements (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                code TEXT UNIQUE NOT NULL,
+                zone TEXT NOT NULL,
+                capacite_max INTEGER,
+                capacite_utilisee INTEGER DEFAULT 0,
+                statut TEXT DEFAULT 'Disponible'
+            )
+        ''')
+        # Chaque ligne de stock est rattachée à son emplacement par clé (emplacement_id)
+        if "emplacement_id" not in {row[1] for row in cursor.execute("PRAGMA table_info(stocks)")}:
+            cursor.execute("ALTER TABLE stocks ADD COLUMN emplacement_id INTEGER REFERENCES emplacements (id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_stocks_emplacement_id ON stocks (emplacement_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_emplacements_zone ON emplacements (zone)")
+        
+        # Table des transferts
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS transferts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                reference TEXT NOT NULL,
+                quantite INTEGER NOT NULL,
+                emplacement_source TEXT NOT NULL,
+                emplacement_destination TEXT NOT NULL,
+                motif TEXT,
+                utilisateur TEXT,
+                date_transfert TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                lot TEXT
+            )
+        ''')
+        # Lot déplacé : une ligne de stock est identifiée par (référence, emplacement, lot)
+        if "lot" not in {row[1] for row in cursor.execute("PRAGMA table_info(transferts)")}:
+            cursor.execute("ALTER TABLE transferts ADD COLUMN lot TEXT")
+        
+        # Table des utilisateurs
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS utilisateurs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nom TEXT NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                role TEXT NOT NULL,
+                actif INTEGER DEFAULT 1,
+                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Table des parametres
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS parametres (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                cle TEXT UNIQUE NOT NULL,
+                valeur TEXT NOT NULL,
+                description TEXT
+            )
+        ''')
+        
+        # Table des tâches d'arrière-plan (exports, rapports, imports)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                type TEXT NOT NULL,
+                libelle TEXT NOT NULL,
+                statut TEXT NOT NULL DEFAULT 'En attente',
+                progression REAL DEFAULT 0,
+                message TEXT,
+                fichier TEXT,
+                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                date_debut TIMESTAMP,
+                date_fin TIMESTAMP
+            )
+        ''')
+        
+        # Instantanés de KPIs (un enregistrement par KPI et par calcul)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS kpi_snapshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date_snapshot TIMESTAMP NOT NULL,
+                kpi TEXT NOT NULL,
+                valeur REAL
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_kpi_snapshots_date ON kpi_snapshots (date_snapshot)")
+        
+        # Agrégats mensuels des mouvements, recalculés uniquement pour les mois périmés
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS agregats_mensuels (
+                mois TEXT NOT NULL,
+                type TEXT NOT NULL,
+                lignes INTEGER DEFAULT 0,
+                quantite INTEGER DEFAULT 0,
+                references_distinctes INTEGER DEFAULT 0,
+                perime INTEGER DEFAULT 1,
+                date_calcul TIMESTAMP,
+                PRIMARY KEY (mois, type)
+            )
+        ''')
+        
+        # Rapports mensuels générés (un par période et par format)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rapports (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                periode TEXT NOT NULL,
+                format TEXT NOT NULL,
+                fichier TEXT NOT NULL,
+                date_generation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (periode, format)
+            )
+        ''')
+        
+        # Tout mouvement écrit marque son mois comme périmé dans agregats_mensuels (sauf archivage :
+        # les agrégats des mois archivés restent valables)
+        for table, date_column, movement_type in self.MOVEMENT_SOURCES:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{date_column} ON {table} ({date_column})")
+            mark_stale = f"""
+                INSERT INTO agregats_mensuels (mois, type, perime)
+                SELECT substr({{row}}.{date_column}, 1, 7), '{movement_type}', 1
+                WHERE {{row}}.{date_column} IS NOT NULL
+                ON CONFLICT (mois, type) DO UPDATE SET perime = 1;
+            """
+            for event, rows in (("INSERT", ("NEW",)), ("DELETE", ("OLD",)), ("UPDATE", ("OLD", "NEW"))):
+                body = "".join(mark_stale.format(row=row) for row in rows)
+                condition = f"WHEN {NOT_ARCHIVING_SQL}" if event == "DELETE" else ""
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_agregats_{event.lower()}
+                    AFTER {event} ON {table} {condition}
+                    BEGIN {body} END
+                """)
+            if previous_version < 3:
+                # Migration : les mois déjà présents seront agrégés au prochain rapport
+                cursor.execute(f"""
+                    INSERT OR IGNORE INTO agregats_mensuels (mois, type, perime)
+                    SELECT DISTINCT substr({date_column}, 1, 7), '{movement_type}', 1
+                    FROM {table} WHERE {date_column} IS NOT NULL
+                """)
+        
+        # Journal des clés ajoutées/retirées, rejoué par l'index de recherche en mémoire
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS journal_cles (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nom_index TEXT NOT NULL,
+                cle TEXT NOT NULL,
+                delta INTEGER NOT NULL
+            )
+        ''')
+        for index_name, table, column in INDEXED_KEYS:
+            log = f"INSERT INTO journal_cles (nom_index, cle, delta) SELECT '{index_name}', {{row}}.{column}, {{delta}} WHERE {{row}}.{column} IS NOT NULL;"
+            triggers = (
+                ("insert", "INSERT", log.format(row="NEW", delta=1)),
+                ("delete", "DELETE", log.format(row="OLD", delta=-1)),
+                ("update", f"UPDATE OF {column}",
+                 log.format(row="OLD", delta=-1) + log.format(row="NEW", delta=1)),
+            )
+            for suffix, event, body in triggers:
+                condition = f"WHEN OLD.{column} IS NOT NEW.{column}" if suffix == "update" else ""
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_{column}_journal_{suffix}
+                    AFTER {event} ON {table} {condition}
+                    BEGIN {body} END
+                """)
+        
+        # Alertes : seuils surchargés par référence, règles dans une vue, alertes ouvertes
+        # tenues à jour par triggers (le tableau de bord lit alerts au lieu de parcourir stocks)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS seuils_alertes (
+                reference TEXT PRIMARY KEY,
+                seuil_stock INTEGER,
+                jours_expiration INTEGER
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS alerts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                stock_id INTEGER NOT NULL,
+                type TEXT NOT NULL,
+                severite TEXT NOT NULL,
+                reference TEXT NOT NULL,
+                emplacement TEXT,
+                quantite INTEGER,
+                seuil INTEGER,
+                date_expiration DATE,
+                date_ouverture TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (stock_id, type)
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_severite ON alerts (severite)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_reference ON alerts (reference)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_stocks_reference ON stocks (reference)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_stocks_date_expiration ON stocks (date_expiration)")
+        (stock_key, stock_default), (expiry_key, expiry_default) = ALERT_STOCK_KEY, ALERT_EXPIRY_KEY
+        cursor.execute(f'''
+            CREATE VIEW IF NOT EXISTS alertes_calculees AS
+            SELECT s.id AS stock_id, 'stock_faible' AS type,
+                   CASE WHEN s.quantite <= 0 THEN 'critique'
+                        WHEN s.quantite * 2 < COALESCE(o.seuil_stock, g.seuil_stock) THEN 'haute'
+                        ELSE 'moyenne' END AS severite,
+                   s.reference, s.emplacement, s.quantite,
+                   COALESCE(o.seuil_stock, g.seuil_stock) AS seuil, s.date_expiration
+            FROM stocks s
+            LEFT JOIN seuils_alertes o ON o.reference = s.reference
+            CROSS JOIN (SELECT COALESCE((SELECT CAST(valeur AS INTEGER) FROM parametres
+                                         WHERE cle = '{stock_key}'), {stock_default}) AS seuil_stock) g
+            WHERE s.quantite < COALESCE(o.seuil_stock, g.seuil_stock)
+            UNION ALL
+            SELECT s.id, 'expiration',
+                   CASE WHEN s.date_expiration < date('now') THEN 'critique' ELSE 'haute' END,
+                   s.reference, s.emplacement, s.quantite,
+                   COALESCE(o.jours_expiration, g.jours_expiration), s.date_expiration
+            FROM stocks s
+            LEFT JOIN seuils_alertes o ON o.reference = s.reference
+            CROSS JOIN (SELECT COALESCE((SELECT CAST(valeur AS INTEGER) FROM parametres
+                                         WHERE cle = '{expiry_key}'), {expiry_default}) AS jours_expiration) g
+            WHERE s.quantite > 0 AND s.date_expiration IS NOT NULL
+              AND s.date_expiration <= date('now', '+' || COALESCE(o.jours_expiration, g.jours_expiration) || ' days')
+        ''')
+        alert_triggers = (
+            ("stocks_alertes_insert", "AFTER INSERT ON stocks",
+             alert_sync_sql("stock_id = NEW.id", close_stale=False)),
+            ("stocks_alertes_update",
+             "AFTER UPDATE OF quantite, date_expiration, reference, emplacement ON stocks",
+             alert_sync_sql("stock_id = NEW.id")),
+            ("stocks_alertes_delete", "AFTER DELETE ON stocks", "DELETE FROM alerts WHERE stock_id = OLD.id;"),
+            ("seuils_alertes_insert", "AFTER INSERT ON seuils_alertes", alert_sync_sql("reference = NEW.reference")),
+            ("seuils_alertes_update", "AFTER UPDATE ON seuils_alertes",
+             alert_sync_sql("reference = OLD.reference") + alert_sync_sql("reference = NEW.reference")),
+            ("seuils_alertes_delete", "AFTER DELETE ON seuils_alertes", alert_sync_sql("reference = OLD.reference")),
+        )
+        for name, event, body in alert_triggers:
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{name} {event} BEGIN {body} END")
+        # Changement d'un seuil global : réévaluation de tout le stock
+        for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_parametres_alertes_{event.lower()}
+                AFTER {event} ON parametres
+                WHEN {row}.cle IN ('{stock_key}', '{expiry_key}')
+                BEGIN {alert_sync_sql("1")} END
+            """)
+        if previous_version < 6:
+            # Migration : première évaluation des alertes sur le stock existant
+            cursor.executescript(alert_sync_sql("1"))
+
+        # Demande journalière par référence (quantités expédiées), base des prévisions (wms_forecast)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS demande_journaliere (
+                reference TEXT NOT NULL,
+                jour DATE NOT NULL,
+                quantite INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (reference, jour)
+            ) WITHOUT ROWID
+        ''')
+        add_demand = """
+            INSERT INTO demande_journaliere (reference, jour, quantite)
+            SELECT {row}.reference, date(COALESCE({row}.date_expedition, {row}.date_creation)), {sign}{row}.quantite
+            WHERE {row}.quantite IS NOT NULL
+            ON CONFLICT (reference, jour) DO UPDATE SET quantite = quantite + excluded.quantite;
+        """
+        demand_triggers = (
+            ("insert", "INSERT", "", add_demand.format(row="NEW", sign="")),
+            ("delete", "DELETE", f"WHEN {NOT_ARCHIVING_SQL}", add_demand.format(row="OLD", sign="-")),
+            ("update", "UPDATE OF reference, quantite, date_expedition, date_creation", "",
+             add_demand.format(row="OLD", sign="-") + add_demand.format(row="NEW", sign="")),
+        )
+        for suffix, event, condition, body in demand_triggers:
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_expeditions_demande_{suffix}
+                AFTER {event} ON expeditions {condition}
+                BEGIN {body} END
+            """)
+        if previous_version < 7:
+            # Migration : historique reconstruit à partir des expéditions existantes
+            cursor.execute("""
+                INSERT OR REPLACE INTO demande_journaliere (reference, jour, quantite)
+                SELECT reference, date(COALESCE(date_expedition, date_creation)) AS jour, SUM(quantite)
+                FROM expeditions WHERE quantite IS NOT NULL GROUP BY reference, jour
+            """)
+        
+        # Couverture par référence (jours de stock, date de rupture prévue) : toute écriture sur le
+        # stock ou la demande d'une référence la marque périmée, seules celles-ci sont recalculées
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS couverture (
+                reference TEXT PRIMARY KEY,
+                stock INTEGER DEFAULT 0,
+                vitesse_journaliere REAL DEFAULT 0,
+                jours_couverture REAL,
+                date_rupture DATE,
+                perime INTEGER DEFAULT 1,
+                date_calcul TIMESTAMP
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_couverture_date_rupture ON couverture (date_rupture)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_couverture_perime ON couverture (perime)")
+        mark_coverage = """
+            INSERT INTO couverture (reference, perime) VALUES ({row}.reference, 1)
+            ON CONFLICT (reference) DO UPDATE SET perime = 1;
+        """
+        coverage_triggers = (
+            ("stocks", "insert", "INSERT", mark_coverage.format(row="NEW")),
+            ("stocks", "delete", "DELETE", mark_coverage.format(row="OLD")),
+            ("stocks", "update", "UPDATE OF reference, quantite",
+             mark_coverage.format(row="OLD") + mark_coverage.format(row="NEW")),
+            ("demande_journaliere", "insert", "INSERT", mark_coverage.format(row="NEW")),
+            ("demande_journaliere", "update", "UPDATE", mark_coverage.format(row="NEW")),
+        )
+        for table, suffix, event, body in coverage_triggers:
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_couverture_{suffix}
+                AFTER {event} ON {table}
+                BEGIN {body} END
+            """)
+        if previous_version < 8:
+            # Migration : toutes les références connues seront calculées au premier rafraîchissement
+            cursor.execute("""
+                INSERT OR IGNORE INTO couverture (reference, perime)
+                SELECT reference, 1 FROM stocks UNION SELECT reference, 1 FROM demande_journaliere
+            """)
+        if previous_version < 16:
+            # Migration : dates de rupture calculées sans plafond (an 11883...) recalculées au prochain rafraîchissement
+            cursor.execute("UPDATE couverture SET perime = 1")
+        
+        # Référentiel fournisseurs (alimenté par les réceptions) et agrégats mensuels par fournisseur,
+        # tenus à jour par triggers : les analyses ne relisent jamais l'historique des réceptions
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS fournisseurs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nom TEXT UNIQUE NOT NULL,
+                delai_contractuel INTEGER NOT NULL DEFAULT {SUPPLIER_DEFAULT_LEAD_DAYS},
+                contact TEXT,
+                actif INTEGER DEFAULT 1,
+                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        bucket_columns = "".join(f"{column} INTEGER DEFAULT 0, " for column, _, _ in LEAD_TIME_BUCKETS)
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS fournisseurs_mensuel (
+                fournisseur TEXT NOT NULL,
+                mois TEXT NOT NULL,
+                receptions INTEGER DEFAULT 0,
+                quantite INTEGER DEFAULT 0,
+                receptions_mesurees INTEGER DEFAULT 0,
+                delai_total INTEGER DEFAULT 0,
+                delai_carres INTEGER DEFAULT 0,
+                a_temps INTEGER DEFAULT 0,
+                {bucket_columns}
+                PRIMARY KEY (fournisseur, mois)
+            ) WITHOUT ROWID
+        ''')
+        if "receptions_mesurees" not in {row[1] for row in cursor.execute("PRAGMA table_info(fournisseurs_mensuel)")}:
+            cursor.execute("ALTER TABLE fournisseurs_mensuel ADD COLUMN receptions_mesurees INTEGER DEFAULT 0")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_fournisseurs_mensuel_mois ON fournisseurs_mensuel (mois)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_receptions_fournisseur ON receptions (fournisseur)")
+        add_supplier = "INSERT OR IGNORE INTO fournisseurs (nom) VALUES (NEW.fournisseur);"
+        add_rollup = f"""
+            INSERT INTO fournisseurs_mensuel ({SUPPLIER_ROLLUP_COLUMNS})
+            SELECT {{row}}.fournisseur, substr({{row}}.date_reception, 1, 7), {{sign}}1, {{sign}}{{row}}.quantite,
+                   {{sign}}(d IS NOT NULL), {{sign}}COALESCE(d, 0), {{sign}}COALESCE(d * d, 0),
+                   {{sign}}COALESCE(d <= COALESCE(f.delai_contractuel, {SUPPLIER_DEFAULT_LEAD_DAYS}), 0),
+                   {", ".join(f"{{sign}}COALESCE({test}, 0)" for _, _, test in LEAD_TIME_BUCKETS)}
+            FROM (SELECT {LEAD_DAYS_SQL} AS d) LEFT JOIN fournisseurs f ON f.nom = {{row}}.fournisseur
+            WHERE {{row}}.date_reception IS NOT NULL
+            ON CONFLICT (fournisseur, mois) DO UPDATE SET
+                receptions = receptions + excluded.receptions, quantite = quantite + excluded.quantite,
+                receptions_mesurees = receptions_mesurees + excluded.receptions_mesurees,
+                delai_total = delai_total + excluded.delai_total, delai_carres = delai_carres + excluded.delai_carres,
+                a_temps = a_temps + excluded.a_temps,
+                {", ".join(f"{column} = {column} + excluded.{column}" for column, _, _ in LEAD_TIME_BUCKETS)};
+        """
+        supplier_triggers = (
+            ("receptions", "insert", "AFTER INSERT ON receptions",
+             add_supplier + add_rollup.format(row="NEW", sign="")),
+            ("receptions", "delete", f"AFTER DELETE ON receptions WHEN {NOT_ARCHIVING_SQL}",
+             add_rollup.format(row="OLD", sign="-")),
+            ("receptions", "update", "AFTER UPDATE OF fournisseur, quantite, date_reception, date_commande ON receptions",
+             add_rollup.format(row="OLD", sign="-") + add_supplier + add_rollup.format(row="NEW", sign="")),
+            # Nouveau délai contractuel : le taux de ponctualité du fournisseur est recalculé
+            ("fournisseurs", "delai", "AFTER UPDATE OF delai_contractuel ON fournisseurs",
+             supplier_rollup_sql("r.fournisseur = NEW.nom")),
+        )
+        if previous_version < 17:
+            # Migration : délai mesuré depuis la date de commande, triggers recréés avec la nouvelle mesure
+            for table, suffix, _, _ in supplier_triggers:
+                cursor.execute(f"DROP TRIGGER IF EXISTS trg_{table}_fournisseurs_{suffix}")
+        for table, suffix, event, body in supplier_triggers:
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_fournisseurs_{suffix} {event} BEGIN {body} END")
+        if previous_version < 9:
+            # Migration : référentiel construit à partir des réceptions existantes
+            cursor.execute("INSERT OR IGNORE INTO fournisseurs (nom) SELECT DISTINCT fournisseur FROM receptions")
+        if previous_version < 17:
+            # Agrégats reconstruits : les réceptions sans date de commande ne comptent plus dans les délais ;
+            # les mois déjà archivés (non reconstruits) perdent leurs délais d'avant la date de commande
+            cursor.execute(f"""
+                UPDATE fournisseurs_mensuel SET receptions_mesurees = 0, delai_total = 0, delai_carres = 0,
+                    a_temps = 0, {", ".join(f"{column} = 0" for column, _, _ in LEAD_TIME_BUCKETS)}
+            """)
+            cursor.executescript(supplier_rollup_sql("1"))
+        
+        # Historique de commandes par client (lignes, unités, références distinctes, dernière
+        # commande) et par couple client/référence, tenus à jour par triggers sur client_id
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS clients_commandes (
+                client_id INTEGER PRIMARY KEY,
+                lignes INTEGER DEFAULT 0,
+                unites INTEGER DEFAULT 0,
+                references_distinctes INTEGER DEFAULT 0,
+                derniere_commande DATE
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_clients_commandes_derniere ON clients_commandes (derniere_commande)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_clients_commandes_unites ON clients_commandes (unites)")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS clients_references (
+                client_id INTEGER NOT NULL,
+                reference TEXT NOT NULL,
+                lignes INTEGER DEFAULT 0,
+                unites INTEGER DEFAULT 0,
+                PRIMARY KEY (client_id, reference)
+            ) WITHOUT ROWID
+        ''')
+        if previous_version < 10:
+            # Migration : clients créés depuis le texte libre, rattachement puis agrégats en bloc
+            # (avant la création des triggers, qui rejoueraient chaque ligne)
+            cursor.execute("INSERT OR IGNORE INTO clients (nom) SELECT DISTINCT client FROM expeditions")
+            cursor.execute("""
+                UPDATE expeditions SET client_id = (SELECT id FROM clients WHERE nom = expeditions.client)
+                WHERE client_id IS NULL
+            """)
+            cursor.execute("DELETE FROM clients_references")
+            cursor.execute("DELETE FROM clients_commandes")
+            cursor.execute("""
+                INSERT INTO clients_references (client_id, reference, lignes, unites)
+                SELECT client_id, reference, COUNT(*), SUM(quantite)
+                FROM expeditions WHERE client_id IS NOT NULL GROUP BY client_id, reference
+            """)
+            cursor.execute("""
+                INSERT INTO clients_commandes (client_id, lignes, unites, references_distinctes, derniere_commande)
+                SELECT e.client_id, COUNT(*), SUM(e.quantite),
+                       (SELECT COUNT(*) FROM clients_references r WHERE r.client_id = e.client_id),
+                       MAX(date(COALESCE(e.date_expedition, e.date_creation)))
+                FROM expeditions e WHERE e.client_id IS NOT NULL GROUP BY e.client_id
+            """)
+        order_day = "date(COALESCE({row}.date_expedition, {row}.date_creation))"
+        add_order = f"""
+            INSERT INTO clients_references (client_id, reference, lignes, unites)
+            SELECT NEW.client_id, NEW.reference, 1, NEW.quantite WHERE NEW.client_id IS NOT NULL
+            ON CONFLICT (client_id, reference) DO UPDATE SET lignes = lignes + 1, unites = unites + excluded.unites;
+            INSERT INTO clients_commandes (client_id, lignes, unites, references_distinctes, derniere_commande)
+            SELECT NEW.client_id, 1, NEW.quantite,
+                   (SELECT lignes = 1 FROM clients_references WHERE client_id = NEW.client_id AND reference = NEW.reference),
+                   {order_day.format(row="NEW")}
+            WHERE NEW.client_id IS NOT NULL
+            ON CONFLICT (client_id) DO UPDATE SET
+                lignes = lignes + 1, unites = unites + excluded.unites,
+                references_distinctes = references_distinctes + excluded.references_distinctes,
+                derniere_commande = MAX(COALESCE(derniere_commande, ''), COALESCE(excluded.derniere_commande, ''));
+        """
+        # Retrait : la dernière commande n'est relue (index client_id) que si la ligne retirée la portait
+        remove_order = f"""
+            UPDATE clients_references SET lignes = lignes - 1, unites = unites - OLD.quantite
+            WHERE client_id = OLD.client_id AND reference = OLD.reference;
+            UPDATE clients_commandes SET
+                lignes = lignes - 1, unites = unites - OLD.quantite,
+                references_distinctes = references_distinctes - (
+                    SELECT COUNT(*) FROM clients_references
+                    WHERE client_id = OLD.client_id AND reference = OLD.reference AND lignes <= 0),
+                derniere_commande = CASE WHEN derniere_commande > {order_day.format(row="OLD")} THEN derniere_commande
+                    ELSE (SELECT MAX({order_day.format(row="e")}) FROM expeditions e WHERE e.client_id = OLD.client_id)
+                    END
+            WHERE client_id = OLD.client_id;
+            DELETE FROM clients_references WHERE client_id = OLD.client_id AND reference = OLD.reference AND lignes <= 0;
+            DELETE FROM clients_commandes WHERE client_id = OLD.client_id AND lignes <= 0;
+        """
+        # Expédition saisie sans client_id (import, CLI) : client créé puis ligne rattachée par son nom
+        attach_client = """
+            INSERT OR IGNORE INTO clients (nom) VALUES (NEW.client);
+            UPDATE expeditions SET client_id = (SELECT id FROM clients WHERE nom = NEW.client) WHERE id = NEW.id;
+        """
+        client_triggers = (
+            ("insert", "AFTER INSERT ON expeditions", add_order),
+            ("rattachement", "AFTER INSERT ON expeditions WHEN NEW.client_id IS NULL", attach_client),
+            ("client", "AFTER UPDATE OF client ON expeditions WHEN NEW.client IS NOT OLD.client", attach_client),
+            ("delete", f"AFTER DELETE ON expeditions WHEN {NOT_ARCHIVING_SQL}", remove_order),
+            ("update", "AFTER UPDATE OF client_id, reference, quantite, date_expedition, date_creation ON expeditions",
+             remove_order + add_order),
+        )
+        for suffix, event, body in client_triggers:
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_expeditions_clients_{suffix} {event} BEGIN {body} END")
+        
+        # Classes ABC (volume) et XYZ (variabilité) par référence, recalculées chaque jour (wms_classification)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS classification (
+                reference TEXT PRIMARY KEY,
+                classe_abc TEXT NOT NULL,
+                classe_xyz TEXT NOT NULL,
+                volume INTEGER DEFAULT 0,
+                part_cumulee REAL,
+                cv REAL,
+                date_calcul TIMESTAMP
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_classification_classes ON classification (classe_abc, classe_xyz)")
+        
+        # Agrégats de mouvements tenus à jour à l'écriture : par jour et par type, par emplacement
+        # et par sens, par mois/utilisateur/motif (transferts) ; les analyses ne lisent que ces tables
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS mouvements_jour (
+                jour DATE NOT NULL,
+                type TEXT NOT NULL,
+                mouvements INTEGER DEFAULT 0,
+                unites INTEGER DEFAULT 0,
+                PRIMARY KEY (jour, type)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS mouvements_emplacements (
+                emplacement TEXT NOT NULL,
+                sens TEXT NOT NULL,
+                mouvements INTEGER DEFAULT 0,
+                unites INTEGER DEFAULT 0,
+                PRIMARY KEY (emplacement, sens)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_mouvements_emplacements_sens ON mouvements_emplacements (sens, mouvements)")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS mouvements_utilisateurs (
+                mois TEXT NOT NULL,
+                utilisateur TEXT NOT NULL,
+                motif TEXT NOT NULL,
+                mouvements INTEGER DEFAULT 0,
+                unites INTEGER DEFAULT 0,
+                PRIMARY KEY (mois, utilisateur, motif)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_transferts_reference ON transferts (reference)")
+        user_columns = "COALESCE({row}.utilisateur, 'Inconnu'), COALESCE({row}.motif, 'Autre')"
+        if previous_version < 12:
+            # Migration : agrégats construits en bloc à partir des mouvements existants
+            for table in ("mouvements_jour", "mouvements_emplacements", "mouvements_utilisateurs"):
+                cursor.execute(f"DELETE FROM {table}")
+            for table, date_column, movement_type in self.MOVEMENT_SOURCES:
+                cursor.execute(f"""
+                    INSERT INTO mouvements_jour (jour, type, mouvements, unites)
+                    SELECT date({date_column}), '{movement_type}', COUNT(*), SUM(quantite)
+                    FROM {table} WHERE {date_column} IS NOT NULL GROUP BY date({date_column})
+                """)
+            for table, column, direction in MOVEMENT_LOCATIONS:
+                cursor.execute(f"""
+                    INSERT INTO mouvements_emplacements (emplacement, sens, mouvements, unites)
+                    SELECT {column}, '{direction}', COUNT(*), SUM(quantite) FROM {table}
+                    WHERE {column} IS NOT NULL GROUP BY {column}
+                    ON CONFLICT (emplacement, sens) DO UPDATE SET
+                        mouvements = mouvements + excluded.mouvements, unites = unites + excluded.unites
+                """)
+            cursor.execute(f"""
+                INSERT INTO mouvements_utilisateurs (mois, utilisateur, motif, mouvements, unites)
+                SELECT substr(t.date_transfert, 1, 7), {user_columns.format(row="t")}, COUNT(*), SUM(t.quantite)
+                FROM transferts t WHERE t.date_transfert IS NOT NULL GROUP BY 1, 2, 3
+            """)
+        for table, date_column, movement_type in self.MOVEMENT_SOURCES:
+            add_movement = f"""
+                INSERT INTO mouvements_jour (jour, type, mouvements, unites)
+                SELECT date({{row}}.{date_column}), '{movement_type}', {{sign}}1, {{sign}}{{row}}.quantite
+                WHERE {{row}}.{date_column} IS NOT NULL
+                ON CONFLICT (jour, type) DO UPDATE SET
+                    mouvements = mouvements + excluded.mouvements, unites = unites + excluded.unites;
+            """
+            columns = {"quantite", date_column}
+            for location_table, column, direction in MOVEMENT_LOCATIONS:
+                if location_table != table:
+                    continue
+                columns.add(column)
+                add_movement += f"""
+                    INSERT INTO mouvements_emplacements (emplacement, sens, mouvements, unites)
+                    SELECT {{row}}.{column}, '{direction}', {{sign}}1, {{sign}}{{row}}.quantite
+                    WHERE {{row}}.{column} IS NOT NULL
+                    ON CONFLICT (emplacement, sens) DO UPDATE SET
+                        mouvements = mouvements + excluded.mouvements, unites = unites + excluded.unites;
+                """
+            if table == "transferts":
+                columns.update(("utilisateur", "motif"))
+                add_movement += f"""
+                    INSERT INTO mouvements_utilisateurs (mois, utilisateur, motif, mouvements, unites)
+                    SELECT substr({{row}}.date_transfert, 1, 7), {user_columns}, {{sign}}1, {{sign}}{{row}}.quantite
+                    WHERE {{row}}.date_transfert IS NOT NULL
+                    ON CONFLICT (mois, utilisateur, motif) DO UPDATE SET
+                        mouvements = mouvements + excluded.mouvements, unites = unites + excluded.unites;
+                """
+            movement_triggers = (
+                ("insert", "INSERT", "", add_movement.format(row="NEW", sign="")),
+                ("delete", "DELETE", f"WHEN {NOT_ARCHIVING_SQL}", add_movement.format(row="OLD", sign="-")),
+                ("update", f"UPDATE OF {', '.join(sorted(columns))}", "",
+                 add_movement.format(row="OLD", sign="-") + add_movement.format(row="NEW", sign="")),
+            )
+            for suffix, event, condition, body in movement_triggers:
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_mouvements_{suffix}
+                    AFTER {event} ON {table} {condition}
+                    BEGIN {body} END
+                """)
+
+        # Plan de l'entrepôt importé (wms_layout) : géométrie des emplacements dont le code ne suffit pas
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS plan_emplacements (
+                code TEXT PRIMARY KEY,
+                zone TEXT NOT NULL,
+                allee INTEGER NOT NULL,
+                travee INTEGER NOT NULL,
+                niveau INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        
+        # Stock par zone (zone de l'emplacement rattaché), tenu à jour par triggers : les graphiques
+        # et filtres de zone lisent zones_stock et l'index emplacements (zone), jamais tout le stock
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS zones_stock (
+                zone TEXT PRIMARY KEY,
+                lignes INTEGER DEFAULT 0,
+                quantite INTEGER DEFAULT 0
+            ) WITHOUT ROWID
+        ''')
+        if previous_version < 14:
+            # Migration : emplacements créés depuis les codes saisis, rattachement puis agrégats en bloc
+            cursor.execute(f"""
+                INSERT OR IGNORE INTO emplacements (code, zone)
+                SELECT DISTINCT emplacement, {LOCATION_ZONE_SQL.format(code="emplacement")} FROM stocks
+            """)
+            cursor.execute("""
+                UPDATE stocks SET emplacement_id = (SELECT id FROM emplacements WHERE code = stocks.emplacement)
+                WHERE emplacement_id IS NULL
+            """)
+            cursor.execute("DELETE FROM zones_stock")
+            cursor.execute("""
+                INSERT INTO zones_stock (zone, lignes, quantite)
+                SELECT e.zone, SUM(s.quantite > 0), SUM(MAX(s.quantite, 0))
+                FROM stocks s JOIN emplacements e ON e.id = s.emplacement_id GROUP BY e.zone
+            """)
+        add_stock = """
+            INSERT INTO zones_stock (zone, lignes, quantite)
+            SELECT e.zone, {sign}({row}.quantite > 0), {sign}MAX({row}.quantite, 0)
+            FROM emplacements e WHERE e.id = {row}.emplacement_id
+            ON CONFLICT (zone) DO UPDATE SET lignes = lignes + excluded.lignes, quantite = quantite + excluded.quantite;
+        """
+        # Tout le stock d'un emplacement passe d'une zone à l'autre (lecture par l'index emplacement_id)
+        move_location = """
+            INSERT INTO zones_stock (zone, lignes, quantite)
+            SELECT {zone}, {sign}COALESCE(SUM(quantite > 0), 0), {sign}COALESCE(SUM(MAX(quantite, 0)), 0)
+            FROM stocks WHERE emplacement_id = OLD.id
+            ON CONFLICT (zone) DO UPDATE SET lignes = lignes + excluded.lignes, quantite = quantite + excluded.quantite;
+        """
+        # Ligne saisie avec un code libre (formulaire, réception) : emplacement créé puis ligne rattachée
+        attach_location = f"""
+            INSERT OR IGNORE INTO emplacements (code, zone)
+            VALUES (NEW.emplacement, {LOCATION_ZONE_SQL.format(code="NEW.emplacement")});
+            UPDATE stocks SET emplacement_id = (SELECT id FROM emplacements WHERE code = NEW.emplacement) WHERE id = NEW.id;
+        """
+        zone_triggers = (
+            ("stocks", "insert", "AFTER INSERT ON stocks", add_stock.format(row="NEW", sign="")),
+            ("stocks", "rattachement", "AFTER INSERT ON stocks WHEN NEW.emplacement_id IS NULL", attach_location),
+            ("stocks", "emplacement", "AFTER UPDATE OF emplacement ON stocks WHEN NEW.emplacement IS NOT OLD.emplacement",
+             attach_location),
+            ("stocks", "delete", "AFTER DELETE ON stocks", add_stock.format(row="OLD", sign="-")),
+            ("stocks", "update", "AFTER UPDATE OF quantite, emplacement_id ON stocks",
+             add_stock.format(row="OLD", sign="-") + add_stock.format(row="NEW", sign="")),
+            ("emplacements", "zone", "AFTER UPDATE OF zone ON emplacements WHEN NEW.zone IS NOT OLD.zone",
+             move_location.format(zone="OLD.zone", sign="-") + move_location.format(zone="NEW.zone", sign="")),
+            # Emplacement supprimé : son stock sort des zones et n'est plus rattaché
+            ("emplacements", "delete", "AFTER DELETE ON emplacements",
+             move_location.format(zone="OLD.zone", sign="-")
+             + "UPDATE stocks SET emplacement_id = NULL WHERE emplacement_id = OLD.id;"),
+        )
+        for table, suffix, event, body in zone_triggers:
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_zones_{suffix} {event} BEGIN {body} END")
+
+        # Inventaires tournants (wms_cycle_count) : campagnes de comptage et lignes comptées, avec
+        # quantité théorique figée à la création ; le bilan est stocké à la clôture de la campagne
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS comptages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                libelle TEXT NOT NULL,
+                critere TEXT,
+                statut TEXT NOT NULL DEFAULT 'Ouvert',
+                utilisateur TEXT,
+                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                date_cloture TIMESTAMP,
+                lignes INTEGER DEFAULT 0,
+                lignes_comptees INTEGER DEFAULT 0,
+                lignes_exactes INTEGER DEFAULT 0,
+                ecart_unites INTEGER DEFAULT 0,
+                ecart_absolu INTEGER DEFAULT 0
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_comptages_statut ON comptages (statut, date_cloture)")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS comptages_lignes (
+                comptage_id INTEGER NOT NULL REFERENCES comptages (id),
+                stock_id INTEGER NOT NULL,
+                reference TEXT NOT NULL,
+                emplacement TEXT NOT NULL,
+                lot TEXT,
+                quantite_theorique INTEGER NOT NULL,
+                quantite_comptee INTEGER,
+                date_comptage TIMESTAMP,
+                PRIMARY KEY (comptage_id, stock_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_comptages_lignes_stock ON comptages_lignes (stock_id)")
+
+        # Version par table, incrémentée à chaque écriture : les listes mémorisées de
+        # l'interface comparent ce compteur au lieu de relire les tables
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS versions_donnees (
+                nom_table TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        for table in VERSIONED_TABLES:
+            cursor.execute("INSERT OR IGNORE INTO versions_donnees (nom_table, version) VALUES (?, 0)", (table,))
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{event.lower()}
+                    AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE versions_donnees SET version = version + 1 WHERE nom_table = '{table}';
+                    END
+                """)
+        
+        cursor.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        
+        conn.commit()
+        conn.close()
+    
+    def get_connection(self):
+        return sqlite3.connect(self.db_path)
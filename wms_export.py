@@ -0,0 +1,391 @@
+"""Moteurs d'export en flux : Excel à mémoire constante et instantanés Parquet en colonnes"""
+import json
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import wms_kpis
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+FETCH_SIZE = 5000
+# Nombre de paquets de lignes en attente par feuille (borne la mémoire des producteurs)
+QUEUE_CHUNKS = 4
+SPOOL_MAX_SIZE = 32 * 1024 * 1024
+# Lignes d'une feuille Excel (en-tête compris) : au-delà, suite dans une feuille de continuation
+MAX_SHEET_ROWS = 1048576
+SHEET_NAME_LENGTH = 31
+
+# Une feuille est définie soit par une requête SQL, soit par des lignes déjà calculées
+Sheet = namedtuple("Sheet", ["name", "query", "params", "headers", "rows"])
+Sheet.__new__.__defaults__ = (None, (), None, None)
+
+_DONE = object()
+
+
+def _put(out_queue, item, cancel):
+    """Pousse un paquet dans la file ; False si l'écriture a été interrompue entre-temps"""
+    while not cancel.is_set():
+        try:
+            out_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _produce(db_path, index, sheet, out_queue, fetch_size, cancel):
+    """Lit une feuille par paquets depuis sa propre connexion et les pousse dans la file
+
+    S'arrête dès que `cancel` est positionné (écriture du classeur en échec).
+    """
+    try:
+        if sheet.rows is not None:
+            if not _put(out_queue, (index, list(sheet.headers or []), None), cancel):
+                return
+            rows = list(sheet.rows)
+            for start in range(0, len(rows), fetch_size):
+                if not _put(out_queue, (index, None, rows[start:start + fetch_size]), cancel):
+                    return
+            return
+
+        conn = sqlite3.connect(db_path)
+        try:
+            cursor = conn.execute(sheet.query, sheet.params or ())
+            headers = sheet.headers or [col[0] for col in cursor.description]
+            if not _put(out_queue, (index, list(headers), None), cancel):
+                return
+            while True:
+                chunk = cursor.fetchmany(fetch_size)
+                if not chunk or not _put(out_queue, (index, None, chunk), cancel):
+                    break
+        finally:
+            conn.close()
+    except Exception as e:
+        _put(out_queue, (index, e, None), cancel)
+    finally:
+        _put(out_queue, (index, _DONE, None), cancel)
+
+
+def _drain(out_queue):
+    """Vide la file (paquets abandonnés après une interruption)"""
+    while True:
+        try:
+            out_queue.get_nowait()
+        except queue.Empty:
+            return
+
+
+def _continuation_name(name, part):
+    """Nom de la feuille de continuation `part` (2, 3...) dans la limite de 31 caractères"""
+    suffix = f" ({part})"
+    return name[:SHEET_NAME_LENGTH - len(suffix)] + suffix
+
+
+class _XlsxWriterBook:
+    """Classeur xlsxwriter en mode constant_memory (lignes vidées au fil de l'eau)"""
+
+    def __init__(self, output):
+        import xlsxwriter
+        self.workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+        self.header_format = self.workbook.add_format({'bold': True})
+        self.sheets = []
+        self.next_row = []
+
+    def add_sheet(self, name):
+        self.sheets.append(self.workbook.add_worksheet(name))
+        self.next_row.append(0)
+        return len(self.sheets) - 1
+
+    def write_header(self, index, headers):
+        self.sheets[index].write_row(0, 0, headers, self.header_format)
+        self.next_row[index] = 1
+
+    def write_rows(self, index, rows):
+        sheet = self.sheets[index]
+        row_idx = self.next_row[index]
+        for row in rows:
+            # -1 : ligne hors des limites de la feuille, jamais ignorée silencieusement
+            if sheet.write_row(row_idx, 0, row) == -1:
+                raise ValueError(f"Feuille {sheet.name} pleine : ligne {row_idx + 1} hors limites")
+            row_idx += 1
+        self.next_row[index] = row_idx
+
+    def close(self):
+        self.workbook.close()
+
+
+class _OpenpyxlBook:
+    """Classeur openpyxl en mode write_only (repli si xlsxwriter est absent)"""
+
+    def __init__(self, output):
+        from openpyxl import Workbook
+        self.output = output
+        self.workbook = Workbook(write_only=True)
+        self.sheets = []
+
+    def add_sheet(self, name):
+        self.sheets.append(self.workbook.create_sheet(name))
+        return len(self.sheets) - 1
+
+    def write_header(self, index, headers):
+        self.sheets[index].append(headers)
+
+    def write_rows(self, index, rows):
+        sheet = self.sheets[index]
+        for row in rows:
+            sheet.append(row)
+
+    def close(self):
+        self.workbook.save(self.output)
+
+
+def _open_book(output, engine):
+    if engine in (None, "xlsxwriter"):
+        try:
+            return _XlsxWriterBook(output), "xlsxwriter"
+        except ImportError:
+            if engine == "xlsxwriter":
+                raise
+    return _OpenpyxlBook(output), "openpyxl"
+
+
+def write_workbook(db_path, sheets, output=None, engine=None, workers=None, fetch_size=FETCH_SIZE,
+                   progress=None):
+    """Écrit un classeur multi-feuilles dans `output` (tampon en mémoire par défaut).
+
+    Chaque feuille est extraite en parallèle sur sa propre connexion SQLite ; un seul
+    thread sérialise l'écriture, feuille par feuille dans l'ordre d'arrivée des paquets.
+    Une feuille dépassant la limite d'Excel continue dans « Nom (2) », « Nom (3) »...
+    `progress(feuilles terminées, nombre de feuilles)` est appelé à chaque fin de feuille.
+    Si l'écriture échoue, les producteurs sont arrêtés avant que l'erreur ne remonte.
+    Retourne (tampon positionné au début, statistiques).
+    """
+    if output is None:
+        output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+
+    started = time.perf_counter()
+    book, engine_used = _open_book(output, engine)
+    for sheet in sheets:
+        book.add_sheet(sheet.name)
+
+    rows_written = [0] * len(sheets)
+    # Par feuille : feuille physique courante, lignes qui y sont écrites, en-tête et numéro de partie
+    targets = list(range(len(sheets)))
+    used = [0] * len(sheets)
+    headers = [[] for _ in sheets]
+    parts = [1] * len(sheets)
+    out_queue = queue.Queue(maxsize=QUEUE_CHUNKS * max(len(sheets), 1))
+    cancel = threading.Event()
+    error = None
+    with ThreadPoolExecutor(max_workers=workers or len(sheets) or 1) as pool:
+        for index, sheet in enumerate(sheets):
+            pool.submit(_produce, db_path, index, sheet, out_queue, fetch_size, cancel)
+
+        try:
+            pending = len(sheets)
+            while pending:
+                index, header, rows = out_queue.get()
+                if header is _DONE:
+                    pending -= 1
+                    if progress:
+                        progress(len(sheets) - pending, len(sheets))
+                elif isinstance(header, Exception):
+                    error = error or header
+                elif error is None and header is not None:
+                    headers[index] = header
+                    book.write_header(index, header)
+                    used[index] = 1
+                elif error is None:
+                    rows_written[index] += len(rows)
+                    while rows:
+                        room = MAX_SHEET_ROWS - used[index]
+                        if room <= 0:
+                            parts[index] += 1
+                            targets[index] = book.add_sheet(_continuation_name(sheets[index].name, parts[index]))
+                            book.write_header(targets[index], headers[index])
+                            used[index] = 1
+                            continue
+                        book.write_rows(targets[index], rows[:room])
+                        used[index] += len(rows[:room])
+                        rows = rows[room:]
+        finally:
+            # Fin normale ou écriture en échec (disque plein, moteur) : les producteurs
+            # bloqués sur la file s'arrêtent, la sortie du pool ne peut pas attendre indéfiniment
+            cancel.set()
+            _drain(out_queue)
+
+    if error is not None:
+        raise error
+    book.close()
+    output.seek(0)
+
+    elapsed = time.perf_counter() - started
+    total_rows = sum(rows_written)
+    stats = {
+        'engine': engine_used,
+        'rows': dict(zip((sheet.name for sheet in sheets), rows_written)),
+        'total_rows': total_rows,
+        'seconds': elapsed,
+        'rows_per_second': total_rows / elapsed if elapsed > 0 else 0,
+    }
+    return output, stats
+
+
+def analysis_sheets(conn):
+    """Feuilles de l'analyse complète : stocks, KPIs et 100 derniers mouvements"""
+    kpis = wms_kpis.compute_kpis(conn)
+    kpis_rows = [
+        [wms_kpis.KPI_LABELS[key], f"{kpis[key]:.1f}%" if key == 'pourcentage_expiration' else kpis[key]]
+        for key in ('stock_total', 'references_actives', 'lots', 'lots_expiration_proche', 'pourcentage_expiration')
+    ]
+    return [
+        Sheet("Stocks", """
+            SELECT reference, designation, quantite, emplacement, 
+                   date_creation as derniere_maj
+            FROM stocks 
+            ORDER BY quantite DESC
+        """),
+        Sheet("KPIs", headers=['KPI', 'Valeur'], rows=kpis_rows),
+        Sheet("Mouvements", """
+            SELECT 'Réception' as type, reference, quantite, emplacement, date_creation
+            FROM receptions
+            UNION ALL
+            SELECT 'Expédition' as type, reference, quantite, emplacement, date_creation
+            FROM expeditions
+            ORDER BY date_creation DESC
+            LIMIT 100
+        """),
+    ]
+
+
+def export_analysis_workbook(db_path, path, progress=None):
+    """Écrit l'analyse complète dans `path` ; utilisable comme tâche d'arrière-plan"""
+    conn = sqlite3.connect(db_path)
+    try:
+        sheets = analysis_sheets(conn)
+    finally:
+        conn.close()
+
+    def on_sheet(done, total):
+        if progress:
+            progress(done / total, f"{done}/{total} feuilles écrites")
+
+    with open(path, "wb") as output:
+        _, stats = write_workbook(db_path, sheets, output=output, progress=on_sheet)
+    return path, f"{stats['total_rows']:,} lignes en {stats['seconds']:.1f}s ({stats['engine']})"
+
+
+# --- Instantanés Parquet pour l'analytique -------------------------------------
+
+SNAPSHOT_DIR = Path("exports") / "snapshots"
+ROW_GROUP_SIZE = 100000
+
+# (colonne, type) ; "dict" = chaîne encodée par dictionnaire (références, emplacements...)
+PARQUET_TABLES = {
+    'stocks': ("""
+        SELECT id, reference, designation, quantite, emplacement, lot,
+               date_expiration, date_creation, date_modification
+        FROM stocks ORDER BY id
+    """, [('id', 'int'), ('reference', 'dict'), ('designation', 'str'), ('quantite', 'int'),
+          ('emplacement', 'dict'), ('lot', 'dict'), ('date_expiration', 'str'),
+          ('date_creation', 'str'), ('date_modification', 'str')]),
+    'mouvements': ("""
+        SELECT 'Réception', id, reference, quantite, NULL, emplacement, fournisseur, date_reception, date_creation
+        FROM receptions
+        UNION ALL
+        SELECT 'Expédition', id, reference, quantite, emplacement, NULL, client, date_expedition, date_creation
+        FROM expeditions
+        UNION ALL
+        SELECT 'Transfert', id, reference, quantite, emplacement_source, emplacement_destination,
+               utilisateur, date_transfert, date_transfert
+        FROM transferts
+    """, [('type', 'dict'), ('id', 'int'), ('reference', 'dict'), ('quantite', 'int'),
+          ('emplacement_source', 'dict'), ('emplacement_destination', 'dict'), ('tiers', 'dict'),
+          ('date_mouvement', 'str'), ('date_creation', 'str')]),
+}
+
+
+def _arrow_schema(pa, columns):
+    types = {'int': pa.int64(), 'str': pa.string(), 'dict': pa.dictionary(pa.int32(), pa.string())}
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def _record_batch(pa, schema, columns, rows):
+    arrays = []
+    for position, (name, kind) in enumerate(columns):
+        values = [row[position] for row in rows]
+        if kind == 'int':
+            arrays.append(pa.array(values, pa.int64()))
+        elif kind == 'dict':
+            arrays.append(pa.array([None if v is None else str(v) for v in values], pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array([None if v is None else str(v) for v in values], pa.string()))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_parquet_table(conn, query, columns, path, row_group_size=ROW_GROUP_SIZE, compression="zstd"):
+    """Écrit le résultat d'une requête en Parquet, un groupe de lignes par paquet lu"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(pa, columns)
+    dictionary_columns = [name for name, kind in columns if kind == 'dict']
+    rows_written = 0
+    cursor = conn.execute(query)
+    with pq.ParquetWriter(str(path), schema, compression=compression,
+                          use_dictionary=dictionary_columns) as writer:
+        while True:
+            rows = cursor.fetchmany(row_group_size)
+            if not rows:
+                break
+            writer.write_batch(_record_batch(pa, schema, columns, rows), row_group_size=row_group_size)
+            rows_written += len(rows)
+    return rows_written
+
+
+def write_parquet_snapshot(db_path, output_dir=SNAPSHOT_DIR, row_group_size=ROW_GROUP_SIZE,
+                           compression="zstd"):
+    """Écrit un instantané stocks / mouvements / KPIs en Parquet dans un nouveau dossier daté.
+
+    Retourne (dossier, manifeste). Le manifeste (manifest.json) liste les fichiers,
+    leur nombre de lignes et la date de l'instantané pour le rechargement BI.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    started = time.perf_counter()
+    created = datetime.now()
+    snapshot_dir = Path(output_dir) / created.strftime("%Y%m%d_%H%M%S")
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+
+    manifest = {'date_instantane': created.isoformat(timespec='seconds'), 'fichiers': {}}
+    conn = sqlite3.connect(db_path)
+    try:
+        manifest['version_schema'] = conn.execute("PRAGMA user_version").fetchone()[0]
+        for name, (query, columns) in PARQUET_TABLES.items():
+            path = snapshot_dir / f"{name}.parquet"
+            rows = write_parquet_table(conn, query, columns, path, row_group_size, compression)
+            manifest['fichiers'][path.name] = rows
+
+        kpis = wms_kpis.compute_kpis(conn)
+    finally:
+        conn.close()
+
+    kpi_table = pa.table({
+        'date_instantane': pa.array([manifest['date_instantane']] * len(kpis), pa.string()),
+        'kpi': pa.array(list(kpis.keys()), pa.string()).dictionary_encode(),
+        'valeur': pa.array([float(v) for v in kpis.values()], pa.float64()),
+    })
+    pq.write_table(kpi_table, str(snapshot_dir / "kpis.parquet"), compression=compression)
+    manifest['fichiers']['kpis.parquet'] = len(kpis)
+
+    manifest['secondes'] = round(time.perf_counter() - started, 3)
+    with open(snapshot_dir / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return snapshot_dir, manifest
@@ -0,0 +1,154 @@
+"""Prévisions de demande par référence, calculées pour toutes les références en une passe NumPy
+
+L'historique vient de `demande_journaliere` (expéditions agrégées par jour, tenue à jour par
+triggers), regroupé en semaines côté SQL. Pour chaque référence on ajuste une moyenne mobile
+et un lissage exponentiel, on garde celui qui prévoit le mieux les dernières semaines, puis
+on applique une saisonnalité mensuelle. Le résultat est mémorisé par version des expéditions.
+"""
+import calendar
+from datetime import date, timedelta
+
+import wms_cache
+from wms_lazy import LazyModule
+
+np = LazyModule("numpy")
+
+HISTORY_WEEKS = 104
+HOLDOUT_WEEKS = 8
+MA_WEEKS = 8
+SES_ALPHA = 0.2
+HORIZON_MONTHS = 12
+# Saisonnalité propre à la référence pondérée par k / (k + SEASON_PRIOR_WEEKS), k = semaines avec demande
+SEASON_PRIOR_WEEKS = 26
+MODELS = ("moyenne_mobile", "lissage_exponentiel")
+
+
+def load_weekly_history(conn, weeks=HISTORY_WEEKS, today=None):
+    """(références, matrice références × semaines, date de début de chaque semaine).
+
+    La dernière colonne est la semaine qui se termine hier. La table est lue dans l'ordre de sa
+    clé (référence, jour) et regroupée en semaines avec NumPy, sans tri côté SQL.
+    """
+    today = today or date.today()
+    start = today - timedelta(days=7 * weeks)
+    week_starts = [start + timedelta(days=7 * i) for i in range(weeks)]
+    rows = conn.execute("""
+        SELECT reference, CAST(julianday(jour) - julianday(?) AS INTEGER), quantite
+        FROM demande_journaliere
+        WHERE jour >= ? AND jour < ?
+        ORDER BY reference, jour
+    """, (start.isoformat(), start.isoformat(), today.isoformat())).fetchall()
+    if not rows:
+        return [], np.zeros((0, weeks), dtype=np.float32), week_starts
+    references = np.array([row[0] for row in rows], dtype=object)
+    days = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+    quantities = np.fromiter((row[2] for row in rows), dtype=np.float32, count=len(rows))
+    # Lignes triées par référence : un nouvel indice à chaque changement de référence
+    changed = np.empty(len(references), dtype=bool)
+    changed[0] = True
+    changed[1:] = references[1:] != references[:-1]
+    ref_index = np.cumsum(changed) - 1
+    history = np.bincount(ref_index * weeks + days // 7, weights=quantities,
+                          minlength=int(ref_index[-1] + 1) * weeks)
+    history = history.reshape(-1, weeks).astype(np.float32)
+    return references[changed].tolist(), np.maximum(history, 0), week_starts
+
+
+def moving_average(history, window=MA_WEEKS):
+    """Demande hebdomadaire moyenne des `window` dernières semaines"""
+    return history[:, -window:].mean(axis=1)
+
+
+def exponential_smoothing(history, alpha=SES_ALPHA):
+    """Niveau du lissage exponentiel simple, initialisé sur les premières semaines"""
+    level = history[:, :MA_WEEKS].mean(axis=1)
+    for week in range(history.shape[1]):
+        level = alpha * history[:, week] + (1 - alpha) * level
+    return level
+
+
+def select_models(history, holdout=HOLDOUT_WEEKS):
+    """Indice du modèle (dans MODELS) dont la prévision des `holdout` dernières semaines a l'erreur la plus faible"""
+    train, test = history[:, :-holdout], history[:, -holdout:]
+    errors = np.stack([
+        np.abs(test - moving_average(train)[:, None]).mean(axis=1),
+        np.abs(test - exponential_smoothing(train)[:, None]).mean(axis=1),
+    ])
+    return errors.argmin(axis=0)
+
+
+def seasonal_factors(history, week_starts, prior=SEASON_PRIOR_WEEKS):
+    """Facteurs mensuels (références × 12), moyenne 1 ; ramenés vers le profil global si peu d'historique"""
+    months = np.array([start.month - 1 for start in week_starts])
+    weeks_per_month = np.bincount(months, minlength=12).astype(np.float32)
+    if (weeks_per_month == 0).any():
+        # Moins d'un an d'historique : pas de saisonnalité fiable
+        return np.ones((history.shape[0], 12), dtype=np.float32)
+    # Somme par mois calendaire via une matrice d'appartenance semaines × mois
+    membership = np.zeros((len(months), 12), dtype=np.float32)
+    membership[np.arange(len(months)), months] = 1
+    monthly = (history @ membership) / weeks_per_month
+    overall = monthly.sum(axis=0)
+    global_factors = overall / overall.mean() if overall.mean() > 0 else np.ones(12, dtype=np.float32)
+    mean = monthly.mean(axis=1, keepdims=True)
+    own = np.divide(monthly, mean, out=np.tile(global_factors, (len(monthly), 1)), where=mean > 0)
+    weight = ((history > 0).sum(axis=1) / ((history > 0).sum(axis=1) + prior))[:, None]
+    return weight * own + (1 - weight) * global_factors
+
+
+def forecast(history, week_starts, today=None, months=HORIZON_MONTHS):
+    """Prévision mensuelle (références × mois) pour les `months` mois suivant le mois courant"""
+    today = today or date.today()
+    choice = select_models(history)
+    weekly_rate = np.where(choice == 0, moving_average(history), exponential_smoothing(history))
+    factors = seasonal_factors(history, week_starts)
+    periods, month_index, month_weeks = [], [], []
+    year, month = today.year, today.month
+    for _ in range(months):
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        periods.append(f"{year}-{month:02d}")
+        month_index.append(month - 1)
+        month_weeks.append(calendar.monthrange(year, month)[1] / 7)
+    monthly = weekly_rate[:, None] * np.array(month_weeks, dtype=np.float32) * factors[:, month_index]
+    return {
+        'mois': periods,
+        'prevision': monthly,
+        'taux_journalier': weekly_rate / 7,
+        'modele': choice,
+    }
+
+
+def build_forecasts(conn, today=None):
+    """Prévisions de toutes les références ayant un historique d'expéditions"""
+    today = today or date.today()
+    references, history, week_starts = load_weekly_history(conn, today=today)
+    result = forecast(history, week_starts, today)
+    result.update(references=references, date_calcul=today.isoformat())
+    return result
+
+
+def get_forecasts(db_path, today=None):
+    """Prévisions mémorisées, recalculées après une écriture sur les expéditions ou un changement de jour"""
+    today = today or date.today()
+    name = "previsions"
+    result = wms_cache.cached(db_path, name, ("expeditions",), lambda conn: build_forecasts(conn, today))
+    if result['date_calcul'] != today.isoformat():
+        wms_cache.invalidate(db_path, name)
+        result = wms_cache.cached(db_path, name, ("expeditions",), lambda conn: build_forecasts(conn, today))
+    return result
+
+
+def stock_projection(conn, forecasts):
+    """Projection agrégée mois par mois : (stock restant, consommation prévue).
+
+    Le stock de chaque référence est consommé par sa propre prévision et ne descend pas sous zéro.
+    """
+    stock = dict(conn.execute(
+        "SELECT reference, SUM(quantite) FROM stocks WHERE quantite > 0 GROUP BY reference"
+    ).fetchall())
+    demand = forecasts['prevision']
+    on_hand = np.array([stock.pop(ref, 0) for ref in forecasts['references']], dtype=np.float64)
+    # Références en stock sans historique de demande : stock constant
+    idle = float(sum(stock.values()))
+    remaining = np.maximum(on_hand[:, None] - np.cumsum(demand, axis=1), 0).sum(axis=0) + idle
+    return remaining.tolist(), demand.sum(axis=0).tolist()
@@ -0,0 +1,94 @@
+"""Plan de chaleur de l'entrepôt : occupation et fréquence de sortie par emplacement
+
+Chaque emplacement (table emplacements, plan importé ou code vu en stock) est placé sur une
+grille rangée (zone + allée) × travée × niveau grâce à wms_layout. Quantités, capacités et
+sorties (agrégat mouvements_emplacements) sont cumulées par cellule en une passe NumPy
+(np.add.at) ; l'interface affiche une seule trace Heatmap, quel que soit le nombre
+d'emplacements. La grille est mémorisée jusqu'à la prochaine écriture sur les tables sources.
+"""
+import wms_cache
+import wms_layout
+from wms_lazy import LazyModule
+
+np = LazyModule("numpy")
+
+METRICS = ("Quantité stockée", "Taux d'occupation (%)", "Sorties", "Emplacements occupés (%)")
+SOURCE_TABLES = ("stocks", "emplacements", "plan_emplacements", "expeditions", "transferts")
+
+
+def load_bins(conn):
+    """Emplacements connus : [(code, zone, capacité, quantité en stock, sorties)]"""
+    return conn.execute("""
+        WITH codes AS (
+            SELECT code FROM emplacements
+            UNION SELECT code FROM plan_emplacements
+            UNION SELECT emplacement FROM stocks WHERE quantite > 0
+        ),
+        stock AS (SELECT emplacement, SUM(quantite) AS quantite FROM stocks WHERE quantite > 0 GROUP BY emplacement)
+        SELECT c.code, e.zone, e.capacite_max, COALESCE(s.quantite, 0), COALESCE(m.mouvements, 0)
+        FROM codes c
+        LEFT JOIN emplacements e ON e.code = c.code
+        LEFT JOIN stock s ON s.emplacement = c.code
+        LEFT JOIN mouvements_emplacements m ON m.emplacement = c.code AND m.sens = 'Sortie'
+    """).fetchall()
+
+
+def build_grid(conn):
+    """Grille agrégée : libellés des rangées, travées, niveaux et cubes (niveau, rangée, travée)"""
+    rows = load_bins(conn)
+    if not rows:
+        return None
+    codes, zones, capacities, quantities, exits = zip(*rows)
+    located = wms_layout.locate(codes, zones, wms_layout.load_plan(conn))
+    row_keys = sorted({(wms_layout.zone_index(zone), zone, aisle) for zone, aisle, _, _ in located})
+    row_index = {(zone, aisle): i for i, (_, zone, aisle) in enumerate(row_keys)}
+    rows_idx = np.array([row_index[(zone, aisle)] for zone, aisle, _, _ in located])
+    bays = np.array([bay for _, _, bay, _ in located])
+    levels = np.array([level for _, _, _, level in located])
+    bay_values, bay_idx = np.unique(bays, return_inverse=True)
+    level_values, level_idx = np.unique(levels, return_inverse=True)
+    shape = (len(level_values), len(row_keys), len(bay_values))
+    cells = (level_idx, rows_idx, bay_idx)
+
+    def cube(values):
+        grid = np.zeros(shape)
+        np.add.at(grid, cells, values)
+        return grid
+
+    quantity = np.array(quantities, dtype=np.float64)
+    capacity = np.array([c or 0 for c in capacities], dtype=np.float64)
+    return {
+        'rangees': [f"{zone}{aisle}" for _, zone, aisle in row_keys],
+        'travees': bay_values.tolist(),
+        'niveaux': level_values.tolist(),
+        'emplacements': cube(1.0),
+        'occupes': cube((quantity > 0).astype(np.float64)),
+        'quantite': cube(quantity),
+        # Taux d'occupation calculé sur les seuls emplacements de capacité connue
+        'quantite_capacite': cube(np.where(capacity > 0, quantity, 0.0)),
+        'capacite': cube(capacity),
+        'sorties': cube(np.array(exits, dtype=np.float64)),
+    }
+
+
+def get_grid(db_path):
+    """Grille mémorisée jusqu'à la prochaine écriture sur les tables sources"""
+    return wms_cache.cached(db_path, "plan_entrepot", SOURCE_TABLES, build_grid)
+
+
+def metric_layer(grid, metric, level=None):
+    """Matrice (rangées × travées) de l'indicateur, pour un niveau ou tous ; NaN hors emplacements"""
+    select = (lambda cube: cube.sum(axis=0)) if level is None else \
+        (lambda cube: cube[grid['niveaux'].index(level)])
+    bins = select(grid['emplacements'])
+    if metric == "Quantité stockée":
+        layer = select(grid['quantite'])
+    elif metric == "Sorties":
+        layer = select(grid['sorties'])
+    elif metric == "Emplacements occupés (%)":
+        layer = np.divide(select(grid['occupes']) * 100, bins, out=np.zeros_like(bins), where=bins > 0)
+    else:
+        capacity = select(grid['capacite'])
+        layer = np.divide(select(grid['quantite_capacite']) * 100, capacity,
+                          out=np.full_like(capacity, np.nan), where=capacity > 0)
+    return np.where(bins > 0, layer, np.nan), bins
@@ -0,0 +1,220 @@
+"""Index en mémoire des références et emplacements pour la recherche à la frappe (typeahead)
+
+Chaque index combine un tableau trié (recherche par préfixe en O(log n) + N) et un
+trie de profondeur limitée qui donne le nombre de correspondances et les caractères
+suivants possibles. Les index sont partagés par le processus et rejouent le journal
+`journal_cles` (alimenté par triggers) au lieu de relire les tables.
+"""
+import sqlite3
+import threading
+from bisect import bisect_left, insort
+
+from wms_database import INDEXED_KEYS
+
+# Profondeur du trie : au-delà, le tableau trié suffit (peu de correspondances restantes)
+TRIE_DEPTH = 4
+DEFAULT_LIMIT = 20
+# Lignes de journal conservées ; un index plus en retard est rechargé entièrement
+JOURNAL_KEEP = 100000
+# Au-delà de ce retard, un rechargement complet coûte moins que le rejeu ligne à ligne
+REPLAY_MAX = 50000
+
+_MAX_CHAR = "\U0010ffff"
+
+
+def _fold(key):
+    return key.casefold()
+
+
+class KeyIndex:
+    """Ensemble de clés avec multiplicité, interrogeable par préfixe (insensible à la casse)"""
+
+    def __init__(self, trie_depth=TRIE_DEPTH):
+        self.trie_depth = trie_depth
+        self._counts = {}
+        self._sorted = []
+        self._trie = [0, {}]
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def __contains__(self, key):
+        return key in self._counts
+
+    def load(self, counts):
+        """Reconstruit l'index à partir de paires (clé, nombre de lignes)"""
+        self._counts = {str(key): count for key, count in counts if key is not None and count > 0}
+        self._sorted = sorted((_fold(key), key) for key in self._counts)
+        self._trie = [0, {}]
+        for folded, _ in self._sorted:
+            self._trie_add(folded, 1)
+
+    def _trie_add(self, folded, delta):
+        node = self._trie
+        node[0] += delta
+        for char in folded[:self.trie_depth]:
+            child = node[1].get(char)
+            if child is None:
+                child = node[1][char] = [0, {}]
+            child[0] += delta
+            if child[0] == 0:
+                del node[1][char]
+                return
+            node = child
+
+    def apply(self, key, delta):
+        """Ajoute (delta > 0) ou retire (delta < 0) des occurrences d'une clé"""
+        key = str(key)
+        before = self._counts.get(key, 0)
+        after = before + delta
+        if after > 0:
+            self._counts[key] = after
+        else:
+            self._counts.pop(key, None)
+        entry = (_fold(key), key)
+        if before <= 0 < after:
+            insort(self._sorted, entry)
+            self._trie_add(entry[0], 1)
+        elif after <= 0 < before:
+            position = bisect_left(self._sorted, entry)
+            if position < len(self._sorted) and self._sorted[position] == entry:
+                del self._sorted[position]
+            self._trie_add(entry[0], -1)
+
+    def _range(self, prefix):
+        folded = _fold(prefix)
+        low = bisect_left(self._sorted, (folded,))
+        high = bisect_left(self._sorted, (folded + _MAX_CHAR,), low)
+        return low, high
+
+    def search(self, prefix="", limit=DEFAULT_LIMIT):
+        """Les `limit` premières clés (ordre alphabétique) commençant par `prefix`"""
+        low, high = self._range(prefix)
+        return [key for _, key in self._sorted[low:min(high, low + limit)]]
+
+    def count(self, prefix=""):
+        """Nombre de clés commençant par `prefix`"""
+        folded = _fold(prefix)
+        if len(folded) <= self.trie_depth:
+            node = self._trie
+            for char in folded:
+                node = node[1].get(char)
+                if node is None:
+                    return 0
+            return node[0]
+        low, high = self._range(prefix)
+        return high - low
+
+    def next_chars(self, prefix=""):
+        """Caractères pouvant suivre `prefix` (avec leur nombre de clés), pour guider la saisie"""
+        folded = _fold(prefix)
+        if len(folded) < self.trie_depth:
+            node = self._trie
+            for char in folded:
+                node = node[1].get(char)
+                if node is None:
+                    return []
+            return sorted((char, child[0]) for char, child in node[1].items())
+        low, high = self._range(prefix)
+        following = {}
+        for key_folded, _ in self._sorted[low:high]:
+            if len(key_folded) > len(folded):
+                char = key_folded[len(folded)]
+                following[char] = following.get(char, 0) + 1
+        return sorted(following.items())
+
+    def keys(self):
+        """Toutes les clés, triées"""
+        return [key for _, key in self._sorted]
+
+
+class WarehouseIndex:
+    """Index des références et emplacements d'une base, synchronisé sur journal_cles"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.indexes = {name: KeyIndex() for name, _, _ in INDEXED_KEYS}
+        # Dernière ligne du journal prise en compte : la version de l'index
+        self.version = None
+        self._lock = threading.Lock()
+
+    def _reload(self, conn):
+        conn.execute("BEGIN")
+        try:
+            version = conn.execute("SELECT COALESCE(MAX(id), 0) FROM journal_cles").fetchone()[0]
+            counts = {name: {} for name in self.indexes}
+            for name, table, column in INDEXED_KEYS:
+                for key, count in conn.execute(
+                        f"SELECT {column}, COUNT(*) FROM {table} WHERE {column} IS NOT NULL GROUP BY {column}"):
+                    counts[name][key] = counts[name].get(key, 0) + count
+        finally:
+            conn.rollback()
+        for name, index in self.indexes.items():
+            index.load(counts[name].items())
+        self.version = version
+
+    def refresh(self, conn):
+        """Rejoue les entrées du journal postérieures à la version de l'index.
+
+        Retourne le nombre d'entrées appliquées (-1 en cas de rechargement complet).
+        """
+        latest, oldest = conn.execute(
+            "SELECT COALESCE(MAX(id), 0), COALESCE(MIN(id), 0) FROM journal_cles"
+        ).fetchone()
+        with self._lock:
+            if self.version == latest:
+                return 0
+            # Pas encore chargé, trop en retard, journal purgé ou base restaurée : rechargement
+            if (self.version is None or latest < self.version or latest - self.version > REPLAY_MAX
+                    or self.version < oldest - 1):
+                self._reload(conn)
+                applied = -1
+            else:
+                rows = conn.execute(
+                    "SELECT id, nom_index, cle, delta FROM journal_cles WHERE id > ? ORDER BY id",
+                    (self.version,)
+                ).fetchall()
+                for entry_id, name, key, delta in rows:
+                    self.indexes[name].apply(key, delta)
+                    self.version = entry_id
+                applied = len(rows)
+        if latest > JOURNAL_KEEP and oldest <= latest - JOURNAL_KEEP:
+            conn.execute("DELETE FROM journal_cles WHERE id <= ?", (latest - JOURNAL_KEEP,))
+            conn.commit()
+        return applied
+
+    def typeahead(self, name, prefix="", limit=DEFAULT_LIMIT):
+        """(correspondances, nombre total) pour `prefix` dans l'index `name`"""
+        index = self.indexes[name]
+        with self._lock:
+            return index.search(prefix, limit), index.count(prefix)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(db_path, refresh=True):
+    """Index du processus pour la base donnée, mis à jour depuis le journal"""
+    with _indexes_lock:
+        index = _indexes.get(db_path)
+        if index is None:
+            index = _indexes[db_path] = WarehouseIndex(db_path)
+    if refresh:
+        conn = sqlite3.connect(db_path)
+        try:
+            index.refresh(conn)
+        finally:
+            conn.close()
+    return index
+
+
+def typeahead(db_path, name, prefix="", limit=DEFAULT_LIMIT):
+    """Recherche à la frappe : les `limit` premières clés de `name` commençant par `prefix`"""
+    return get_index(db_path).typeahead(name, prefix, limit)
+
+
+def invalidate(db_path):
+    """Force un rechargement complet (après restauration d'une sauvegarde)"""
+    with _indexes_lock:
+        _indexes.pop(db_path, None)
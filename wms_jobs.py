@@ -0,0 +1,134 @@
+"""Exécution en arrière-plan des exports, rapports et imports longs (suivi dans la table jobs)"""
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+JOBS_DIR = Path("exports") / "jobs"
+MAX_WORKERS = 2
+# Intervalle minimal entre deux écritures de progression en base
+PROGRESS_INTERVAL = 0.5
+
+STATUS_PENDING = "En attente"
+STATUS_RUNNING = "En cours"
+STATUS_DONE = "Terminé"
+STATUS_FAILED = "Échec"
+
+_runners = {}
+_runners_lock = threading.Lock()
+
+
+def _now():
+    """Horodatage UTC, comme CURRENT_TIMESTAMP de SQLite"""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+
+
+def artifact_path(filename):
+    """Chemin d'un fichier produit par une tâche (dossier créé au besoin)"""
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    return JOBS_DIR / filename
+
+
+class JobRunner:
+    """Pool de threads partagé par toutes les sessions Streamlit du processus"""
+
+    def __init__(self, db_path, max_workers=MAX_WORKERS):
+        self.db_path = db_path
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="wms-job")
+        self._recover_interrupted()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _update(self, job_id, **fields):
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        conn = self._connect()
+        conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+        conn.commit()
+        conn.close()
+
+    def _recover_interrupted(self):
+        """Les tâches en cours lors d'un arrêt du serveur ne reprendront pas"""
+        conn = self._connect()
+        conn.execute("""
+            UPDATE jobs SET statut = ?, message = 'Interrompue par un redémarrage', date_fin = CURRENT_TIMESTAMP
+            WHERE statut IN (?, ?)
+        """, (STATUS_FAILED, STATUS_PENDING, STATUS_RUNNING))
+        conn.commit()
+        conn.close()
+
+    def submit(self, job_type, libelle, func, *args, **kwargs):
+        """Enregistre la tâche puis l'exécute dans le pool.
+
+        `func(progress, *args, **kwargs)` reçoit un rappel `progress(fraction, message=None)`
+        et retourne le chemin du fichier produit (ou None) et un message de fin.
+        """
+        conn = self._connect()
+        cursor = conn.execute(
+            "INSERT INTO jobs (type, libelle, statut) VALUES (?, ?, ?)",
+            (job_type, libelle, STATUS_PENDING)
+        )
+        job_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        self.pool.submit(self._run, job_id, func, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, func, args, kwargs):
+        self._update(job_id, statut=STATUS_RUNNING, date_debut=_now())
+        last_write = [0.0]
+
+        def progress(fraction, message=None):
+            now = time.monotonic()
+            if now - last_write[0] < PROGRESS_INTERVAL and fraction < 1:
+                return
+            last_write[0] = now
+            fields = {'progression': max(0.0, min(float(fraction), 1.0))}
+            if message:
+                fields['message'] = message
+            self._update(job_id, **fields)
+
+        try:
+            fichier, message = func(progress, *args, **kwargs)
+            self._update(job_id, statut=STATUS_DONE, progression=1.0, message=message,
+                         fichier=str(fichier) if fichier else None, date_fin=_now())
+        except Exception as e:
+            self._update(job_id, statut=STATUS_FAILED, message=str(e),
+                         date_fin=_now())
+
+    def get_jobs(self, job_ids):
+        """Etat des tâches demandées, de la plus récente à la plus ancienne"""
+        if not job_ids:
+            return []
+        placeholders = ", ".join("?" for _ in job_ids)
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(f"""
+            SELECT id, type, libelle, statut, progression, message, fichier, date_creation, date_fin
+            FROM jobs WHERE id IN ({placeholders}) ORDER BY id DESC
+        """, tuple(job_ids)).fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+    def finished_artifacts(self, limit=20):
+        """Derniers fichiers produits encore présents sur le disque"""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute("""
+            SELECT id, libelle, fichier, date_fin FROM jobs
+            WHERE statut = ? AND fichier IS NOT NULL
+            ORDER BY id DESC LIMIT ?
+        """, (STATUS_DONE, limit)).fetchall()
+        conn.close()
+        return [dict(row) for row in rows if Path(row['fichier']).exists()]
+
+
+def get_runner(db_path):
+    """Retourne le pool de tâches du processus (conservé entre les reruns Streamlit)"""
+    with _runners_lock:
+        runner = _runners.get(db_path)
+        if runner is None:
+            runner = JobRunner(db_path)
+            _runners[db_path] = runner
+        return runner
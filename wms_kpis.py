@@ -0,0 +1,38 @@
+"""Calcul des KPIs d'inventaire directement en SQL, sans dépendance à l'interface"""
+
+EXPIRY_HORIZON_DAYS = 90
+
+
+def compute_kpis(conn, horizon_days=EXPIRY_HORIZON_DAYS):
+    """Retourne les KPIs principaux calculés en une seule passe sur la table stocks"""
+    row = conn.execute("""
+        SELECT
+            COALESCE(SUM(CASE WHEN quantite > 0 THEN quantite END), 0),
+            COUNT(DISTINCT CASE WHEN quantite > 0 THEN reference END),
+            COUNT(DISTINCT reference),
+            COUNT(DISTINCT CASE WHEN quantite = 0 THEN reference END),
+            COUNT(DISTINCT CASE WHEN quantite > 0 THEN COALESCE(lot, 'ID-' || id) END),
+            COUNT(DISTINCT CASE WHEN quantite > 0 AND date_expiration IS NOT NULL
+                                 AND date_expiration <= date('now', ?)
+                                THEN COALESCE(lot, 'ID-' || id) END)
+        FROM stocks
+    """, (f"+{int(horizon_days)} days",)).fetchone()
+    stock_total, active_refs, all_refs, stockout_refs, lots, expiring_lots = row
+    return {
+        'stock_total': stock_total,
+        'references_actives': active_refs,
+        'lots': lots,
+        'lots_expiration_proche': expiring_lots,
+        'pourcentage_expiration': (expiring_lots / lots * 100) if lots else 0.0,
+        'taux_rupture': (stockout_refs / all_refs * 100) if all_refs else 0.0,
+    }
+
+
+KPI_LABELS = {
+    'stock_total': 'Stock Total',
+    'references_actives': 'Références Actives',
+    'lots': 'Lots Distincts',
+    'lots_expiration_proche': f'Lots < {EXPIRY_HORIZON_DAYS}j',
+    'pourcentage_expiration': '% Stock Expiré',
+    'taux_rupture': 'Taux de Rupture (%)',
+}
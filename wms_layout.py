@@ -0,0 +1,98 @@
+"""Géométrie de l'entrepôt déduite des codes d'emplacement
+
+Un code se lit zone (lettres), allée, travée et niveau, séparés ou non par des tirets :
+"A1-01" = zone A, allée 1, travée 1 ; "B12-03-2" = zone B, allée 12, travée 3, niveau 2.
+La zone de la table emplacements, si elle existe, prime sur les lettres du code ; un plan
+importé (table plan_emplacements, fichier CSV/Excel) prime sur les deux. Le quai
+d'expédition est à l'origine : le coût d'accès d'un emplacement est la distance de Manhattan
+jusqu'au quai, plus une pénalité par niveau au-dessus du sol.
+"""
+import io
+import re
+
+from wms_lazy import LazyModule
+
+np = LazyModule("numpy")
+
+LOCATION_PATTERN = re.compile(r"^\s*([A-Za-z]*)[\s_-]*(\d*)[\s_-]*(\d*)[\s_-]*(\d*)")
+# Distances en mètres entre zones, allées et travées, pénalité (mètres équivalents) par niveau
+ZONE_WIDTH = 40.0
+AISLE_WIDTH = 3.0
+BAY_DEPTH = 1.2
+LEVEL_PENALTY = 4.0
+LAYOUT_COLUMNS = ['code', 'zone', 'allee', 'travee', 'niveau']
+
+
+def parse_location(code, zone=None):
+    """(zone, allée, travée, niveau) d'un code d'emplacement ; valeurs absentes à 0"""
+    match = LOCATION_PATTERN.match(code or "")
+    letters, aisle, bay, level = match.groups()
+    return ((zone or letters or "").upper(), int(aisle or 0), int(bay or 0), int(level or 0))
+
+
+def zone_index(zone):
+    """Rang d'une zone à partir de ses lettres (A = 0, B = 1, ..., AA = 26)"""
+    index = 0
+    for char in zone:
+        index = index * 26 + (ord(char) - ord("A") + 1)
+    return max(index - 1, 0)
+
+
+def load_plan(conn):
+    """Plan importé : {code: (zone, allée, travée, niveau)}"""
+    return {code: (zone.upper(), aisle, bay, level) for code, zone, aisle, bay, level in conn.execute(
+        "SELECT code, zone, allee, travee, niveau FROM plan_emplacements")}
+
+
+def locate(codes, zones=None, plan=None):
+    """(zone, allée, travée, niveau) de chaque code : plan importé, sinon lecture du code"""
+    zones = zones if zones is not None else [None] * len(codes)
+    plan = plan or {}
+    return [plan.get(code) or parse_location(code, zone) for code, zone in zip(codes, zones)]
+
+
+def read_layout_file(data, filename):
+    """Lignes [(code, zone, allée, travée, niveau)] d'un fichier de plan CSV/Excel"""
+    import pandas as pd
+
+    buffer = io.BytesIO(data)
+    df = pd.read_csv(buffer) if filename.endswith('.csv') else pd.read_excel(buffer)
+    missing = [column for column in LAYOUT_COLUMNS[:4] if column not in df.columns]
+    if missing:
+        raise ValueError(f"Colonnes manquantes: {', '.join(missing)}")
+    df = df.reindex(columns=LAYOUT_COLUMNS)
+    df['niveau'] = df['niveau'].fillna(0)
+    df = df.dropna(subset=['code'])
+    return [(str(code).strip(), str(zone).strip().upper(), int(aisle), int(bay), int(level))
+            for code, zone, aisle, bay, level in df.itertuples(index=False, name=None)]
+
+
+def save_plan(conn, rows, replace=False):
+    """Enregistre un plan (remplace tout le plan si `replace`) ; retourne le nombre d'emplacements"""
+    if replace:
+        conn.execute("DELETE FROM plan_emplacements")
+    conn.executemany("""
+        INSERT INTO plan_emplacements (code, zone, allee, travee, niveau) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (code) DO UPDATE SET zone = excluded.zone, allee = excluded.allee,
+            travee = excluded.travee, niveau = excluded.niveau
+    """, rows)
+    conn.commit()
+    return len(rows)
+
+
+def location_coordinates(codes, zones=None, plan=None):
+    """Coordonnées (x, y, niveau) de chaque code, en vecteurs NumPy alignés sur `codes`"""
+    parsed = locate(codes, zones, plan)
+    if not parsed:
+        return np.zeros(0), np.zeros(0), np.zeros(0)
+    zone_col, aisle, bay, level = zip(*parsed)
+    x = np.array([zone_index(zone) for zone in zone_col], dtype=np.float64) * ZONE_WIDTH \
+        + np.array(aisle, dtype=np.float64) * AISLE_WIDTH
+    y = np.array(bay, dtype=np.float64) * BAY_DEPTH
+    return x, y, np.array(level, dtype=np.float64)
+
+
+def travel_cost(codes, zones=None, plan=None):
+    """Coût d'accès depuis le quai pour chaque code (plus faible = plus accessible)"""
+    x, y, level = location_coordinates(codes, zones, plan)
+    return x + y + level * LEVEL_PENALTY
@@ -0,0 +1,42 @@
+"""Imports différés des modules lourds (pandas, plotly) et mesure de leur coût de chargement"""
+import importlib
+import sys
+import time
+
+# Nom du module -> secondes passées à l'importer (0 s'il était déjà chargé par un autre module)
+IMPORT_TIMES = {}
+
+
+def timed_import(name):
+    """Importe `name` et note le temps de chargement dans IMPORT_TIMES"""
+    already_loaded = name in sys.modules
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    if name not in IMPORT_TIMES:
+        IMPORT_TIMES[name] = 0.0 if already_loaded else time.perf_counter() - started
+    return module
+
+
+class LazyModule:
+    """Module chargé au premier accès à l'un de ses attributs.
+
+    `px = LazyModule("plotly.express")` s'utilise comme l'import direct, mais plotly
+    n'est chargé que lorsqu'une page dessine réellement un graphique.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = timed_import(self._name)
+        return getattr(self._module, attr)
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __repr__(self):
+        state = "chargé" if self.loaded else "différé"
+        return f"<LazyModule {self._name} ({state})>"
@@ -0,0 +1,100 @@
+"""Analyse des mouvements (réceptions, expéditions, transferts) à partir des agrégats écrits
+
+`mouvements_jour`, `mouvements_emplacements` et `mouvements_utilisateurs` sont tenus à jour
+par triggers à chaque écriture (voir wms_database) : les graphiques lisent au plus quelques
+centaines de lignes indexées, quelle que soit la profondeur de l'historique. Seuls les
+derniers transferts et la recherche dans l'historique lisent la table transferts (par index).
+"""
+from datetime import date, timedelta
+
+from wms_database import MOVEMENT_SOURCES
+
+MOVEMENT_TYPES = tuple(movement_type for _, _, movement_type in MOVEMENT_SOURCES)
+# Regroupement -> expression SQL du début de période à partir du jour
+GRANULARITIES = {
+    "Jour": "jour",
+    "Semaine": "date(jour, 'weekday 0', '-6 days')",
+}
+DIRECTIONS = ("Sortie", "Entrée")
+TOP_LOCATIONS = 10
+RECENT_TRANSFERS = 10
+HISTORY_LIMIT = 500
+
+
+def _since(days, today=None):
+    today = today or date.today()
+    return (today - timedelta(days=days - 1)).isoformat()
+
+
+def movement_series(conn, days=90, granularity="Jour", today=None):
+    """Mouvements et unités par période et par type : [(période, type, mouvements, unités)]"""
+    period = GRANULARITIES[granularity]
+    return conn.execute(f"""
+        SELECT {period} AS periode, type, SUM(mouvements), SUM(unites)
+        FROM mouvements_jour WHERE jour >= ?
+        GROUP BY periode, type HAVING SUM(mouvements) > 0
+        ORDER BY periode, type
+    """, (_since(days, today),)).fetchall()
+
+
+def movement_totals(conn, days=90, today=None):
+    """Totaux par type sur la période : {type: (mouvements, unités)}"""
+    totals = {movement_type: (0, 0) for movement_type in MOVEMENT_TYPES}
+    totals.update({movement_type: (count, units) for movement_type, count, units in conn.execute(
+        "SELECT type, SUM(mouvements), SUM(unites) FROM mouvements_jour WHERE jour >= ? GROUP BY type",
+        (_since(days, today),))})
+    return totals
+
+
+def top_locations(conn, direction, limit=TOP_LOCATIONS):
+    """Emplacements les plus sollicités en sortie ou en entrée : [(emplacement, mouvements, unités)]"""
+    return conn.execute("""
+        SELECT emplacement, mouvements, unites FROM mouvements_emplacements
+        WHERE sens = ? AND mouvements > 0
+        ORDER BY mouvements DESC LIMIT ?
+    """, (direction, int(limit))).fetchall()
+
+
+def user_activity(conn, months=3, today=None):
+    """Transferts par utilisateur et par motif sur les derniers mois : [(utilisateur, motif, mouvements, unités)]"""
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - (months - 1)
+    return conn.execute("""
+        SELECT utilisateur, motif, SUM(mouvements), SUM(unites)
+        FROM mouvements_utilisateurs WHERE mois >= ?
+        GROUP BY utilisateur, motif HAVING SUM(mouvements) > 0
+        ORDER BY utilisateur, motif
+    """, (f"{index // 12}-{index % 12 + 1:02d}",)).fetchall()
+
+
+def recent_transfers(conn, limit=RECENT_TRANSFERS):
+    """Derniers transferts : [(date, référence, quantité, source, destination, utilisateur)]"""
+    return conn.execute("""
+        SELECT date_transfert, reference, quantite, emplacement_source, emplacement_destination, utilisateur
+        FROM transferts ORDER BY id DESC LIMIT ?
+    """, (int(limit),)).fetchall()
+
+
+def transfer_history(conn, reference=None, utilisateur=None, days=None, limit=HISTORY_LIMIT, today=None):
+    """Transferts filtrés, les plus récents d'abord (au plus `limit` lignes)"""
+    clauses, params = [], []
+    if reference:
+        clauses.append("reference = ?")
+        params.append(reference)
+    if utilisateur:
+        clauses.append("utilisateur = ?")
+        params.append(utilisateur)
+    if days:
+        clauses.append("date_transfert >= ?")
+        params.append(_since(days, today))
+    where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+    return conn.execute(f"""
+        SELECT date_transfert, reference, quantite, emplacement_source, emplacement_destination, motif, utilisateur
+        FROM transferts{where} ORDER BY date_transfert DESC, id DESC LIMIT ?
+    """, params + [int(limit)]).fetchall()
+
+
+def transfer_users(conn):
+    """Utilisateurs ayant effectué des transferts (agrégats)"""
+    return [row[0] for row in conn.execute(
+        "SELECT DISTINCT utilisateur FROM mouvements_utilisateurs WHERE mouvements > 0 ORDER BY utilisateur")]
@@ -0,0 +1,244 @@
+"""Moteur de rendu PDF : graphiques du Reporting en images mises en cache et tableaux paginés en flux"""
+import hashlib
+import os
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+import wms_cache
+
+CHART_CACHE_DIR = Path("exports") / "cache" / "graphiques"
+CHART_DPI = 120
+CHART_SIZE = (7.2, 3.2)
+# Une image inutilisée depuis ce délai est purgée (prune_chart_cache) : bien au-delà de la durée
+# d'une génération de rapport, qui lit ses images entre chart_images et build_document
+CHART_CACHE_MAX_AGE = 24 * 3600
+# Tables dont les versions (versions_donnees) déterminent celle des images en cache ; les
+# graphiques par mois glissent aussi avec le mois courant
+VERSION_TABLES = ("stocks", "receptions", "expeditions", "transferts")
+
+# Lignes par tableau : un tableau tient sur une page, reportlab n'a jamais à découper de gros tableau
+TABLE_ROWS_PER_PAGE = 45
+TABLE_FETCH_SIZE = 2000
+PAGE_MARGIN = 36
+
+STOCK_HEADERS = ['Référence', 'Désignation', 'Quantité', 'Emplacement', 'Lot', 'Date Expiration']
+STOCK_COL_WIDTHS = [80, 160, 55, 75, 75, 78]
+DESIGNATION_MAX_CHARS = 38
+
+# (nom, titre, type, requête, libellé x, libellé y) des graphiques de la page Reporting
+CHARTS = (
+    ("top_references", "Top 10 Références par Stock", "bar", """
+        SELECT reference, SUM(quantite) as total_stock
+        FROM stocks WHERE quantite > 0
+        GROUP BY reference ORDER BY total_stock DESC LIMIT 10
+    """, "Référence", "Stock Total"),
+    ("expiration", "Stock par Mois d'Expiration (12 mois)", "line", """
+        SELECT substr(date_expiration, 1, 7) as mois, SUM(quantite)
+        FROM stocks
+        WHERE quantite > 0
+          AND date_expiration >= date('now', 'start of month')
+          AND date_expiration < date('now', 'start of month', '+12 months')
+        GROUP BY mois ORDER BY mois
+    """, "Mois", "Stock"),
+    ("mouvements", "Mouvements par Mois", "bar", """
+        SELECT mois, SUM(lignes) FROM agregats_mensuels
+        WHERE lignes > 0 AND mois >= strftime('%Y-%m', 'now', 'start of month', '-11 months')
+        GROUP BY mois ORDER BY mois
+    """, "Mois", "Lignes"),
+)
+
+
+def data_version(conn, today=None):
+    """Empreinte courte des versions des tables de stock et de mouvements et du mois courant
+
+    Toute écriture (y compris une date d'expiration modifiée) incrémente la version de sa
+    table ; le changement de mois décale les fenêtres des graphiques d'expiration et de mouvements.
+    """
+    month = (today or date.today()).strftime("%Y-%m")
+    versions = wms_cache.table_versions(conn, VERSION_TABLES)
+    return hashlib.sha1(repr((month, versions)).encode()).hexdigest()[:12]
+
+
+def _render_chart(path, title, kind, rows, xlabel, ylabel):
+    # Figure et canevas Agg propres à l'appel, sans l'état global de pyplot : les rapports sont
+    # rendus en parallèle par le pool de tâches et le planificateur
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    labels = [str(label) for label, _ in rows]
+    values = [value or 0 for _, value in rows]
+    fig = Figure(figsize=CHART_SIZE, dpi=CHART_DPI)
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    if kind == "line":
+        ax.plot(labels, values, marker="o", color="#007bff")
+    else:
+        ax.bar(labels, values, color="#007bff")
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.tick_params(axis="x", labelrotation=45, labelsize=8)
+    ax.grid(axis="y", alpha=0.3)
+    fig.tight_layout()
+    # Écriture atomique dans un fichier temporaire propre à l'appel (rapports générés en
+    # parallèle) : une image partielle ne doit jamais être servie depuis le cache
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f"{path.stem}_", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            fig.savefig(tmp_file, format="png")
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+def chart_images(conn, cache_dir=CHART_CACHE_DIR):
+    """[(titre, chemin PNG)] des graphiques, rendus une seule fois par version des données.
+
+    Retourne une liste vide si matplotlib n'est pas installé. Les agrégats mensuels
+    doivent être à jour (wms_reports.refresh_monthly_aggregates) avant l'appel. Les images
+    des versions précédentes ne sont pas supprimées ici (un autre rapport peut les lire) :
+    voir prune_chart_cache.
+    """
+    try:
+        import matplotlib  # noqa: F401
+    except ImportError:
+        return []
+
+    version = data_version(conn)
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    images = []
+    for name, title, kind, query, xlabel, ylabel in CHARTS:
+        path = cache_dir / f"{name}_{version}.png"
+        try:
+            # Date de dernière utilisation, lue par prune_chart_cache
+            os.utime(path)
+        except FileNotFoundError:
+            rows = conn.execute(query).fetchall()
+            if not rows:
+                continue
+            _render_chart(path, title, kind, rows, xlabel, ylabel)
+        images.append((title, path))
+    return images
+
+
+def prune_chart_cache(cache_dir=CHART_CACHE_DIR, max_age=CHART_CACHE_MAX_AGE, now=None):
+    """Supprime les images (et fichiers temporaires abandonnés) inutilisées depuis `max_age`
+    secondes ; appelée par le planificateur des rapports. Retourne le nombre de fichiers supprimés.
+    """
+    cache_dir = Path(cache_dir)
+    if not cache_dir.is_dir():
+        return 0
+    limit = (now or time.time()) - max_age
+    removed = 0
+    for path in [*cache_dir.glob("*.png"), *cache_dir.glob("*.tmp")]:
+        try:
+            if path.stat().st_mtime < limit:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def report_styles():
+    """Styles communs : (feuille de styles, style de titre, style de tableau)"""
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import TableStyle
+
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        spaceAfter=30,
+        textColor=colors.darkblue
+    )
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 14),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ])
+    return styles, title_style, table_style
+
+
+def chart_flowables(images, width=None):
+    """Titre et image de chaque graphique mis en cache"""
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Image, KeepTogether, Spacer
+
+    width = width or CHART_SIZE[0] * inch
+    height = width * CHART_SIZE[1] / CHART_SIZE[0]
+    return [KeepTogether([Image(str(path), width=width, height=height), Spacer(1, 12)])
+            for _, path in images]
+
+
+def stock_table_flowables(conn, query, params=(), headers=STOCK_HEADERS, col_widths=STOCK_COL_WIDTHS,
+                          rows_per_page=TABLE_ROWS_PER_PAGE, fetch_size=TABLE_FETCH_SIZE):
+    """Génère un tableau par page à partir du curseur, sans charger tout le résultat.
+
+    Largeurs et hauteurs fixes : reportlab n'a pas à mesurer les cellules, le coût
+    de mise en page reste linéaire avec le nombre de lignes.
+    """
+    from reportlab.lib import colors
+    from reportlab.platypus import Table, TableStyle
+
+    style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.beige]),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ])
+    cursor = conn.execute(query, tuple(params))
+    page = []
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        for row in rows:
+            page.append(["" if value is None else str(value)[:DESIGNATION_MAX_CHARS] for value in row])
+            if len(page) == rows_per_page:
+                yield Table([headers] + page, colWidths=col_widths, rowHeights=14, style=style)
+                page = []
+        if not rows:
+            break
+    if page:
+        yield Table([headers] + page, colWidths=col_widths, rowHeights=14, style=style)
+
+
+def _draw_page_number(canvas, doc):
+    canvas.saveState()
+    canvas.setFont('Helvetica', 8)
+    canvas.drawRightString(doc.pagesize[0] - PAGE_MARGIN, PAGE_MARGIN / 2, f"Page {doc.page}")
+    canvas.restoreState()
+
+
+def build_document(path, story, progress=None):
+    """Construit le PDF (numéros de page, progression de la mise en page)"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate
+
+    doc = SimpleDocTemplate(str(path), pagesize=A4, leftMargin=PAGE_MARGIN, rightMargin=PAGE_MARGIN,
+                            topMargin=PAGE_MARGIN, bottomMargin=PAGE_MARGIN)
+    if progress:
+        total = [len(story) or 1]
+
+        def on_progress(kind, value):
+            if kind == 'SIZE_EST':
+                total[0] = value or 1
+            elif kind == 'PROGRESS':
+                progress(min(value / total[0], 1.0), "Mise en page du PDF")
+
+        doc.setProgressCallBack(on_progress)
+    doc.build(story, onFirstPage=_draw_page_number, onLaterPages=_draw_page_number)
+    return path
@@ -0,0 +1,163 @@
+"""Réapprovisionnement : stock de sécurité, point de commande et quantité économique par référence
+
+Demande : moyenne et écart-type journaliers sur `demande_journaliere` (jours sans expédition
+comptés à zéro). Délai : écart entre la date de commande et la date de réception, moyenne et
+écart-type par fournisseur lus dans `fournisseurs_mensuel` (réceptions dont la date de commande
+est connue) ; un fournisseur sans délai mesuré prend `reappro_delai_defaut` (σL = 0). Chaque
+référence suit son fournisseur principal (plus grande quantité reçue). Tous les calculs sont faits en une passe NumPy sur toutes les références.
+
+    stock de sécurité = z × √(L × σd² + d² × σL²)
+    point de commande = d × L + stock de sécurité
+    quantité économique = √(2 × demande annuelle × coût de commande / coût de stockage annuel)
+"""
+import csv
+import io
+import sqlite3
+from datetime import date, timedelta
+from statistics import NormalDist
+
+import wms_cache
+from wms_lazy import LazyModule
+from wms_services import get_parametre, set_parametre
+
+np = LazyModule("numpy")
+
+DEMAND_DAYS = 90
+DISPLAY_ROWS = 200
+# Paramètres (table parametres) : clé -> (valeur par défaut, description)
+SETTINGS = {
+    "reappro_taux_service": (0.95, "Taux de service visé pour le stock de sécurité"),
+    "reappro_cout_commande": (50.0, "Coût de passation d'une commande"),
+    "reappro_cout_stockage": (2.0, "Coût de stockage annuel d'une unité"),
+    "reappro_delai_defaut": (7.0, "Délai d'approvisionnement par défaut (jours)"),
+}
+SUGGESTION_COLUMNS = ["Référence", "Fournisseur", "Stock", "Demande/jour", "Délai (j)",
+                      "Stock de sécurité", "Point de commande", "Quantité économique", "Quantité suggérée"]
+
+
+def get_settings(conn):
+    """Paramètres de calcul {clé: valeur}"""
+    return {key: float(get_parametre(conn, key, default)) for key, (default, _) in SETTINGS.items()}
+
+
+def set_settings(conn, **values):
+    """Enregistre des paramètres de calcul (clés de SETTINGS)"""
+    for key, value in values.items():
+        if key not in SETTINGS:
+            raise ValueError(f"Paramètre inconnu: {key}")
+        if key == "reappro_taux_service" and not 0.5 <= value < 1:
+            raise ValueError("Le taux de service doit être compris entre 0.5 et 1")
+        if value < 0:
+            raise ValueError("Les paramètres de réapprovisionnement doivent être positifs")
+        set_parametre(conn, key, value, SETTINGS[key][1])
+    conn.commit()
+
+
+def supplier_lead_times(conn):
+    """{fournisseur: (délai moyen, écart-type du délai)} sur les réceptions à date de commande connue"""
+    rows = conn.execute("""
+        SELECT fournisseur, CAST(SUM(delai_total) AS REAL) / SUM(receptions_mesurees),
+               CAST(SUM(delai_carres) AS REAL) / SUM(receptions_mesurees)
+        FROM fournisseurs_mensuel
+        GROUP BY fournisseur HAVING SUM(receptions_mesurees) > 0
+    """).fetchall()
+    return {name: (mean, max(square - mean * mean, 0) ** 0.5) for name, mean, square in rows}
+
+
+def load_inputs(conn, today=None, days=DEMAND_DAYS):
+    """Vecteurs alignés : références, fournisseur principal, stock, somme et somme des carrés de la demande"""
+    today = today or date.today()
+    since = (today - timedelta(days=days)).isoformat()
+    demand = {ref: (total, square) for ref, total, square in conn.execute("""
+        SELECT reference, SUM(quantite), SUM(quantite * quantite)
+        FROM demande_journaliere WHERE jour >= ? AND jour < ?
+        GROUP BY reference
+    """, (since, today.isoformat()))}
+    stock = dict(conn.execute("SELECT reference, SUM(quantite) FROM stocks WHERE quantite > 0 GROUP BY reference"))
+    suppliers = dict(conn.execute("""
+        SELECT reference, fournisseur FROM (
+            SELECT reference, fournisseur,
+                   ROW_NUMBER() OVER (PARTITION BY reference ORDER BY SUM(quantite) DESC, MAX(date_reception) DESC) AS rang
+            FROM receptions GROUP BY reference, fournisseur
+        ) WHERE rang = 1
+    """))
+    references = sorted(set(demand) | set(stock))
+    totals = np.array([demand.get(ref, (0, 0))[0] for ref in references], dtype=np.float64)
+    squares = np.array([demand.get(ref, (0, 0))[1] for ref in references], dtype=np.float64)
+    on_hand = np.array([stock.get(ref, 0) for ref in references], dtype=np.float64)
+    return references, [suppliers.get(ref) for ref in references], on_hand, totals, squares
+
+
+def compute_replenishment(stock, demand_total, demand_squares, lead_mean, lead_sd, settings, days=DEMAND_DAYS):
+    """Stock de sécurité, point de commande, quantité économique et quantité suggérée (vecteurs)"""
+    z = NormalDist().inv_cdf(settings["reappro_taux_service"])
+    daily = demand_total / days
+    daily_sd = np.sqrt(np.maximum(demand_squares / days - daily ** 2, 0))
+    safety = z * np.sqrt(lead_mean * daily_sd ** 2 + daily ** 2 * lead_sd ** 2)
+    reorder = daily * lead_mean + safety
+    holding = settings["reappro_cout_stockage"]
+    eoq = np.sqrt(2 * daily * 365 * settings["reappro_cout_commande"] / holding) if holding > 0 else daily * 365
+    # Sous le point de commande : ramener le stock au point de commande + quantité économique
+    below = (daily > 0) & (stock <= reorder)
+    suggested = np.where(below, np.ceil(np.maximum(reorder + eoq - stock, eoq)), 0)
+    return daily, safety, reorder, eoq, suggested
+
+
+def build_plan(conn, today=None):
+    """Calcul pour toutes les références ; retourne un dict de colonnes (vecteurs NumPy et listes)"""
+    settings = get_settings(conn)
+    references, suppliers, stock, totals, squares = load_inputs(conn, today)
+    lead_times = supplier_lead_times(conn)
+    default = (settings["reappro_delai_defaut"], 0.0)
+    lead = np.array([lead_times.get(name, default) for name in suppliers], dtype=np.float64).reshape(-1, 2)
+    daily, safety, reorder, eoq, suggested = compute_replenishment(
+        stock, totals, squares, lead[:, 0], lead[:, 1], settings
+    )
+    return {
+        'references': references, 'fournisseurs': suppliers, 'stock': stock, 'demande_jour': daily,
+        'delai': lead[:, 0], 'stock_securite': safety, 'point_commande': reorder,
+        'quantite_economique': eoq, 'quantite_suggeree': suggested,
+        'date_calcul': (today or date.today()).isoformat(), 'parametres': settings,
+    }
+
+
+def get_plan(db_path, today=None):
+    """Plan mémorisé, recalculé après un mouvement, un changement de paramètres ou de jour"""
+    today = today or date.today()
+    conn = sqlite3.connect(db_path)
+    try:
+        settings = get_settings(conn)
+    finally:
+        conn.close()
+    name, tables = "reappro", ("stocks", "receptions", "expeditions")
+    plan = wms_cache.cached(db_path, name, tables, lambda conn: build_plan(conn, today))
+    # Une seule entrée par base : le jour et les paramètres (non versionnés) la remplacent
+    if plan['date_calcul'] != today.isoformat() or plan['parametres'] != settings:
+        wms_cache.invalidate(db_path, name)
+        plan = wms_cache.cached(db_path, name, tables, lambda conn: build_plan(conn, today))
+    return plan
+
+
+def suggestion_rows(plan, supplier=None):
+    """Lignes de la liste de commandes suggérées (références sous leur point de commande)"""
+    selected = np.flatnonzero(plan['quantite_suggeree'] > 0)
+    rows = []
+    # Les plus urgentes d'abord : stock le plus bas rapporté au point de commande
+    urgency = plan['stock'][selected] / np.maximum(plan['point_commande'][selected], 1)
+    for i in selected[np.argsort(urgency, kind='stable')]:
+        if supplier is not None and plan['fournisseurs'][i] != supplier:
+            continue
+        rows.append((plan['references'][i], plan['fournisseurs'][i] or "", int(plan['stock'][i]),
+                     round(float(plan['demande_jour'][i]), 2), round(float(plan['delai'][i]), 1),
+                     int(np.ceil(plan['stock_securite'][i])), int(np.ceil(plan['point_commande'][i])),
+                     int(np.ceil(plan['quantite_economique'][i])), int(plan['quantite_suggeree'][i])))
+    return rows
+
+
+def suggestions_csv(rows):
+    """Liste de commandes suggérées en CSV (séparateur ';', UTF-8 avec BOM pour Excel)"""
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=";")
+    writer.writerow(SUGGESTION_COLUMNS)
+    writer.writerows(rows)
+    return ("\ufeff" + output.getvalue()).encode("utf-8")
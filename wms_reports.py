@@ -0,0 +1,461 @@
+"""Génération des rapports mensuels (PDF, Excel) et planification automatique hors interface"""
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import wms_alerts
+import wms_export
+import wms_kpis
+import wms_pdf
+import wms_services
+from wms_database import MOVEMENT_SOURCES
+
+REPORTS_DIR = Path("exports") / "rapports"
+REPORT_FORMATS = ("pdf", "xlsx")
+# Un instantané de KPIs plus récent que ce délai est réutilisé tel quel
+KPI_SNAPSHOT_MAX_AGE = timedelta(hours=1)
+HISTORY_MONTHS = 12
+
+# Part du stock au-delà de laquelle une zone est jugée surchargée
+ZONE_IMBALANCE_SHARE = 0.5
+
+SCHEDULE_DAY = 1
+SCHEDULE_HOUR = 6
+SCHEDULE_CHECK_SECONDS = 900
+AUTO_REPORT_KEY = "rapport_auto_actif"
+
+RECOMMENDATION_ICONS = {'critique': '🔴', 'attention': '🟡', 'info': '🟢'}
+
+
+def _month_bounds(period):
+    year, month = (int(part) for part in period.split("-"))
+    start = date(year, month, 1)
+    end = date(year + (month == 12), month % 12 + 1, 1)
+    return start.isoformat(), end.isoformat()
+
+
+def _shift_period(period, months):
+    year, month = (int(part) for part in period.split("-"))
+    index = year * 12 + (month - 1) + months
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def previous_period(now=None):
+    """Période (AAAA-MM) du mois précédent, celle couverte par le rapport programmé"""
+    now = now or datetime.now()
+    return _shift_period(now.strftime("%Y-%m"), -1)
+
+
+# --- Instantanés de KPIs et agrégats mis en cache --------------------------------
+
+def take_kpi_snapshot(conn):
+    """Calcule les KPIs et les enregistre dans kpi_snapshots (sans commit)"""
+    kpis = wms_kpis.compute_kpis(conn)
+    taken_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    conn.executemany(
+        "INSERT INTO kpi_snapshots (date_snapshot, kpi, valeur) VALUES (?, ?, ?)",
+        [(taken_at, kpi, value) for kpi, value in kpis.items()]
+    )
+    return kpis, taken_at
+
+
+def kpi_snapshot(conn, max_age=KPI_SNAPSHOT_MAX_AGE):
+    """Dernier instantané de KPIs s'il est assez récent, sinon un nouvel instantané"""
+    latest = conn.execute("SELECT MAX(date_snapshot) FROM kpi_snapshots").fetchone()[0]
+    if latest and datetime.now() - datetime.fromisoformat(latest) <= max_age:
+        rows = conn.execute("SELECT kpi, valeur FROM kpi_snapshots WHERE date_snapshot = ?", (latest,)).fetchall()
+        kpis = dict(rows)
+        for key in ('stock_total', 'references_actives', 'lots', 'lots_expiration_proche'):
+            if key in kpis:
+                kpis[key] = int(kpis[key])
+        return kpis, latest
+    return take_kpi_snapshot(conn)
+
+
+def refresh_monthly_aggregates(conn, sources=MOVEMENT_SOURCES):
+    """Recalcule les seuls mois marqués périmés par les triggers de mouvements (sans commit).
+
+    Les mois clos et inchangés ne sont jamais relus, le coût reste donc constant
+    quand l'historique grandit.
+    """
+    by_type = {movement_type: (table, column) for table, column, movement_type in sources}
+    stale = conn.execute("SELECT mois, type FROM agregats_mensuels WHERE perime = 1").fetchall()
+    for mois, movement_type in stale:
+        table, column = by_type[movement_type]
+        try:
+            start, end = _month_bounds(mois)
+        except ValueError:
+            # Date mal formée dans la source : le mois ne peut pas être agrégé
+            conn.execute("DELETE FROM agregats_mensuels WHERE mois = ? AND type = ?", (mois, movement_type))
+            continue
+        lignes, quantite, references = conn.execute(f"""
+            SELECT COUNT(*), COALESCE(SUM(quantite), 0), COUNT(DISTINCT reference)
+            FROM {table} WHERE {column} >= ? AND {column} < ?
+        """, (start, end)).fetchone()
+        conn.execute("""
+            UPDATE agregats_mensuels
+            SET lignes = ?, quantite = ?, references_distinctes = ?, perime = 0, date_calcul = CURRENT_TIMESTAMP
+            WHERE mois = ? AND type = ?
+        """, (lignes, quantite, references, mois, movement_type))
+    return len(stale)
+
+
+def monthly_aggregates(conn, period, months=HISTORY_MONTHS):
+    """Agrégats (mois, type, lignes, quantité, références) des `months` mois jusqu'à `period`"""
+    return conn.execute("""
+        SELECT mois, type, lignes, quantite, references_distinctes
+        FROM agregats_mensuels
+        WHERE mois > ? AND mois <= ? AND lignes > 0
+        ORDER BY mois, type
+    """, (_shift_period(period, -months), period)).fetchall()
+
+
+# --- Recommandations calculées sur les données réelles ----------------------------
+
+def compute_recommendations(conn, aggregates, period):
+    """Liste de (niveau, texte) : lots expirant, références en stock faible, zones, tendance
+
+    Lots expirant et stocks faibles sont lus dans la table `alerts` : le rapport applique les
+    mêmes seuils (globaux et par référence) que le tableau de bord.
+    """
+    recommendations = []
+    _, expiry_days = wms_alerts.get_thresholds(conn)
+
+    expiring = conn.execute("""
+        SELECT reference, date_expiration FROM alerts WHERE type = 'expiration'
+        ORDER BY date_expiration
+    """).fetchall()
+    if expiring:
+        examples = ", ".join(f"{ref} ({exp})" for ref, exp in expiring[:5])
+        recommendations.append(('critique', f"{len(expiring)} lots expirent dans leur fenêtre d'alerte "
+                                            f"({expiry_days} jours par défaut) ou sont expirés : {examples}"))
+
+    low_stock = conn.execute("""
+        SELECT reference, SUM(quantite) AS total, MAX(seuil) FROM alerts WHERE type = 'stock_faible'
+        GROUP BY reference ORDER BY total
+    """).fetchall()
+    if low_stock:
+        examples = ", ".join(f"{ref} ({qty}/{threshold})" for ref, qty, threshold in low_stock[:5])
+        recommendations.append(('attention', f"Stock sous le seuil d'alerte sur {len(low_stock)} "
+                                             f"références, à réapprovisionner : {examples}"))
+
+    zones = conn.execute(
+        "SELECT zone, quantite FROM zones_stock WHERE quantite > 0 ORDER BY quantite DESC"
+    ).fetchall()
+    total_stock = sum(total for _, total in zones)
+    if len(zones) > 1 and total_stock and zones[0][1] / total_stock > ZONE_IMBALANCE_SHARE:
+        zone, total = zones[0]
+        recommendations.append(('attention', f"Déséquilibre de zones : la zone {zone} concentre "
+                                             f"{total / total_stock:.0%} du stock, rééquilibrer vers "
+                                             f"{zones[-1][0]}"))
+
+    def movements(month):
+        return sum(lignes for mois, _, lignes, _, _ in aggregates if mois == month)
+
+    current, previous = movements(period), movements(_shift_period(period, -1))
+    if previous:
+        change = (current - previous) / previous
+        recommendations.append(('info', f"Tendance : {change:+.0%} de mouvements en {period} "
+                                        f"({current} contre {previous} le mois précédent)"))
+    elif current:
+        recommendations.append(('info', f"{current} mouvements enregistrés en {period}"))
+
+    if not recommendations:
+        recommendations.append(('info', "Aucune anomalie détectée sur la période"))
+    return recommendations
+
+
+def prepare_monthly_context(db_path, period=None):
+    """Données d'un rapport : instantané de KPIs, agrégats et graphiques mis en cache, recommandations"""
+    period = period or datetime.now().strftime("%Y-%m")
+    conn = sqlite3.connect(db_path)
+    try:
+        kpis, snapshot_date = kpi_snapshot(conn)
+        refresh_monthly_aggregates(conn)
+        # Alertes d'expiration entrées dans leur fenêtre depuis la dernière évaluation
+        wms_alerts.refresh_if_due(conn)
+        aggregates = monthly_aggregates(conn, period)
+        recommendations = compute_recommendations(conn, aggregates, period)
+        conn.commit()
+        charts = wms_pdf.chart_images(conn)
+    finally:
+        conn.close()
+    return {
+        'db_path': db_path,
+        'periode': period,
+        'kpis': kpis,
+        'date_kpis': snapshot_date,
+        'agregats': aggregates,
+        'recommandations': recommendations,
+        'graphiques': charts,
+        'date_generation': datetime.now(),
+    }
+
+
+# --- Rendus -------------------------------------------------------------------
+
+REPORT_KPIS = ('stock_total', 'references_actives', 'lots', 'lots_expiration_proche', 'pourcentage_expiration')
+
+
+def _kpi_rows(kpis):
+    # Libellés partagés avec l'interface (wms_kpis.KPI_LABELS)
+    return [
+        [wms_kpis.KPI_LABELS[key], f"{kpis[key]:.1f}%" if key == 'pourcentage_expiration' else f"{kpis[key]:,}"]
+        for key in REPORT_KPIS
+    ]
+
+
+STOCK_TABLE_QUERY = """
+    SELECT reference, designation, quantite, emplacement, lot, date_expiration
+    FROM stocks WHERE quantite > 0 ORDER BY reference, lot
+"""
+
+
+def _report_header(story, title, context):
+    from reportlab.platypus import Paragraph, Spacer, Table
+
+    styles, title_style, table_style = wms_pdf.report_styles()
+    story.append(Paragraph(title, title_style))
+    story.append(Paragraph(f"Généré le {context['date_generation'].strftime('%d/%m/%Y')} "
+                           f"(KPIs au {context['date_kpis']})", styles['Normal']))
+    story.append(Spacer(1, 20))
+
+    # KPIs
+    story.append(Paragraph("KPIs Principaux", styles['Heading2']))
+    kpis_table = Table([['KPI', 'Valeur']] + _kpi_rows(context['kpis']))
+    kpis_table.setStyle(table_style)
+    story.append(kpis_table)
+    story.append(Spacer(1, 20))
+
+    # Graphiques du Reporting (images mises en cache par version des données)
+    if context['graphiques']:
+        story.append(Paragraph("Visualisations", styles['Heading2']))
+        story.extend(wms_pdf.chart_flowables(context['graphiques']))
+    return styles, table_style
+
+
+def _stock_section(story, db_path, query, params=()):
+    """Ajoute le tableau des stocks, lu en flux page par page ; retourne le nombre de pages"""
+    from reportlab.platypus import PageBreak, Paragraph
+
+    styles = wms_pdf.report_styles()[0]
+    story.append(PageBreak())
+    story.append(Paragraph("Stocks Détaillés", styles['Heading2']))
+    conn = sqlite3.connect(db_path)
+    try:
+        tables = list(wms_pdf.stock_table_flowables(conn, query, params))
+    finally:
+        conn.close()
+    story.extend(tables)
+    return len(tables)
+
+
+def build_monthly_report_pdf(path, context, progress=None):
+    """Rapport mensuel PDF avec graphiques et stocks détaillés (ImportError si reportlab est absent)"""
+    from reportlab.platypus import Paragraph, Spacer, Table
+
+    story = []
+    styles, table_style = _report_header(story, f"Rapport Mensuel WMS - {context['periode']}", context)
+
+    # Mouvements mensuels
+    if context['agregats']:
+        story.append(Paragraph("Mouvements Mensuels", styles['Heading2']))
+        movements_table = Table([['Mois', 'Type', 'Lignes', 'Quantité', 'Références']]
+                                + [list(row) for row in context['agregats']], repeatRows=1)
+        movements_table.setStyle(table_style)
+        story.append(movements_table)
+        story.append(Spacer(1, 20))
+
+    # Recommandations
+    story.append(Paragraph("Recommandations", styles['Heading2']))
+    for _, rec in context['recommandations']:
+        story.append(Paragraph(f"• {rec}", styles['Normal']))
+        story.append(Spacer(1, 6))
+
+    _stock_section(story, context['db_path'], STOCK_TABLE_QUERY)
+    if progress:
+        progress(0.1, "Contenu du rapport chargé")
+    wms_pdf.build_document(path, story, progress)
+    if progress:
+        progress(1.0, "PDF généré")
+    return path
+
+
+def build_stock_report_pdf(db_path, path, query=STOCK_TABLE_QUERY, params=(), progress=None):
+    """PDF du Reporting : KPIs, graphiques et tableau de stock (éventuellement filtré)"""
+    context = prepare_monthly_context(db_path)
+    story = []
+    _report_header(story, "Rapport WMS", context)
+    pages = _stock_section(story, db_path, query, params)
+    if progress:
+        progress(0.1, f"{pages} pages de stock préparées")
+    wms_pdf.build_document(path, story, progress)
+    return path, f"Rapport PDF généré ({pages} pages de stock)"
+
+
+def build_monthly_report_text(path, context, progress=None):
+    """Version texte du rapport mensuel, sans reportlab"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"RAPPORT MENSUEL WMS - {context['periode']}\n")
+        f.write("=" * 50 + "\n\n")
+        f.write(f"Généré le: {context['date_generation'].strftime('%d/%m/%Y %H:%M')}\n\n")
+
+        f.write("KPIs PRINCIPAUX:\n")
+        f.write("-" * 20 + "\n")
+        for label, value in _kpi_rows(context['kpis']):
+            f.write(f"{label}: {value}\n")
+        f.write("\n")
+
+        if context['agregats']:
+            f.write("MOUVEMENTS MENSUELS:\n")
+            f.write("-" * 20 + "\n")
+            for mois, movement_type, lignes, quantite, references in context['agregats']:
+                f.write(f"{mois} {movement_type}: {lignes} lignes, {quantite} unités, {references} références\n")
+            f.write("\n")
+
+        f.write("RECOMMANDATIONS:\n")
+        f.write("-" * 20 + "\n")
+        for _, rec in context['recommandations']:
+            f.write(f"• {rec}\n")
+    if progress:
+        progress(1.0, "Rapport texte généré")
+    return path
+
+
+def build_monthly_report_excel(db_path, path, context, progress=None):
+    """Classeur du rapport mensuel : KPIs, mouvements, recommandations et stocks détaillés"""
+    sheets = [
+        wms_export.Sheet("KPIs", headers=['KPI', 'Valeur'], rows=_kpi_rows(context['kpis'])),
+        wms_export.Sheet("Mouvements Mensuels", headers=['Mois', 'Type', 'Lignes', 'Quantité', 'Références'],
+                         rows=context['agregats']),
+        wms_export.Sheet("Recommandations", headers=['Niveau', 'Recommandation'],
+                         rows=context['recommandations']),
+        wms_export.Sheet("Stocks", """
+            SELECT reference, designation, quantite, emplacement, lot, date_expiration
+            FROM stocks ORDER BY reference
+        """),
+    ]
+
+    def on_sheet(done, total):
+        if progress:
+            progress(done / total, f"{done}/{total} feuilles écrites")
+
+    with open(path, "wb") as output:
+        wms_export.write_workbook(db_path, sheets, output=output, progress=on_sheet)
+    return path
+
+
+def generate_monthly_reports(db_path, period=None, formats=REPORT_FORMATS, output_dir=REPORTS_DIR,
+                             progress=None):
+    """Génère les rapports de la période et les enregistre dans la table rapports"""
+    context = prepare_monthly_context(db_path, period)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    base = output_dir / f"rapport_mensuel_{context['periode'].replace('-', '')}"
+
+    generated = []
+    for position, fmt in enumerate(formats):
+        if fmt == "pdf":
+            try:
+                path = build_monthly_report_pdf(base.with_suffix(".pdf"), context)
+            except ImportError:
+                # Version simplifiée sans reportlab
+                path = build_monthly_report_text(base.with_suffix(".txt"), context)
+        elif fmt == "xlsx":
+            path = build_monthly_report_excel(db_path, base.with_suffix(".xlsx"), context)
+        else:
+            raise ValueError(f"Format de rapport inconnu: {fmt}")
+        generated.append(path)
+        if progress:
+            progress((position + 1) / len(formats), f"{path.name} généré")
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executemany("""
+            INSERT INTO rapports (periode, format, fichier) VALUES (?, ?, ?)
+            ON CONFLICT (periode, format) DO UPDATE SET
+                fichier = excluded.fichier, date_generation = CURRENT_TIMESTAMP
+        """, [(context['periode'], path.suffix.lstrip("."), str(path)) for path in generated])
+        conn.commit()
+    finally:
+        conn.close()
+    return generated, context
+
+
+def list_reports(conn, limit=24):
+    """Derniers rapports générés (période, format, fichier, date)"""
+    return conn.execute("""
+        SELECT periode, format, fichier, date_generation FROM rapports
+        ORDER BY periode DESC, format LIMIT ?
+    """, (limit,)).fetchall()
+
+
+# --- Planification --------------------------------------------------------------
+
+def report_due(conn, now=None, day=SCHEDULE_DAY, hour=SCHEDULE_HOUR):
+    """Période à générer si le rapport du mois précédent n'existe pas encore, sinon None"""
+    now = now or datetime.now()
+    if (now.day, now.hour) < (day, hour):
+        return None
+    period = previous_period(now)
+    exists = conn.execute("SELECT 1 FROM rapports WHERE periode = ? LIMIT 1", (period,)).fetchone()
+    return None if exists else period
+
+
+def run_if_due(db_path, now=None, force=False):
+    """Génère le rapport du mois précédent s'il est dû ; retourne les fichiers produits"""
+    conn = sqlite3.connect(db_path)
+    try:
+        enabled = wms_services.get_parametre(conn, AUTO_REPORT_KEY, "0") == "1"
+        period = report_due(conn, now)
+    finally:
+        conn.close()
+    if period is None or not (enabled or force):
+        return []
+    generated, _ = generate_monthly_reports(db_path, period)
+    return generated
+
+
+class MonthlyReportScheduler:
+    """Thread qui vérifie périodiquement si le rapport mensuel doit être généré et purge le cache des graphiques"""
+
+    def __init__(self, db_path, check_seconds=SCHEDULE_CHECK_SECONDS):
+        self.db_path = db_path
+        self.check_seconds = check_seconds
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="wms-rapports", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while True:
+            try:
+                run_if_due(self.db_path)
+                # Hors de toute génération de ce thread ; les images encore utilisées sont récentes
+                wms_pdf.prune_chart_cache()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+            if self._stop.wait(self.check_seconds):
+                break
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def start_scheduler(db_path):
+    """Démarre une seule fois par processus le planificateur de la base donnée"""
+    with _schedulers_lock:
+        scheduler = _schedulers.get(db_path)
+        if scheduler is None:
+            scheduler = MonthlyReportScheduler(db_path).start()
+            _schedulers[db_path] = scheduler
+        return scheduler
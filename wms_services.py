@@ -0,0 +1,430 @@
+"""Opérations de données du WMS sans dépendance à l'interface Streamlit"""
+import io
+import sqlite3
+import time
+from datetime import date, datetime, time as dt_time
+from pathlib import Path
+
+from wms_database import ARCHIVING_KEY, LOCATION_ZONE_SQL, MOVEMENT_SOURCES
+
+IMPORT_CHUNK_SIZE = 5000
+ARCHIVE_DIR = Path("archives")
+ARCHIVE_FILE = "wms_archive.db"
+
+
+def _clean(value):
+    """Valeur de cellule importée -> valeur SQLite (NaN/NaT et chaînes vides -> None)"""
+    if value is None or value != value:
+        return None
+    if isinstance(value, str):
+        return value.strip() or None
+    if hasattr(value, 'to_pydatetime'):
+        value = value.to_pydatetime()
+    if isinstance(value, datetime):
+        return value.date().isoformat() if value.time() == dt_time() else value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        # Scalaires numpy, non gérés par sqlite3
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _ensure_locations(conn, codes):
+    """Crée les emplacements inconnus (zone déduite du code) avant d'y rattacher du stock"""
+    conn.executemany(
+        f"INSERT OR IGNORE INTO emplacements (code, zone) VALUES (?1, {LOCATION_ZONE_SQL.format(code='?1')})",
+        ((code,) for code in set(codes))
+    )
+
+
+def import_stock_file(db_path, data, filename, progress=None):
+    """Importe un fichier CSV/Excel (contenu en octets) dans la table stocks, par paquets"""
+    import pandas as pd
+
+    buffer = io.BytesIO(data)
+    df = pd.read_csv(buffer) if filename.endswith('.csv') else pd.read_excel(buffer)
+    total = len(df.index)
+    columns = ['reference', 'designation', 'quantite', 'emplacement', 'lot', 'date_expiration']
+    records = df.reindex(columns=columns).itertuples(index=False, name=None)
+
+    conn = sqlite3.connect(db_path)
+    imported = 0
+    try:
+        while True:
+            chunk = []
+            for reference, designation, quantite, emplacement, lot, date_expiration in records:
+                # Vérifier que les champs obligatoires ne sont pas vides
+                reference = _clean(reference) or f"REF_{total}"
+                chunk.append((
+                    reference,
+                    _clean(designation) or f"Article {reference}",
+                    _clean(quantite) or 0,
+                    _clean(emplacement) or "LIBRE",
+                    _clean(lot),
+                    _clean(date_expiration),
+                ))
+                if len(chunk) >= IMPORT_CHUNK_SIZE:
+                    break
+            if not chunk:
+                break
+            # Rattachement par clé dès l'insertion (évite la mise à jour ligne à ligne du trigger)
+            _ensure_locations(conn, [row[3] for row in chunk])
+            conn.executemany("""
+                INSERT INTO stocks (reference, designation, quantite, emplacement, lot, date_expiration, emplacement_id)
+                VALUES (?1, ?2, ?3, ?4, ?5, ?6, (SELECT id FROM emplacements WHERE code = ?4))
+            """, chunk)
+            imported += len(chunk)
+            if progress:
+                progress(imported / total, f"{imported:,}/{total:,} lignes")
+        conn.commit()
+    finally:
+        conn.close()
+    return imported
+
+
+def get_parametre(conn, cle, default=None):
+    """Valeur d'un paramètre de la table parametres (ou `default` s'il est absent)"""
+    row = conn.execute("SELECT valeur FROM parametres WHERE cle = ?", (cle,)).fetchone()
+    return row[0] if row else default
+
+
+def set_parametre(conn, cle, valeur, description=None):
+    """Crée ou met à jour un paramètre (sans commit)"""
+    conn.execute("""
+        INSERT INTO parametres (cle, valeur, description) VALUES (?, ?, ?)
+        ON CONFLICT (cle) DO UPDATE SET valeur = excluded.valeur,
+            description = COALESCE(excluded.description, parametres.description)
+    """, (cle, str(valeur), description))
+
+
+def add_stock_item(db_path, ref, desig, qty, emp, lot, exp_date):
+    """Ajoute une ligne de stock ; retourne la référence retenue"""
+    # Validation des champs obligatoires
+    if not ref or ref.strip() == "":
+        ref = f"REF_{int(time.time())}"
+    if not desig or desig.strip() == "":
+        desig = f"Article {ref}"
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("""
+            INSERT INTO stocks (reference, designation, quantite, emplacement, lot, date_expiration)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (ref.strip(), desig.strip(), qty or 0, emp or "LIBRE", lot, exp_date))
+        conn.commit()
+    finally:
+        conn.close()
+    return ref.strip()
+
+
+def create_reception(db_path, ref, qty, fournisseur, date_reception, emplacement, date_commande=None):
+    """Enregistre une réception et crédite le stock de l'emplacement ; retourne la référence
+
+    `date_commande` (date de la commande au fournisseur) sert à mesurer son délai de livraison ;
+    sans elle la réception n'entre pas dans les statistiques de délai.
+    """
+    # Validation des champs obligatoires
+    if not ref or ref.strip() == "":
+        ref = f"REF_{int(time.time())}"
+    if not emplacement or emplacement.strip() == "":
+        emplacement = "LIBRE"
+    ref, emplacement = ref.strip(), emplacement.strip()
+    if date_commande and str(date_commande) > str(date_reception):
+        raise ValueError("La date de commande doit précéder la date de réception")
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("""
+            INSERT INTO receptions (reference, quantite, fournisseur, date_reception, emplacement, date_commande)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (ref, qty, fournisseur or "Fournisseur inconnu", date_reception, emplacement, date_commande or None))
+
+        # Mettre à jour le stock de l'emplacement de réception
+        updated = conn.execute("""
+            UPDATE stocks SET quantite = quantite + ?
+            WHERE id = (SELECT id FROM stocks WHERE reference = ? AND emplacement = ? LIMIT 1)
+        """, (qty, ref, emplacement)).rowcount
+        if not updated:
+            conn.execute("""
+                INSERT INTO stocks (reference, designation, quantite, emplacement)
+                VALUES (?, ?, ?, ?)
+            """, (ref, f"Produit {ref}", qty, emplacement))
+        conn.commit()
+    finally:
+        conn.close()
+    return ref
+
+
+def create_expedition(db_path, num_commande, ref, qty, client, emplacement):
+    """Enregistre une expédition et débite le stock (ValueError si stock absent ou insuffisant).
+
+    L'emplacement peut contenir plusieurs lots de la référence : la quantité est prélevée sur
+    la première ligne de stock qui la couvre entièrement.
+    """
+    if not emplacement or emplacement.strip() == "":
+        emplacement = "LIBRE"
+    emplacement = emplacement.strip()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        # Vérifier le stock disponible à l'emplacement spécifié, ligne (lot) par ligne
+        lines = conn.execute("""
+            SELECT id, quantite FROM stocks
+            WHERE reference = ? AND emplacement = ?
+            ORDER BY id
+        """, (ref, emplacement)).fetchall()
+
+        if not lines:
+            raise ValueError(f"Référence {ref} introuvable à l'emplacement {emplacement}")
+        stock_id = next((line_id for line_id, quantity in lines if quantity >= qty), None)
+        if stock_id is None:
+            available = max(quantity for _, quantity in lines)
+            raise ValueError(f"Stock insuffisant à {emplacement}. Disponible: {available}"
+                             f"{' par lot' if len(lines) > 1 else ''}, Demandé: {qty}")
+
+        client = client or "Client inconnu"
+        conn.execute("INSERT OR IGNORE INTO clients (nom) VALUES (?)", (client,))
+        conn.execute("""
+            INSERT INTO expeditions (numero_commande, reference, quantite, client, emplacement, client_id)
+            VALUES (?, ?, ?, ?, ?, (SELECT id FROM clients WHERE nom = ?))
+        """, (num_commande, ref, qty, client, emplacement, client))
+
+        # Réduire la seule ligne de stock retenue
+        conn.execute("""
+            UPDATE stocks SET quantite = quantite - ?, date_modification = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (qty, stock_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+TRANSFER_COLUMNS = ['reference', 'quantite', 'emplacement_source', 'emplacement_destination']
+# Colonne facultative : lot à déplacer (obligatoire si la source contient plusieurs lots)
+TRANSFER_LOT_COLUMN = 'lot'
+
+
+def _check_transfer(ref, qty, emp_source, emp_dest, lot=None):
+    """Contrôles d'une ligne de transfert ; retourne (référence, quantité, source, destination, lot) nettoyés"""
+    ref = _clean(ref)
+    if ref is None:
+        raise ValueError("Référence requise")
+    try:
+        qty = int(qty)
+    except (TypeError, ValueError):
+        raise ValueError(f"Quantité invalide: {qty}")
+    if qty <= 0:
+        raise ValueError("La quantité doit être positive")
+    emp_source, emp_dest = _clean(emp_source), _clean(emp_dest)
+    if emp_source is None:
+        raise ValueError("Emplacement source requis")
+    if emp_dest is None:
+        raise ValueError("Emplacement destination requis")
+    emp_source, emp_dest = str(emp_source), str(emp_dest)
+    if emp_source == emp_dest:
+        raise ValueError("Les emplacements source et destination doivent être différents")
+    lot = _clean(lot)
+    return str(ref), qty, emp_source, emp_dest, None if lot is None else str(lot)
+
+
+def read_transfer_file(data, filename):
+    """Lignes [(référence, quantité, source, destination[, lot])] d'un fichier CSV/Excel de transferts"""
+    import pandas as pd
+
+    buffer = io.BytesIO(data)
+    df = pd.read_csv(buffer) if filename.endswith('.csv') else pd.read_excel(buffer)
+    missing = [column for column in TRANSFER_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"Colonnes manquantes: {', '.join(missing)}")
+    columns = TRANSFER_COLUMNS + [TRANSFER_LOT_COLUMN] * (TRANSFER_LOT_COLUMN in df.columns)
+    return list(df[columns].itertuples(index=False, name=None))
+
+
+def _lot_label(lot):
+    return f" (lot {lot})" if lot is not None else ""
+
+
+def execute_transfers(db_path, transfers, motif, utilisateur):
+    """Exécute un lot de transferts [(référence, quantité, source, destination[, lot])] en une transaction.
+
+    Une ligne de stock est identifiée par (référence, emplacement, lot) ; sans lot précisé,
+    celui de la source est retenu s'il est unique. Le lot est chargé dans une table
+    temporaire ; les quantités demandées par (référence, source, lot) sont contrôlées en une
+    requête contre la ligne de stock source, puis appliquées en mises à jour relatives. La
+    ligne destination est créée si besoin avec le lot, la date d'expiration et la désignation
+    de la source ; les lignes source vidées sont supprimées. Une seule ligne invalide annule
+    tout le lot. Retourne un dict : lignes, executes, echecs [(ligne, référence, message)],
+    duree, debit (lignes par seconde).
+    """
+    started = time.perf_counter()
+    rows, failures = [], []
+    for number, line in enumerate(transfers, start=1):
+        try:
+            ref, qty, source, destination, lot = _check_transfer(*line)
+            rows.append((number, ref, qty, source, destination, lot, lot is not None))
+        except (TypeError, ValueError) as e:
+            failures.append((number, _clean(line[0]) if len(line) else None, str(e)))
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS lot_transferts (
+                ligne INTEGER PRIMARY KEY, reference TEXT, quantite INTEGER, source TEXT, destination TEXT,
+                lot TEXT, lot_precise INTEGER
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS temp.idx_lot_source ON lot_transferts (reference, source, lot)")
+        conn.execute("CREATE INDEX IF NOT EXISTS temp.idx_lot_destination ON lot_transferts (reference, destination, lot)")
+        conn.execute("DELETE FROM temp.lot_transferts")
+        conn.executemany("INSERT INTO temp.lot_transferts VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        # Lot non précisé : plusieurs lots à la source est une erreur, sinon le lot de la source est retenu
+        failures += [(number, ref, f"Plusieurs lots de {ref} à l'emplacement {source} : préciser le lot")
+                     for number, ref, source in conn.execute("""
+            SELECT l.ligne, l.reference, l.source FROM temp.lot_transferts l
+            WHERE NOT l.lot_precise AND (SELECT COUNT(*) FROM (
+                SELECT DISTINCT s.lot FROM stocks s WHERE s.reference = l.reference AND s.emplacement = l.source)) > 1
+        """)]
+        conn.execute("""
+            UPDATE temp.lot_transferts SET lot = (
+                SELECT s.lot FROM stocks s WHERE s.reference = lot_transferts.reference
+                AND s.emplacement = lot_transferts.source ORDER BY s.id LIMIT 1)
+            WHERE NOT lot_precise
+        """)
+        # Contrôle ensembliste : total demandé par (référence, source, lot) contre la ligne de stock source
+        failed = {failure[0] for failure in failures}
+        failures += [(number, ref, f"Stock insuffisant à l'emplacement {source}{_lot_label(lot)} "
+                                   f"(demandé {requested}, disponible {available or 0})")
+                     for number, ref, source, lot, requested, available in conn.execute("""
+            WITH demande AS (
+                SELECT reference, source, lot, SUM(quantite) AS total,
+                       (SELECT quantite FROM stocks s WHERE s.reference = l.reference AND s.emplacement = l.source
+                        AND s.lot IS l.lot ORDER BY s.id LIMIT 1) AS disponible
+                FROM temp.lot_transferts l GROUP BY reference, source, lot
+            )
+            SELECT l.ligne, l.reference, l.source, l.lot, d.total, d.disponible
+            FROM temp.lot_transferts l
+            JOIN demande d ON d.reference = l.reference AND d.source = l.source AND d.lot IS l.lot
+            WHERE d.disponible IS NULL OR d.disponible < d.total
+        """) if number not in failed]
+        if failures:
+            conn.rollback()
+            failures.sort()
+            executed = 0
+        else:
+            conn.execute("""
+                INSERT INTO transferts (reference, quantite, emplacement_source, emplacement_destination,
+                                        lot, motif, utilisateur)
+                SELECT reference, quantite, source, destination, lot, ?, ? FROM temp.lot_transferts ORDER BY ligne
+            """, (motif, utilisateur or "Admin"))
+            # Lignes de stock source (première ligne de chaque (référence, emplacement, lot)), avant création
+            # des destinations : celles vidées par le lot seront supprimées
+            source_ids = """
+                SELECT MIN(s.id) FROM stocks s
+                JOIN temp.lot_transferts l ON s.reference = l.reference AND s.emplacement = l.source AND s.lot IS l.lot
+                GROUP BY s.reference, s.emplacement, s.lot
+            """
+            # Mises à jour relatives : l'ordre des lignes du lot n'a pas d'effet sur le résultat
+            for column, sign in (("source", "-"), ("destination", "+")):
+                conn.execute(f"""
+                    UPDATE stocks SET quantite = quantite {sign} (
+                        SELECT SUM(l.quantite) FROM temp.lot_transferts l
+                        WHERE l.reference = stocks.reference AND l.{column} = stocks.emplacement
+                        AND l.lot IS stocks.lot),
+                        date_modification = CURRENT_TIMESTAMP
+                    WHERE id IN (
+                        SELECT MIN(s.id) FROM stocks s
+                        JOIN temp.lot_transferts l ON s.reference = l.reference AND s.emplacement = l.{column}
+                        AND s.lot IS l.lot
+                        GROUP BY s.reference, s.emplacement, s.lot)
+                """)
+            emptied = [row[0] for row in conn.execute(f"SELECT id FROM stocks WHERE quantite = 0 AND id IN ({source_ids})")]
+            _ensure_locations(conn, [row[4] for row in rows])
+            conn.execute("""
+                INSERT INTO stocks (reference, designation, quantite, emplacement, lot, date_expiration, emplacement_id)
+                SELECT l.reference,
+                       COALESCE(MIN(src.designation),
+                                (SELECT designation FROM stocks s WHERE s.reference = l.reference LIMIT 1),
+                                'Produit ' || l.reference),
+                       SUM(l.quantite), l.destination, l.lot, MIN(src.date_expiration),
+                       (SELECT id FROM emplacements e WHERE e.code = l.destination)
+                FROM temp.lot_transferts l
+                LEFT JOIN stocks src ON src.id = (
+                    SELECT MIN(s.id) FROM stocks s
+                    WHERE s.reference = l.reference AND s.emplacement = l.source AND s.lot IS l.lot)
+                WHERE NOT EXISTS (SELECT 1 FROM stocks s WHERE s.reference = l.reference
+                                  AND s.emplacement = l.destination AND s.lot IS l.lot)
+                GROUP BY l.reference, l.destination, l.lot
+            """)
+            # Emplacements source vidés : la ligne disparaît (pas de ligne à zéro en alerte critique)
+            conn.executemany("DELETE FROM stocks WHERE id = ?", ((stock_id,) for stock_id in emptied))
+            conn.execute("DELETE FROM temp.lot_transferts")
+            conn.commit()
+            executed = len(rows)
+    finally:
+        conn.close()
+    duration = time.perf_counter() - started
+    return {
+        'lignes': len(transfers),
+        'executes': executed,
+        'echecs': failures,
+        'duree': duration,
+        'debit': executed / duration if duration > 0 else 0.0,
+    }
+
+
+def execute_transfer(db_path, ref, qty, emp_source, emp_dest, motif, utilisateur, lot=None):
+    """Déplace une quantité entre deux emplacements (ValueError si la demande est invalide)"""
+    result = execute_transfers(db_path, [(ref, qty, emp_source, emp_dest, lot)], motif, utilisateur)
+    if result['echecs']:
+        raise ValueError(result['echecs'][0][2])
+
+
+def archive_movements(db_path, before, archive_dir=ARCHIVE_DIR):
+    """Déplace les mouvements antérieurs au mois `before` (AAAA-MM) vers la base d'archive.
+
+    Copie et suppression se font dans une seule transaction sur les deux bases. Pendant
+    cette transaction la clé `archivage_en_cours` de parametres neutralise les triggers de
+    suppression : les agrégats d'historique (agregats_mensuels, fournisseurs_mensuel,
+    clients_*, mouvements_*, demande_journaliere) gardent les mouvements archivés.
+    Retourne le chemin de l'archive et le nombre de lignes déplacées par table.
+    """
+    import wms_reports
+
+    try:
+        datetime.strptime(before, "%Y-%m")
+    except ValueError:
+        raise ValueError(f"Période invalide: {before} (format attendu AAAA-MM)")
+    cutoff = f"{before}-01"
+    archive_dir = Path(archive_dir)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    archive_path = archive_dir / ARCHIVE_FILE
+
+    conn = sqlite3.connect(db_path)
+    try:
+        # Figer les agrégats des mois concernés avant la suppression
+        wms_reports.refresh_monthly_aggregates(conn)
+        conn.commit()
+        conn.execute("ATTACH DATABASE ? AS archive", (str(archive_path),))
+        set_parametre(conn, ARCHIVING_KEY, 1, "Archivage en cours (agrégats conservés)")
+        counts = {}
+        for table, column, _ in MOVEMENT_SOURCES:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS archive.{table} AS SELECT * FROM main.{table} WHERE 0")
+            # Colonnes ajoutées au schéma depuis la création de l'archive
+            archived = {row[1] for row in conn.execute(f"PRAGMA archive.table_info({table})")}
+            for _, name, decl_type, *_ in conn.execute(f"PRAGMA main.table_info({table})").fetchall():
+                if name not in archived:
+                    conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN {name} {decl_type}")
+            counts[table] = conn.execute(
+                f"INSERT INTO archive.{table} SELECT * FROM main.{table} WHERE {column} < ?", (cutoff,)
+            ).rowcount
+            conn.execute(f"DELETE FROM main.{table} WHERE {column} < ?", (cutoff,))
+        # Retirée dans la même transaction : jamais visible hors de l'archivage
+        conn.execute("DELETE FROM parametres WHERE cle = ?", (ARCHIVING_KEY,))
+        conn.commit()
+        conn.execute("DETACH DATABASE archive")
+    finally:
+        conn.close()
+    return archive_path, counts
@@ -0,0 +1,176 @@
+"""Simulateur de scénarios What-If : trajectoires de stock par référence par tirages Monte Carlo
+
+Chaque référence part de son stock, reçoit son flux d'approvisionnement moyen et subit une
+demande tirée au hasard (loi normale de moyenne = vitesse, variance = vitesse × dispersion),
+par pas de STEP_DAYS jours, sans stock négatif (ventes perdues). Les tableaux sont de forme
+(scénarios × références) et avancent pas par pas ; les références sont traitées par blocs,
+éventuellement dans un pool de processus.
+
+Les références dont le stock ne peut pas raisonnablement s'épuiser sur l'horizon (marge de
+SAFE_SIGMAS écarts-types à chaque pas) ne sont pas simulées une à une : leur somme suit une
+marche aléatoire normale, tirée une seule fois par scénario et par pas.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from statistics import NormalDist
+
+from wms_lazy import LazyModule
+
+np = LazyModule("numpy")
+
+HORIZON_DAYS = 90
+STEP_DAYS = 7
+DEFAULT_SCENARIOS = 1000
+PERCENTILES = (10, 50, 90)
+DISPERSION = 1.5
+SAFE_SIGMAS = 5.0
+SUPPLY_DAYS = 90
+# Taille d'un bloc (scénarios × références) et seuil au-delà duquel le pool de processus est utilisé
+CHUNK_ELEMENTS = 1_000_000
+PARALLEL_MIN_ELEMENTS = 200_000_000
+
+
+def load_inputs(conn, today=None):
+    """(références, stock, demande/jour, approvisionnement/jour) depuis la couverture et les réceptions"""
+    today = today or date.today()
+    since = (today - timedelta(days=SUPPLY_DAYS)).isoformat()
+    rows = conn.execute("""
+        SELECT c.reference, c.stock, c.vitesse_journaliere, COALESCE(r.recu, 0) / ?
+        FROM couverture c
+        LEFT JOIN (SELECT reference, SUM(quantite) AS recu FROM receptions
+                   WHERE date_reception >= ? GROUP BY reference) r ON r.reference = c.reference
+        WHERE c.stock > 0 OR c.vitesse_journaliere > 0
+        ORDER BY c.reference
+    """, (float(SUPPLY_DAYS), since)).fetchall()
+    if not rows:
+        return [], np.zeros(0), np.zeros(0), np.zeros(0)
+    references, stock, demand, supply = zip(*rows)
+    return (list(references), np.array(stock, dtype=np.float64),
+            np.array(demand, dtype=np.float64), np.array(supply, dtype=np.float64))
+
+
+def _steps(horizon_days, step_days):
+    """Longueur de chaque pas (le dernier peut être plus court)"""
+    lengths = [step_days] * (horizon_days // step_days)
+    if horizon_days % step_days:
+        lengths.append(horizon_days % step_days)
+    return np.array(lengths, dtype=np.float64)
+
+
+_quantiles = None
+
+
+def _normal_quantiles(levels=65536):
+    """Quantiles de la loi normale centrée réduite : un tirage = un indice 16 bits aléatoire.
+
+    Environ trois fois plus rapide que standard_normal, pour une loi discrétisée sur 65536 niveaux.
+    """
+    global _quantiles
+    if _quantiles is None:
+        normal = NormalDist()
+        _quantiles = np.array([normal.inv_cdf((i + 0.5) / levels) for i in range(levels)], dtype=np.float32)
+    return _quantiles
+
+
+def _simulate_chunk(args):
+    """Trajectoires d'un bloc de références à risque.
+
+    Retourne (stock total par scénario et par pas, références en rupture par scénario et par pas,
+    nombre de scénarios en rupture par référence).
+    """
+    stock, mean, supply, steps, scenarios, seed = args
+    rng = np.random.Generator(np.random.SFC64(seed))
+    quantiles = _normal_quantiles()
+    size = len(stock)
+    # Moyenne, écart-type et approvisionnement de chaque pas, en float32 pour les calculs en place
+    per_step = [((mean * days).astype(np.float32), np.sqrt(mean * days * DISPERSION).astype(np.float32),
+                 (supply * days).astype(np.float32)) for days in steps]
+    totals = np.zeros((scenarios, len(steps)), dtype=np.float64)
+    stockouts = np.zeros((scenarios, len(steps)), dtype=np.int64)
+    ever_out = np.zeros(size, dtype=np.int64)
+    batch = max(1, CHUNK_ELEMENTS // max(size, 1))
+    for first in range(0, scenarios, batch):
+        count = min(batch, scenarios - first)
+        level = np.empty((count, size), dtype=np.float32)
+        level[:] = stock
+        drawn = np.empty_like(level)
+        empty = np.empty(level.shape, dtype=bool)
+        out = np.zeros(level.shape, dtype=bool)
+        for step, (step_mean, step_sd, step_supply) in enumerate(per_step):
+            draws = np.frombuffer(rng.bytes(2 * count * size), dtype=np.uint16).reshape(count, size)
+            np.take(quantiles, draws, out=drawn)
+            drawn *= step_sd
+            drawn += step_mean
+            np.maximum(drawn, 0, out=drawn)
+            level += step_supply
+            level -= drawn
+            np.maximum(level, 0, out=level)
+            np.less_equal(level, 0, out=empty)
+            out |= empty
+            totals[first:first + count, step] = level.sum(axis=1)
+            stockouts[first:first + count, step] = np.count_nonzero(empty, axis=1)
+        ever_out += np.count_nonzero(out, axis=0)
+    return totals, stockouts, ever_out
+
+
+def simulate(stock, demand, supply, demand_change=0.0, supply_change=0.0, scenarios=DEFAULT_SCENARIOS,
+             horizon_days=HORIZON_DAYS, step_days=STEP_DAYS, percentiles=PERCENTILES, seed=None, workers=None):
+    """Simule `scenarios` trajectoires pour toutes les références.
+
+    `demand_change` et `supply_change` sont des variations relatives (0.2 = +20 %), scalaires ou
+    vecteurs d'une valeur par référence. `workers` : nombre de processus (None = automatique,
+    1 = séquentiel). Retourne un dict avec les jours, les bandes de percentiles du stock total et
+    du nombre de références en rupture, et la probabilité de rupture de chaque référence.
+    """
+    started = time.perf_counter()
+    stock = np.maximum(np.asarray(stock, dtype=np.float64), 0)
+    mean = np.asarray(demand, dtype=np.float64) * np.maximum(1 + np.asarray(demand_change, dtype=np.float64), 0)
+    supply = np.asarray(supply, dtype=np.float64) * np.maximum(1 + np.asarray(supply_change, dtype=np.float64), 0)
+    mean, supply = np.broadcast_to(mean, stock.shape), np.broadcast_to(supply, stock.shape)
+    steps = _steps(horizon_days, step_days)
+    elapsed = np.cumsum(steps)
+
+    # Marge minimale (en écarts-types) sur l'horizon : au-delà de SAFE_SIGMAS, pas de rupture possible
+    expected = stock[:, None] + (supply - mean)[:, None] * elapsed
+    spread = np.sqrt(mean[:, None] * elapsed * DISPERSION)
+    safe = ((expected - SAFE_SIGMAS * spread) > 0).all(axis=1)
+    risky = np.flatnonzero(~safe)
+
+    seeds = np.random.SeedSequence(seed)
+    rng = np.random.default_rng(seeds.spawn(1)[0])
+    # Références sûres : somme = stock + approvisionnement - marche aléatoire normale agrégée
+    safe_mean = float((mean[safe]).sum())
+    safe_sd = float(np.sqrt((mean[safe] * DISPERSION).sum()))
+    increments = rng.normal(safe_mean * steps, safe_sd * np.sqrt(steps), size=(scenarios, len(steps)))
+    totals = float(stock[safe].sum()) + float(supply[safe].sum()) * elapsed - np.cumsum(increments, axis=1)
+    stockouts = np.zeros((scenarios, len(steps)), dtype=np.int64)
+    probability = np.zeros(len(stock), dtype=np.float64)
+
+    if len(risky):
+        per_chunk = max(1, CHUNK_ELEMENTS // scenarios) if scenarios <= CHUNK_ELEMENTS else 1
+        chunks = [risky[i:i + per_chunk] for i in range(0, len(risky), per_chunk)]
+        chunk_seeds = seeds.spawn(len(chunks))
+        tasks = [(stock[c], mean[c], supply[c], steps, scenarios, s) for c, s in zip(chunks, chunk_seeds)]
+        if workers is None:
+            workers = min(os.cpu_count() or 1, 8) if scenarios * len(risky) * len(steps) >= PARALLEL_MIN_ELEMENTS else 1
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_simulate_chunk, tasks))
+        else:
+            results = [_simulate_chunk(task) for task in tasks]
+        for chunk, (chunk_totals, chunk_stockouts, ever_out) in zip(chunks, results):
+            totals += chunk_totals
+            stockouts += chunk_stockouts
+            probability[chunk] = ever_out / scenarios
+
+    return {
+        'jours': elapsed.astype(int).tolist(),
+        'stock_total': {p: np.percentile(totals, p, axis=0).tolist() for p in percentiles},
+        'ruptures': {p: np.percentile(stockouts, p, axis=0).tolist() for p in percentiles},
+        'probabilite_rupture': probability,
+        'references_simulees': int(len(risky)),
+        'scenarios': scenarios,
+        'duree': time.perf_counter() - started,
+    }
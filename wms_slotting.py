@@ -0,0 +1,149 @@
+"""Optimisation des emplacements (slotting) : rapprocher du quai les références les plus prélevées
+
+Fréquence de prélèvement = lignes d'expédition par référence sur WINDOW_DAYS jours, répartie
+entre les lignes de stock de la référence. Coût d'un emplacement = distance au quai (wms_layout).
+Algorithme glouton : les lignes de stock sont parcourues de la plus fréquente à la moins
+fréquente ; chacune prend le meilleur emplacement encore libre dans le lot, en échangeant sa
+place avec les lignes moins fréquentes qui l'occupent. Les deux emplacements doivent pouvoir
+recevoir leurs nouvelles lignes (capacité, statut pour la source qui reçoit les lignes
+déplacées). Un échange n'est retenu que s'il réduit le coût pondéré Σ fréquence × distance
+d'au moins MIN_GAIN. Une ligne de stock est un
+lot d'une référence à un emplacement : les transferts sont proposés par lot, comme
+wms_services.execute_transfers les contrôle.
+"""
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+import wms_layout
+from wms_lazy import LazyModule
+
+np = LazyModule("numpy")
+
+WINDOW_DAYS = 90
+MAX_MOVES = 200
+MIN_GAIN = 1.0
+# Emplacements examinés au-delà du meilleur libre quand la capacité ne suffit pas
+CAPACITY_LOOKAHEAD = 100
+TARGET_STATUSES = ("Disponible",)
+MOTIF = "Optimisation"
+
+
+def load_slots(conn):
+    """Emplacements connus (table + stock) : (codes, coûts, capacités, utilisables comme cible)"""
+    rows = conn.execute("SELECT code, zone, capacite_max, statut FROM emplacements").fetchall()
+    rows += [(code, None, None, None) for code, in conn.execute("""
+        SELECT DISTINCT emplacement FROM stocks
+        WHERE quantite > 0 AND emplacement NOT IN (SELECT code FROM emplacements)
+    """)]
+    if not rows:
+        return [], np.zeros(0), [], np.zeros(0, dtype=bool)
+    codes, zones, capacities, statuses = zip(*rows)
+    cost = wms_layout.travel_cost(codes, zones, wms_layout.load_plan(conn))
+    usable = np.array([status is None or status in TARGET_STATUSES for status in statuses], dtype=bool)
+    return list(codes), cost, list(capacities), usable
+
+
+def load_items(conn, window_days=WINDOW_DAYS, today=None):
+    """Lignes de stock et fréquence de prélèvement : [(référence, emplacement, quantité, fréquence, lot)]"""
+    today = today or date.today()
+    since = (today - timedelta(days=window_days)).isoformat()
+    return conn.execute("""
+        SELECT s.reference, s.emplacement, s.quantite,
+               COALESCE(p.prelevements, 0) * 1.0 / COUNT(*) OVER (PARTITION BY s.reference), s.lot
+        FROM stocks s
+        LEFT JOIN (SELECT reference, COUNT(*) AS prelevements FROM expeditions
+                   WHERE date_creation >= ? GROUP BY reference) p ON p.reference = s.reference
+        WHERE s.quantite > 0
+    """, (since,)).fetchall()
+
+
+def _merge_moves(moves):
+    """Regroupe les transferts d'un même lot entre deux emplacements (quantités et gains cumulés)"""
+    merged = {}
+    for reference, quantity, source, target, lot, gain in moves:
+        key = (reference, source, target, lot)
+        total, total_gain = merged.get(key, (0, 0.0))
+        merged[key] = (total + quantity, total_gain + gain)
+    return [(reference, quantity, source, target, lot, gain)
+            for (reference, source, target, lot), (quantity, gain) in merged.items()]
+
+
+def propose_moves(slots, items, max_moves=MAX_MOVES, min_gain=MIN_GAIN):
+    """Transferts proposés [(référence, quantité, source, destination, lot, gain)] et gain total.
+
+    Au plus `max_moves` transferts, lignes déplacées par les échanges comprises.
+    """
+    codes, cost, capacities, usable = slots
+    slot_index = {code: i for i, code in enumerate(codes)}
+    occupants = defaultdict(list)
+    load = np.zeros(len(codes), dtype=np.float64)
+    for item, (_, location, quantity, _, _) in enumerate(items):
+        occupants[slot_index[location]].append(item)
+        load[slot_index[location]] += quantity
+    frequency = np.array([row[3] for row in items], dtype=np.float64)
+    order = [int(i) for i in np.argsort(-frequency, kind='stable') if frequency[i] > 0]
+    targets = [int(i) for i in np.argsort(cost, kind='stable') if usable[i]]
+    locked = np.zeros(len(codes), dtype=bool)
+    moves, total_gain, cursor = [], 0.0, 0
+    for item in order:
+        if len(moves) >= max_moves:
+            break
+        reference, location, quantity, freq, lot = items[item]
+        source = slot_index[location]
+        if locked[source]:
+            continue
+        while cursor < len(targets) and locked[targets[cursor]]:
+            cursor += 1
+        # Meilleur emplacement libre du lot assez grand pour la ligne (et les lignes de la même
+        # référence qui y restent), dont les lignes déplacées tiennent à la source
+        target = displaced = None
+        for candidate in targets[cursor:cursor + CAPACITY_LOOKAHEAD]:
+            if locked[candidate]:
+                continue
+            others = [other for other in occupants[candidate] if items[other][0] != reference]
+            moved = sum(items[other][2] for other in others)
+            if capacities[candidate] is not None and capacities[candidate] < load[candidate] - moved + quantity:
+                continue
+            if others and not usable[source]:
+                continue
+            if capacities[source] is not None and capacities[source] < load[source] - quantity + moved:
+                continue
+            target, displaced = candidate, others
+            break
+        if target is None or cost[target] >= cost[source]:
+            locked[source] = True
+            continue
+        gain = float((freq - sum(items[other][3] for other in displaced)) * (cost[source] - cost[target]))
+        if gain < min_gain:
+            locked[source] = True
+            continue
+        if len(moves) + 1 + len(displaced) > max_moves:
+            # L'échange complet dépasserait le lot : un échange plus petit peut encore tenir
+            continue
+        moves.append((reference, quantity, location, codes[target], lot, gain))
+        for other in displaced:
+            moves.append((items[other][0], items[other][2], codes[target], location, items[other][4], 0.0))
+        locked[source] = locked[target] = True
+        total_gain += gain
+    return _merge_moves(moves), total_gain
+
+
+def optimize(conn, window_days=WINDOW_DAYS, max_moves=MAX_MOVES, min_gain=MIN_GAIN, today=None):
+    """Propositions de transferts pour tout l'entrepôt ; retourne un dict (transferts, gain, coûts, durée)"""
+    started = time.perf_counter()
+    slots = load_slots(conn)
+    items = load_items(conn, window_days, today)
+    moves, gain = propose_moves(slots, items, max_moves, min_gain)
+    codes, cost, _, _ = slots
+    slot_index = {code: i for i, code in enumerate(codes)}
+    current = float(sum(freq * cost[slot_index[location]] for _, location, _, freq, _ in items))
+    return {
+        'transferts': moves,
+        'gain': gain,
+        'cout_actuel': current,
+        'cout_apres': current - gain,
+        'emplacements': len(codes),
+        'lignes': len(items),
+        'duree': time.perf_counter() - started,
+    }
@@ -0,0 +1,125 @@
+"""Référentiel fournisseurs et analyses de performance à partir des réceptions
+
+Toutes les lectures passent par `fournisseurs_mensuel` (une ligne par fournisseur et par mois,
+tenue à jour par triggers, voir wms_database) : volume, fréquence, distribution des délais et
+taux de ponctualité restent rapides quelle que soit la profondeur de l'historique. Le délai
+d'une réception est l'écart entre la date de commande et la date de réception ; elle est à
+l'heure si ce délai ne dépasse pas le délai contractuel du fournisseur. Les réceptions sans
+date de commande comptent dans les volumes mais pas dans les délais ni la ponctualité.
+"""
+from datetime import date
+
+from wms_database import LEAD_TIME_BUCKETS
+
+PERIODS = {"12 derniers mois": 12, "24 derniers mois": 24, "Tout l'historique": None}
+TOP_SUPPLIERS = 10
+
+
+def list_suppliers(conn, active_only=True):
+    """Noms des fournisseurs du référentiel"""
+    where = "WHERE actif = 1" if active_only else ""
+    return [row[0] for row in conn.execute(f"SELECT nom FROM fournisseurs {where} ORDER BY nom")]
+
+
+def supplier_master(conn):
+    """Référentiel : [(nom, délai contractuel, contact, actif, date de création)]"""
+    return conn.execute(
+        "SELECT nom, delai_contractuel, contact, actif, date_creation FROM fournisseurs ORDER BY nom"
+    ).fetchall()
+
+
+def save_supplier(conn, nom, delai_contractuel, contact=None, actif=True):
+    """Crée ou met à jour un fournisseur ; un nouveau délai recalcule sa ponctualité (trigger)"""
+    nom = (nom or "").strip()
+    if not nom:
+        raise ValueError("Nom du fournisseur obligatoire")
+    if delai_contractuel < 0:
+        raise ValueError("Le délai contractuel doit être positif")
+    conn.execute("""
+        INSERT INTO fournisseurs (nom, delai_contractuel, contact, actif) VALUES (?, ?, ?, ?)
+        ON CONFLICT (nom) DO UPDATE SET delai_contractuel = excluded.delai_contractuel,
+            contact = excluded.contact, actif = excluded.actif
+    """, (nom, int(delai_contractuel), contact or None, int(bool(actif))))
+    conn.commit()
+
+
+def _since(months, today=None):
+    """Premier mois (AAAA-MM) de la période, None pour tout l'historique"""
+    if months is None:
+        return None
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - (months - 1)
+    return f"{index // 12}-{index % 12 + 1:02d}"
+
+
+def _period_filter(months, supplier=None, today=None, extra=()):
+    """Clause WHERE (vide si aucun filtre) et paramètres ; `extra` : conditions sans paramètre"""
+    clauses, params = list(extra), []
+    since = _since(months, today)
+    if since:
+        clauses.append("mois >= ?")
+        params.append(since)
+    if supplier:
+        clauses.append("fournisseur = ?")
+        params.append(supplier)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def supplier_performance(conn, months=12, today=None):
+    """Indicateurs par fournisseur sur la période, les plus gros volumes d'abord.
+
+    Lignes : (fournisseur, réceptions, quantité, mois actifs, réceptions par mois, réceptions
+    avec délai mesuré, délai moyen, écart-type du délai, taux à l'heure en %) ; les trois
+    derniers sont None si aucune réception n'a de date de commande.
+    """
+    where, params = _period_filter(months, today=today)
+    rows = conn.execute(f"""
+        SELECT fournisseur, SUM(receptions), SUM(quantite), COUNT(*), SUM(receptions_mesurees),
+               SUM(delai_total), SUM(delai_carres), SUM(a_temps)
+        FROM fournisseurs_mensuel{where}
+        GROUP BY fournisseur HAVING SUM(receptions) > 0
+        ORDER BY SUM(quantite) DESC
+    """, params).fetchall()
+    span = months or max(len({month for month, in conn.execute(
+        f"SELECT DISTINCT mois FROM fournisseurs_mensuel{where}", params)}), 1)
+    result = []
+    for name, count, quantity, active, measured, total, squares, on_time in rows:
+        if not measured:
+            result.append((name, count, quantity, active, count / span, 0, None, None, None))
+            continue
+        mean = total / measured
+        result.append((name, count, quantity, active, count / span, measured, mean,
+                       max(squares / measured - mean * mean, 0) ** 0.5, on_time / measured * 100))
+    return result
+
+
+def lead_time_distribution(conn, months=12, supplier=None, today=None):
+    """Nombre de réceptions à délai mesuré par tranche de délai : [(libellé, réceptions)]"""
+    where, params = _period_filter(months, supplier, today)
+    counts = conn.execute(
+        f"SELECT {', '.join(f'COALESCE(SUM({column}), 0)' for column, _, _ in LEAD_TIME_BUCKETS)} "
+        f"FROM fournisseurs_mensuel{where}", params
+    ).fetchone()
+    return [(label, count) for (_, label, _), count in zip(LEAD_TIME_BUCKETS, counts)]
+
+
+def monthly_history(conn, supplier, months=12, today=None):
+    """Série mensuelle d'un fournisseur : [(mois, réceptions, quantité, réceptions à délai mesuré,
+    délai moyen, taux à l'heure %)], délai et taux None sans date de commande"""
+    where, params = _period_filter(months, supplier, today, extra=("receptions > 0",))
+    return conn.execute(f"""
+        SELECT mois, receptions, quantite, receptions_mesurees,
+               CAST(delai_total AS REAL) / NULLIF(receptions_mesurees, 0),
+               a_temps * 100.0 / NULLIF(receptions_mesurees, 0)
+        FROM fournisseurs_mensuel{where}
+        ORDER BY mois
+    """, params).fetchall()
+
+
+def recent_receptions(conn, supplier, limit=20):
+    """Dernières réceptions d'un fournisseur (index sur receptions.fournisseur)"""
+    return conn.execute("""
+        SELECT date_reception, date_commande, reference, quantite, emplacement, statut
+        FROM receptions WHERE fournisseur = ?
+        ORDER BY date_reception DESC, id DESC LIMIT ?
+    """, (supplier, int(limit))).fetchall()
@@ -0,0 +1,30 @@
+"""Zones de l'entrepôt : la zone d'une ligne de stock est celle de son emplacement
+
+Les lignes de stock sont rattachées aux emplacements par stocks.emplacement_id ; la zone
+vient de emplacements.zone (index idx_emplacements_zone). Le stock par zone est tenu à jour
+par triggers dans `zones_stock` (voir wms_database) : graphiques et filtres de zone ne
+parcourent jamais la table stocks, quel que soit le nombre de zones.
+"""
+
+
+def list_zones(conn):
+    """Zones déclarées dans les emplacements (parcours de l'index)"""
+    return [row[0] for row in conn.execute("SELECT DISTINCT zone FROM emplacements ORDER BY zone")]
+
+
+def zone_totals(conn):
+    """Par zone : [(zone, emplacements, lignes de stock, quantité)], les plus chargées d'abord"""
+    return conn.execute("""
+        SELECT e.zone, e.emplacements, COALESCE(z.lignes, 0), COALESCE(z.quantite, 0)
+        FROM (SELECT zone, COUNT(*) AS emplacements FROM emplacements GROUP BY zone) e
+        LEFT JOIN zones_stock z ON z.zone = e.zone
+        ORDER BY COALESCE(z.quantite, 0) DESC, e.zone
+    """).fetchall()
+
+
+def filter_sql(zones=None, column="emplacement_id"):
+    """Condition SQL (préfixée de AND) limitant `column` aux emplacements des zones choisies"""
+    if not zones:
+        return "", []
+    placeholders = ", ".join("?" for _ in zones)
+    return f" AND {column} IN (SELECT id FROM emplacements WHERE zone IN ({placeholders}))", list(zones)